@@ -0,0 +1,124 @@
+"""Running statistics over every reading, updated one reading at a time
+
+The read model hands each new reading to StreamingAggregator.add, so the
+dashboard's numbers cost O(1) per reading instead of a pass over the whole
+history on every poll. Per sensor type it keeps count/sum/min/max since the
+beginning. Per sensor it keeps the average over the last AGG_WINDOW_SECONDS
+(measured back from that sensor's newest reading). When the read model
+starts, the all-time totals are seeded with a single query on the store.
+The windows start from the readings it loads into its ring buffers. When
+retention expires old readings, the read model seeds the totals again and
+expire() drops them from the windows.
+"""
+from collections import deque
+from datetime import datetime
+
+from config import AGG_WINDOW_SECONDS
+
+
+def _seconds(timestamp):
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class RunningStats:
+    """count/sum/min/max of a stream of values"""
+
+    def __init__(self, count=0, total=0.0, low=None, high=None):
+        self.count = count
+        self.total = total
+        self.low = low
+        self.high = high
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.low = value if self.low is None else min(self.low, value)
+        self.high = value if self.high is None else max(self.high, value)
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'avg': round(self.total / self.count, 2) if self.count else 0,
+            'min': self.low,
+            'max': self.high
+        }
+
+
+class SlidingWindow:
+    """Average of the values seen in the last `seconds` seconds"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.values = deque()
+        self.total = 0.0
+
+    def add(self, at, value):
+        self.values.append((at, value))
+        self.total += value
+        while self.values and self.values[0][0] < at - self.seconds:
+            self.total -= self.values.popleft()[1]
+
+    def average(self):
+        return round(self.total / len(self.values), 2) if self.values else 0
+
+
+class StreamingAggregator:
+    """All-time stats per sensor type and windowed averages per sensor"""
+
+    def __init__(self, window_seconds=AGG_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self.by_type = {}
+        self.windows = {}
+
+    def seed(self, type_stats, since=()):
+        """Start over from totals computed by the store: {type: (count, sum, min, max)}
+
+        `since` are readings already added that those totals don't include.
+        """
+        by_type = {sensor_type: RunningStats(count, total, low, high)
+                   for sensor_type, (count, total, low, high) in type_stats.items()}
+        for reading in since:
+            by_type.setdefault(reading['sensor_type'], RunningStats()).add(reading['value'])
+        self.by_type = by_type
+
+    def expire(self, before):
+        """Drop window values older than before[sensor_type] (an ISO timestamp)"""
+        for key, window in list(self.windows.items()):
+            oldest = _seconds(before.get(key[1]))
+            if oldest is None:
+                continue
+            while window.values and window.values[0][0] < oldest:
+                window.total -= window.values.popleft()[1]
+            if not window.values:
+                del self.windows[key]
+
+    def add(self, reading):
+        sensor_type = reading['sensor_type']
+        value = reading['value']
+        stats = self.by_type.get(sensor_type)
+        if stats is None:
+            stats = self.by_type[sensor_type] = RunningStats()
+        stats.add(value)
+        at = _seconds(reading['timestamp'])
+        if at is not None:
+            key = (str(reading['sensor_id']), sensor_type)
+            window = self.windows.get(key)
+            if window is None:
+                window = self.windows[key] = SlidingWindow(self.window_seconds)
+            window.add(at, value)
+
+    def average(self, sensor_type):
+        stats = self.by_type.get(sensor_type)
+        return round(stats.total / stats.count, 2) if stats and stats.count else 0
+
+    def snapshot(self):
+        return {
+            'types': {sensor_type: stats.as_dict() for sensor_type, stats in self.by_type.items()},
+            'sensors': [
+                {'sensor_id': sensor_id, 'sensor_type': sensor_type, 'window_avg': window.average()}
+                for (sensor_id, sensor_type), window in sorted(self.windows.items())
+            ]
+        }
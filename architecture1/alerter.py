@@ -1,23 +1,26 @@
-from config import TEMP_HIGH, TEMP_LOW, HUMIDITY_HIGH, HUMIDITY_LOW
+from datetime import datetime
+
 from database import add_alert
+from rules import engine
 
-def check_temperature_alert(sensor_id, value):
-    """Check if temperature is out of range"""
-    if value > TEMP_HIGH:
-        add_alert(sensor_id, 'temperature', f'🚨 TOO HIGH: {value}°C (threshold: {TEMP_HIGH}°C)')
-    elif value < TEMP_LOW:
-        add_alert(sensor_id, 'temperature', f'🚨 TOO LOW: {value}°C (threshold: {TEMP_LOW}°C)')
+def evaluate_readings(readings):
+    """Return the alerts raised by a batch of readings (see rules.py)"""
+    return engine.evaluate(readings)
 
-def check_humidity_alert(sensor_id, value):
-    """Check if humidity is out of range"""
-    if value > HUMIDITY_HIGH:
-        add_alert(sensor_id, 'humidity', f'🚨 TOO HIGH: {value}% (threshold: {HUMIDITY_HIGH}%)')
-    elif value < HUMIDITY_LOW:
-        add_alert(sensor_id, 'humidity', f'🚨 TOO LOW: {value}% (threshold: {HUMIDITY_LOW}%)')
+def evaluate_reading(sensor_id, sensor_type, value, timestamp=None, site=None):
+    """Return the alert message for a reading, or None"""
+    reading = {
+        'sensor_id': sensor_id,
+        'sensor_type': sensor_type,
+        'value': value,
+        'timestamp': timestamp or datetime.now().isoformat(),
+        'site': site
+    }
+    alerts = evaluate_readings([reading])
+    return alerts[0]['message'] if alerts else None
 
-def process_reading(sensor_id, sensor_type, value):
+def process_reading(sensor_id, sensor_type, value, site=None):
     """Process a reading and check for alerts"""
-    if sensor_type == 'temperature':
-        check_temperature_alert(sensor_id, value)
-    elif sensor_type == 'humidity':
-        check_humidity_alert(sensor_id, value)
\ No newline at end of file
+    message = evaluate_reading(sensor_id, sensor_type, value, site=site)
+    if message:
+        add_alert(sensor_id, sensor_type, message)
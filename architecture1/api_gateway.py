@@ -1,6 +1,13 @@
+import json
+import math
+from datetime import datetime
+
 from flask import Flask, request, jsonify
+from config import HISTORY_MAX_POINTS
 from database import add_reading, get_latest_readings, get_alerts, get_history
 from alerter import process_reading
+from ingest import ingest_queue
+from compactor import compactor
 
 app = Flask(__name__)
 
@@ -18,19 +25,98 @@ def submit_reading():
     
     sensor_id = data.get('sensor_id')
     sensor_type = data.get('sensor_type')
-    value = data.get('value')
     
-    if not all([sensor_id, sensor_type, value]):
+    if missing_fields(data):
         return jsonify({'error': 'Missing fields'}), 400
     
     try:
-        value = float(value)
+        value = parse_value(data['value'])
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid value'}), 400
+    
+    try:
         add_reading(sensor_id, sensor_type, value)
-        process_reading(sensor_id, sensor_type, value)
+        process_reading(sensor_id, sensor_type, value, site=data.get('site'))
         return jsonify({'status': 'OK'}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def parse_batch(req):
+    """Read a JSON array (or {"readings": [...]}) or NDJSON body"""
+    if 'ndjson' in (req.content_type or ''):
+        lines = req.get_data(as_text=True).splitlines()
+        return [json.loads(line) for line in lines if line.strip()]
+    data = req.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('readings')
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON array of readings')
+    return data
+
+def missing_fields(item):
+    """Whether a reading lacks sensor_id, sensor_type or value (0 is a value)"""
+    return any(item.get(field) in (None, '') for field in ('sensor_id', 'sensor_type', 'value'))
+
+def parse_value(value):
+    """A reading's value as a finite float"""
+    if isinstance(value, bool):
+        raise ValueError('Invalid value')
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError('Invalid value')
+    return value
+
+def parse_timestamp(value):
+    """A client timestamp as a local ISO string, comparable with the stored ones"""
+    timestamp = datetime.fromisoformat(str(value))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp.isoformat()
+
+@app.route('/api/readings/batch', methods=['POST'])
+def submit_readings_batch():
+    """Receive many sensor readings; they are stored in the background"""
+    try:
+        items = parse_batch(request)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    readings = []
+    rejected = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or missing_fields(item):
+            rejected.append({'index': index, 'error': 'Missing fields'})
+            continue
+        try:
+            value = parse_value(item['value'])
+        except (TypeError, ValueError):
+            rejected.append({'index': index, 'error': 'Invalid value'})
+            continue
+        reading = {'sensor_id': item['sensor_id'], 'sensor_type': item['sensor_type'], 'value': value}
+        if item.get('timestamp'):
+            try:
+                reading['timestamp'] = parse_timestamp(item['timestamp'])
+            except ValueError:
+                rejected.append({'index': index, 'error': 'Invalid timestamp'})
+                continue
+        if item.get('site'):
+            reading['site'] = item['site']
+        readings.append(reading)
+    
+    if readings and not ingest_queue.submit(readings):
+        return jsonify({'error': 'Ingest queue full, retry later'}), 503
+    return jsonify({'status': 'queued', 'accepted': len(readings), 'rejected': rejected}), 202
+
+@app.route('/api/ingest/stats', methods=['GET'])
+def get_ingest_stats():
+    """Batch ingest counters"""
+    return jsonify(dict(ingest_queue.stats, pending=ingest_queue.pending())), 200
+
+@app.route('/api/compaction/stats', methods=['GET'])
+def get_compaction_stats():
+    """Retention/compaction counters: rows expired, bytes reclaimed, pause times"""
+    return jsonify(compactor.stats), 200
+
 @app.route('/api/latest', methods=['GET'])
 def get_latest():
     """Get latest readings"""
@@ -46,9 +132,24 @@ def get_all_alerts():
 
 @app.route('/api/history/<sensor_id>/<sensor_type>', methods=['GET'])
 def get_sensor_history(sensor_id, sensor_type):
-    """Get sensor history"""
-    history = get_history(sensor_id, sensor_type)
-    return jsonify(history), 200
+    """Get sensor history, optionally limited with ?start=...&end=... (ISO timestamps)
+
+    ?resolution=raw|1m|1h|1d|auto (default auto: the finest that fits in
+    ?max_points). Rollup points carry the bucket average as value, plus
+    count/min/max. The X-Resolution header tells which one was used.
+    """
+    start = request.args.get('start')
+    end = request.args.get('end')
+    resolution = request.args.get('resolution', 'auto')
+    max_points = request.args.get('max_points', HISTORY_MAX_POINTS, type=int)
+    try:
+        resolution, history = get_history(sensor_id, sensor_type, start, end, resolution, max_points)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    response = jsonify(history)
+    response.headers['X-Resolution'] = resolution
+    return response, 200
 
 if __name__ == '__main__':
+    compactor.start()
     app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
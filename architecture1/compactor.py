@@ -0,0 +1,137 @@
+"""Background expiry of old readings, alerts and rollups
+
+Every COMPACT_INTERVAL seconds a thread in the gateway applies
+config.RETENTION_DAYS. Each sensor type keeps raw readings, alerts and each
+rollup tier for its own number of days. Deletes run in short transactions
+of at most COMPACT_CHUNK rows, with a short sleep in between, so the ingest
+writer is never locked out for longer than one chunk. The freed space is
+then handed back in small steps (SQLite incremental vacuum) and the WAL is
+truncated.
+
+Read models drop expired rows from their caches by themselves (see
+read_model.py), so the compactor only deals with the store.
+
+The stats report the rows expired, the bytes reclaimed (stored data that
+went away, whether the file shrank or the pages will be reused) and pause
+times. A pause is how long one step held the store, i.e. the longest an
+ingest write could have waited on it.
+"""
+import threading
+import time
+from datetime import datetime
+
+from config import RETENTION_DAYS, COMPACT_INTERVAL, COMPACT_CHUNK
+from database import get_storage
+from retention import cutoffs
+from rollups import TIERS
+
+# Pages handed back to the filesystem per step
+VACUUM_PAGES = 256
+# Gap between steps, so queued writes get the lock
+STEP_GAP = 0.01
+
+
+class Compactor:
+    """Applies the retention policy to the store in small steps"""
+
+    def __init__(self, storage=None, retention_days=RETENTION_DAYS, interval=COMPACT_INTERVAL,
+                 chunk=COMPACT_CHUNK):
+        self.storage = storage
+        self.retention_days = retention_days
+        self.interval = interval
+        self.chunk = chunk
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {
+            'runs': 0, 'errors': 0, 'readings_expired': 0, 'alerts_expired': 0, 'rollups_expired': 0,
+            'bytes_reclaimed': 0, 'steps': 0, 'pause_ms_total': 0.0, 'pause_ms_max': 0.0, 'last_run': None
+        }
+
+    def start(self):
+        """Start the compactor thread (once)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='compactor', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error compacting storage: {e}")
+                with self._lock:
+                    self.stats['errors'] += 1
+            time.sleep(self.interval)
+
+    def _step(self, run, method, *args):
+        """Call one storage method and time how long it held the store"""
+        started = time.perf_counter()
+        result = method(*args)
+        pause = (time.perf_counter() - started) * 1000
+        run['steps'] += 1
+        run['pause_ms_total'] += pause
+        run['pause_ms_max'] = max(run['pause_ms_max'], pause)
+        time.sleep(STEP_GAP)
+        return result
+
+    def _drain(self, run, counter, method, *args):
+        """Repeat an expire_* call until it has nothing left to delete"""
+        while True:
+            deleted = self._step(run, method, *args, self.chunk)
+            run[counter] += deleted
+            if deleted < self.chunk:
+                return
+
+    def run_once(self, now=None):
+        """Expire everything past its retention, then reclaim the space"""
+        storage = self.storage or get_storage()
+        now = now or datetime.now()
+        started = time.perf_counter()
+        run = {'readings_expired': 0, 'alerts_expired': 0, 'rollups_expired': 0,
+               'steps': 0, 'pause_ms_total': 0.0, 'pause_ms_max': 0.0}
+        # Measure without the WAL, so only expired data counts as reclaimed
+        self._step(run, storage.checkpoint)
+        size_before, free_before = storage.disk_usage()
+
+        for sensor_type in storage.sensor_types():
+            kept = cutoffs(sensor_type, now, self.retention_days)
+            if 'raw' in kept:
+                self._drain(run, 'readings_expired', storage.expire_readings, sensor_type, kept['raw'])
+            if 'alerts' in kept:
+                self._drain(run, 'alerts_expired', storage.expire_alerts, sensor_type, kept['alerts'])
+            for tier in TIERS:
+                if tier in kept:
+                    self._drain(run, 'rollups_expired', storage.expire_rollups, tier, sensor_type, kept[tier])
+
+        free_pages = None
+        while True:
+            left = self._step(run, storage.compact, VACUUM_PAGES)
+            if not left or left == free_pages:
+                break
+            free_pages = left
+        self._step(run, storage.checkpoint)
+
+        size_after, free_after = storage.disk_usage()
+        run.update({
+            'started': now.isoformat(),
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            'bytes_before': size_before,
+            'bytes_after': size_after,
+            'bytes_free': free_after,
+            # Live data that went away, whether the file shrank or not
+            'bytes_reclaimed': max((size_before - free_before) - (size_after - free_after), 0),
+            'pause_ms_total': round(run['pause_ms_total'], 1),
+            'pause_ms_max': round(run['pause_ms_max'], 1)
+        })
+        with self._lock:
+            self.stats['runs'] += 1
+            for key in ('readings_expired', 'alerts_expired', 'rollups_expired', 'bytes_reclaimed', 'steps'):
+                self.stats[key] += run[key]
+            self.stats['pause_ms_total'] = round(self.stats['pause_ms_total'] + run['pause_ms_total'], 1)
+            self.stats['pause_ms_max'] = max(self.stats['pause_ms_max'], run['pause_ms_max'])
+            self.stats['last_run'] = run
+        return run
+
+
+compactor = Compactor()
@@ -8,4 +8,54 @@ HUMIDITY_LOW = 20
 
 # Port numbers
 GATEWAY_PORT = 5000
-DASHBOARD_PORT = 5001
\ No newline at end of file
+DASHBOARD_PORT = 5001
+
+# Storage backend: 'sqlite' (append-only, indexed) or 'json' (old single file)
+STORAGE_BACKEND = 'sqlite'
+SQLITE_FILE = 'sensor_data.db'
+JSON_FILE = 'sensor_data.json'
+
+# Batch ingest: the writer flushes up to INGEST_BATCH_SIZE queued readings at
+# least every INGEST_FLUSH_INTERVAL seconds; a full queue rejects new batches
+INGEST_BATCH_SIZE = 1000
+INGEST_FLUSH_INTERVAL = 0.05
+INGEST_QUEUE_SIZE = 100000
+
+# Read model: latest readings/alerts kept in memory, and per-sensor history
+# kept in memory for each queried sensor
+CACHE_LATEST = 1000
+CACHE_PER_SENSOR = 10000
+
+# Dashboard: per-sensor averages cover the last AGG_WINDOW_SECONDS of readings
+AGG_WINDOW_SECONDS = 300
+
+# Dashboard live stream: deltas are pushed every STREAM_PUSH_INTERVAL seconds;
+# a client more than STREAM_CLIENT_BUFFER events behind is disconnected
+STREAM_PUSH_INTERVAL = 0.5
+STREAM_CLIENT_BUFFER = 64
+STREAM_KEEPALIVE = 15
+
+# Alert rules: loaded from RULES_FILE (falls back to the thresholds above) and
+# re-read within RULES_CHECK_INTERVAL seconds of a change. A rule re-arms once
+# the value is back inside by ALERT_HYSTERESIS; the same rule alerts a sensor
+# at most once per ALERT_COOLDOWN seconds, and a sensor raises at most
+# ALERT_MAX_PER_MINUTE alerts a minute
+RULES_FILE = 'alert_rules.json'
+RULES_CHECK_INTERVAL = 2
+ALERT_HYSTERESIS = 1.0
+ALERT_COOLDOWN = 60
+ALERT_MAX_PER_MINUTE = 10
+
+# History: readings are also rolled up per minute, hour and day; an 'auto'
+# history query returns the finest of those with at most HISTORY_MAX_POINTS points
+HISTORY_MAX_POINTS = 1000
+
+# Retention in days per sensor type ('default' for types not listed); None
+# keeps data forever. The compactor runs every COMPACT_INTERVAL seconds and
+# deletes at most COMPACT_CHUNK rows per write, so ingest is never held up
+RETENTION_DAYS = {
+    'default': {'raw': 7, '1m': 30, '1h': 365, '1d': None, 'alerts': 30},
+    'temperature': {'raw': 14},
+}
+COMPACT_INTERVAL = 600
+COMPACT_CHUNK = 2000
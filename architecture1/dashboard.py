@@ -1,73 +1,53 @@
-from flask import Flask, render_template, jsonify
-import json
+from flask import Flask, Response, render_template, jsonify
 import os
+import threading
 
-app = Flask(__name__)
-
-# Use absolute path to ensure we find the file
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATABASE_FILE = os.path.join(BASE_DIR, 'sensor_data.json')
+from database import DATABASE_FILE, get_read_model
+from live import LiveFeed
 
-def load_data():
-    """Load data directly from JSON file"""
-    try:
-        print(f"Trying to read from: {DATABASE_FILE}")
-        if os.path.exists(DATABASE_FILE):
-            print(f"File exists! Size: {os.path.getsize(DATABASE_FILE)} bytes")
-            with open(DATABASE_FILE, 'r') as f:
-                data = json.load(f)
-                print(f"Loaded {len(data.get('readings', []))} readings")
-                return data
-        else:
-            print(f"File not found at: {DATABASE_FILE}")
-    except Exception as e:
-        print(f"Error loading data: {e}")
-    
-    return {'readings': [], 'alerts': []}
+app = Flask(__name__)
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+_live_feed = None
+_live_feed_lock = threading.Lock()
+
+def get_live_feed():
+    """One shared feed (and pump thread) for all streaming clients"""
+    global _live_feed
+    with _live_feed_lock:
+        if _live_feed is None:
+            _live_feed = LiveFeed(get_read_model())
+    return _live_feed
+
+def build_snapshot():
+    """Everything the dashboard shows, newest first"""
+    # Last 30 readings and 10 alerts, with the ids the live feed continues from
+    recent = get_read_model().recent(30, 10)
+    
+    # Averages are kept up to date as readings arrive
+    stats = recent['stats']
+    temp_avg = stats['types'].get('temperature', {}).get('avg', 0)
+    humid_avg = stats['types'].get('humidity', {}).get('avg', 0)
+    
+    return {
+        'readings': list(reversed(recent['readings'])),
+        'alerts': list(reversed(recent['alerts'])),
+        'temp_avg': round(temp_avg, 2),
+        'humid_avg': round(humid_avg, 2),
+        'alert_count': stats['alert_count'],
+        'stats': stats,
+        'reading_id': recent['reading_id'],
+        'alert_id': recent['alert_id']
+    }
+
 @app.route('/api/data')
 def get_data():
-    """Get data for dashboard"""
+    """Get data for dashboard (from the in-memory read model)"""
     try:
-        data = load_data()
-        readings = data.get('readings', [])
-        alerts = data.get('alerts', [])
-        
-        print(f"Total readings: {len(readings)}, Total alerts: {len(alerts)}")
-        
-        # Get last 30 readings
-        latest_readings = readings[-30:] if len(readings) > 30 else readings
-        
-        # Reverse to show newest first
-        latest_readings = list(reversed(latest_readings))
-        
-        # Calculate averages
-        temps = [r['value'] for r in readings if r.get('sensor_type') == 'temperature']
-        humids = [r['value'] for r in readings if r.get('sensor_type') == 'humidity']
-        
-        temp_avg = sum(temps) / len(temps) if temps else 0
-        humid_avg = sum(humids) / len(humids) if humids else 0
-        
-        print(f"Temp avg: {temp_avg}, Humid avg: {humid_avg}")
-        
-        # Get recent alerts (last 10)
-        recent_alerts = alerts[-10:] if len(alerts) > 10 else alerts
-        recent_alerts = list(reversed(recent_alerts))
-        
-        result = {
-            'readings': latest_readings,
-            'alerts': recent_alerts,
-            'temp_avg': round(temp_avg, 2),
-            'humid_avg': round(humid_avg, 2),
-            'alert_count': len(recent_alerts)
-        }
-        
-        print(f"Returning: {len(result['readings'])} readings, {len(result['alerts'])} alerts")
-        return jsonify(result), 200
+        return jsonify(build_snapshot()), 200
         
     except Exception as e:
         print(f"ERROR in get_data: {e}")
@@ -82,6 +62,12 @@ def get_data():
             'alert_count': 0
         }), 500
 
+@app.route('/api/stream')
+def stream():
+    """Server-Sent Events: a snapshot, then deltas as readings arrive"""
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(get_live_feed().stream(build_snapshot()), mimetype='text/event-stream', headers=headers)
+
 if __name__ == '__main__':
     print("="*60)
     print("Starting IoT Dashboard")
@@ -1,77 +1,102 @@
-import json
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 import threading
 
-DATABASE_FILE = 'sensor_data.json'
+from config import STORAGE_BACKEND, SQLITE_FILE, JSON_FILE, HISTORY_MAX_POINTS
+from storage import open_storage
+from read_model import ReadModel
+from retention import cutoffs
+from rollups import RESOLUTIONS, TIERS, choose_resolution
 
-# Lock to prevent concurrent writes
-file_lock = threading.Lock()
+# Keep the data next to the code, wherever the process is started from
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_FILE = os.path.join(BASE_DIR, SQLITE_FILE if STORAGE_BACKEND == 'sqlite' else JSON_FILE)
+
+_storage = None
+_read_model = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """Open the configured storage backend once per process"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = open_storage(STORAGE_BACKEND, DATABASE_FILE)
+    return _storage
+
+def get_read_model():
+    """Create the in-memory read model once per process"""
+    global _read_model
+    if _read_model is None:
+        storage = get_storage()
+        with _storage_lock:
+            if _read_model is None:
+                _read_model = ReadModel(storage)
+    return _read_model
 
 def init_database():
-    """Create database file if it doesn't exist"""
-    if not os.path.exists(DATABASE_FILE):
-        with file_lock:
-            with open(DATABASE_FILE, 'w') as f:
-                json.dump({
-                    'readings': [],
-                    'alerts': []
-                }, f)
-
-def load_data():
-    """Load all data from file"""
-    init_database()
-    with file_lock:
-        try:
-            with open(DATABASE_FILE, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            # If file is corrupted, reset it
-            print("Warning: Corrupted JSON file detected. Resetting...")
-            return {'readings': [], 'alerts': []}
-
-def save_data(data):
-    """Save all data to file"""
-    with file_lock:
-        with open(DATABASE_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
+    """Create the database if it doesn't exist"""
+    get_storage()
 
 def add_reading(sensor_id, sensor_type, value):
     """Add a new sensor reading"""
-    with file_lock:
-        data = load_data()
-        data['readings'].append({
-            'sensor_id': sensor_id,
-            'sensor_type': sensor_type,
-            'value': value,
-            'timestamp': datetime.now().isoformat()
-        })
-        save_data(data)
+    get_storage().add_readings([{
+        'sensor_id': sensor_id,
+        'sensor_type': sensor_type,
+        'value': value,
+        'timestamp': datetime.now().isoformat()
+    }])
+
+def add_batch(readings, alerts):
+    """Add readings and their alerts with a single storage write"""
+    get_storage().add_batch(readings, alerts)
 
 def get_latest_readings(limit=50):
     """Get last N readings"""
-    data = load_data()
-    return data['readings'][-limit:]
+    return get_read_model().latest_readings(limit)
 
 def add_alert(sensor_id, sensor_type, message):
     """Add an alert"""
-    with file_lock:
-        data = load_data()
-        data['alerts'].append({
-            'sensor_id': sensor_id,
-            'sensor_type': sensor_type,
-            'message': message,
-            'timestamp': datetime.now().isoformat()
-        })
-        save_data(data)
+    get_storage().add_alerts([{
+        'sensor_id': sensor_id,
+        'sensor_type': sensor_type,
+        'message': message,
+        'timestamp': datetime.now().isoformat()
+    }])
 
 def get_alerts():
     """Get all alerts from last hour"""
-    data = load_data()
-    return data['alerts'][-20:]
-
-def get_history(sensor_id, sensor_type):
-    """Get all readings for a sensor"""
-    data = load_data()
-    return [r for r in data['readings'] 
-            if r['sensor_id'] == sensor_id and r['sensor_type'] == sensor_type]
\ No newline at end of file
+    return get_read_model().latest_alerts(20)
+
+def pick_resolution(sensor_id, sensor_type, start=None, end=None, max_points=HISTORY_MAX_POINTS):
+    """Finest resolution that returns at most max_points points for the range
+
+    Resolutions whose retention no longer covers the start of the range are
+    skipped, so expired raw or minute data never truncates the answer.
+    """
+    count, first, last = get_storage().range_summary(sensor_id, sensor_type, start, end)
+    if last:
+        # `last` starts the newest hourly bucket; its readings run to its end
+        last = (datetime.fromisoformat(last) + timedelta(seconds=TIERS['1h'][0] - 1)).isoformat()
+    first = max(first, start) if first and start else first
+    last = min(last, end) if last and end else last
+    return choose_resolution(count, first, last, max_points, cutoffs(sensor_type, datetime.now()))
+
+def get_history(sensor_id, sensor_type, start=None, end=None, resolution='raw', max_points=HISTORY_MAX_POINTS):
+    """Get readings for a sensor, optionally between two ISO timestamps
+
+    resolution is 'raw', a rollup tier ('1m', '1h', '1d') or 'auto'.
+    Returns (resolution used, points).
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution: {resolution}")
+    if resolution == 'auto':
+        resolution = pick_resolution(sensor_id, sensor_type, start, end, max_points)
+    if resolution == 'raw':
+        return resolution, get_read_model().history(sensor_id, sensor_type, start, end)
+    return resolution, get_storage().rollups(sensor_id, sensor_type, resolution, start, end)
+
+def get_stats():
+    """Get running statistics per sensor type and windowed averages per sensor"""
+    return get_read_model().stats()
@@ -0,0 +1,96 @@
+"""Background writer for batched sensor readings
+
+The batch endpoint only validates readings and puts them on a bounded queue.
+A single writer thread takes whatever has queued up (at most
+INGEST_BATCH_SIZE readings, waiting at most INGEST_FLUSH_INTERVAL seconds),
+evaluates the alert rules over the whole group at once, and stores the
+readings and their alerts with one database.add_batch call. Readings keep
+the timestamp the client sent; only those without one get the time they
+were queued.
+"""
+import queue
+import threading
+import time
+from datetime import datetime
+
+from config import INGEST_BATCH_SIZE, INGEST_FLUSH_INTERVAL, INGEST_QUEUE_SIZE
+from database import add_batch
+from alerter import evaluate_readings
+
+
+class IngestQueue:
+    """Queue of readings flushed to storage in groups by one thread"""
+
+    def __init__(self, batch_size=INGEST_BATCH_SIZE, flush_interval=INGEST_FLUSH_INTERVAL,
+                 max_size=INGEST_QUEUE_SIZE, write=add_batch):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.write = write
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {'queued': 0, 'written': 0, 'alerts': 0, 'batches': 0, 'errors': 0}
+
+    def start(self):
+        """Start the writer thread (once)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='ingest-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, readings):
+        """Queue readings, stamping those without a timestamp; returns False if the queue is too full"""
+        self.start()
+        if self._queue.maxsize - self._queue.qsize() < len(readings):
+            return False
+        timestamp = datetime.now().isoformat()
+        for reading in readings:
+            if not reading.get('timestamp'):
+                reading['timestamp'] = timestamp
+            self._queue.put(reading)
+        with self._lock:
+            self.stats['queued'] += len(readings)
+        return True
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _take_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            readings = self._take_batch()
+            try:
+                alerts = evaluate_readings(readings)
+            except Exception as e:
+                # Still store the readings; only their alerts are lost
+                print(f"Error evaluating rules for {len(readings)} readings: {e}")
+                alerts = []
+                with self._lock:
+                    self.stats['errors'] += 1
+            for r in readings:
+                # Only used to pick rules; not stored
+                r.pop('site', None)
+            try:
+                self.write(readings, alerts)
+            except Exception as e:
+                print(f"Error writing batch of {len(readings)} readings: {e}")
+                with self._lock:
+                    self.stats['errors'] += 1
+                continue
+            with self._lock:
+                self.stats['written'] += len(readings)
+                self.stats['alerts'] += len(alerts)
+                self.stats['batches'] += 1
+
+
+ingest_queue = IngestQueue()
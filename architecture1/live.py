@@ -0,0 +1,148 @@
+"""Server-Sent Events feed for the dashboard
+
+Instead of every browser polling /api/data, one pump thread per dashboard
+process refreshes the read model every STREAM_PUSH_INTERVAL seconds. It then
+publishes a single delta event to every subscriber. The event holds the
+readings and alerts written since the last push and the updated aggregates.
+This is the broadcast pattern of architecture2's aggregator:
+
+- each subscriber has its own bounded queue (STREAM_CLIENT_BUFFER events);
+- a subscriber whose queue is full is disconnected instead of slowing the
+  others down. The browser's EventSource reconnects by itself and starts
+  again from a fresh snapshot.
+
+Rows in a delta carry their id. A snapshot carries the ids of the newest
+reading and alert it includes (ReadModel.recent), and the browser skips
+delta rows at or below those, which were already in its snapshot.
+"""
+import json
+import queue
+import threading
+from collections import deque
+
+from config import STREAM_PUSH_INTERVAL, STREAM_CLIENT_BUFFER, STREAM_KEEPALIVE
+
+# Put in a dropped subscriber's queue to end its stream
+_DROPPED = object()
+# Rows kept per delta; the dashboard shows far fewer
+MAX_DELTA_ROWS = 100
+
+
+class Subscriber:
+    def __init__(self, size):
+        self.queue = queue.Queue(maxsize=size)
+        self.dropped = False
+
+
+class Broadcaster:
+    """Fan-out of events to subscribers with bounded buffers"""
+
+    def __init__(self, buffer_size=STREAM_CLIENT_BUFFER):
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self.stats = {'published': 0, 'dropped_clients': 0}
+
+    def subscribe(self):
+        subscriber = Subscriber(self.buffer_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.stats['published'] += 1
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(event)
+            except queue.Full:
+                self._drop(subscriber)
+
+    def _drop(self, subscriber):
+        """Disconnect a subscriber that fell too far behind"""
+        with self._lock:
+            if subscriber not in self._subscribers:
+                return
+            self._subscribers.discard(subscriber)
+            self.stats['dropped_clients'] += 1
+        subscriber.dropped = True
+        # Make room for the marker so the stream ends promptly
+        try:
+            subscriber.queue.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            subscriber.queue.put_nowait(_DROPPED)
+        except queue.Full:
+            pass
+
+
+class LiveFeed:
+    """Collects read-model changes and pushes them as delta events"""
+
+    def __init__(self, read_model, interval=STREAM_PUSH_INTERVAL):
+        self.read_model = read_model
+        self.interval = interval
+        self.broadcaster = Broadcaster()
+        self._pending_lock = threading.Lock()
+        self._readings = deque(maxlen=MAX_DELTA_ROWS)
+        self._alerts = deque(maxlen=MAX_DELTA_ROWS)
+        self._wake = threading.Event()
+        self._thread = None
+        read_model.add_listener(self._on_row)
+
+    def _on_row(self, kind, row, row_id):
+        # The id lets a client skip rows its snapshot already had
+        with self._pending_lock:
+            (self._readings if kind == 'reading' else self._alerts).append(dict(row, id=row_id))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='live-feed', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            # Idle while nobody is watching
+            if self.broadcaster.count() == 0:
+                self._wake.wait()
+                self._wake.clear()
+            self.read_model.refresh()
+            with self._pending_lock:
+                readings, alerts = list(self._readings), list(self._alerts)
+                self._readings.clear()
+                self._alerts.clear()
+            if readings or alerts:
+                # Encoded once, whatever the number of subscribers
+                delta = json.dumps({'readings': readings, 'alerts': alerts, 'stats': self.read_model.stats()})
+                self.broadcaster.publish(f"event: delta\ndata: {delta}\n\n")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def stream(self, snapshot):
+        """SSE lines for one client: `snapshot` first, then deltas until it disconnects"""
+        self.start()
+        subscriber = self.broadcaster.subscribe()
+        self._wake.set()
+        try:
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+            while True:
+                try:
+                    event = subscriber.queue.get(timeout=STREAM_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is _DROPPED:
+                    return
+                yield event
+        finally:
+            self.broadcaster.unsubscribe(subscriber)
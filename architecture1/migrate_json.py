@@ -0,0 +1,42 @@
+"""Copy an old sensor_data.json into the SQLite storage backend
+
+Usage: python migrate_json.py [sensor_data.json] [sensor_data.db]
+
+The target must not hold any readings or alerts yet, so running the
+migration twice cannot copy the history twice.
+"""
+import json
+import os
+import sys
+
+from storage import SQLiteStorage
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BATCH_SIZE = 10000
+
+def migrate(json_path, sqlite_path):
+    """Copy every reading and alert from json_path into an empty sqlite_path"""
+    with open(json_path, 'r') as f:
+        data = json.load(f)
+    target = SQLiteStorage(sqlite_path)
+    if target.last_ids() != (0, 0):
+        target.close()
+        raise ValueError(f"{sqlite_path} already holds readings or alerts; not migrating again")
+    # Rows expired by the compactor are left as nulls
+    readings = [r for r in data.get('readings', []) if r]
+    alerts = [a for a in data.get('alerts', []) if a]
+    for start in range(0, len(readings), BATCH_SIZE):
+        target.add_readings(readings[start:start + BATCH_SIZE])
+    for start in range(0, len(alerts), BATCH_SIZE):
+        target.add_alerts(alerts[start:start + BATCH_SIZE])
+    target.close()
+    return len(readings), len(alerts)
+
+if __name__ == '__main__':
+    json_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(BASE_DIR, 'sensor_data.json')
+    sqlite_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(BASE_DIR, 'sensor_data.db')
+    try:
+        readings, alerts = migrate(json_path, sqlite_path)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    print(f"Migrated {readings} readings and {alerts} alerts into {sqlite_path}")
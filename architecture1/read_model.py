@@ -0,0 +1,321 @@
+"""In-memory read model for the latest readings, alerts and sensor history
+
+The read model tails the store by row id: before answering a query, it pulls
+only the rows written since the last query, whichever process wrote them.
+From those rows it keeps:
+
+- ring buffers of the latest CACHE_LATEST readings and alerts;
+- one time-ordered index per (sensor_id, sensor_type) with that sensor's
+  newest CACHE_PER_SENSOR readings. Ranges are found by bisecting on the
+  timestamp.
+
+On start only the ring buffers are filled. A sensor's index is loaded the
+first time that sensor is queried, so start-up time does not depend on how
+much history is stored. Queries reaching further back than the cache
+(older history, or more readings than are buffered) go to the store.
+
+Every tailed reading is also fed to a StreamingAggregator (aggregator.py),
+which keeps the dashboard's running statistics, next to the number of
+stored alerts. Both are seeded from the store on the first refresh.
+
+At most every EXPIRE_INTERVAL seconds, a refresh also applies the retention
+policy (retention.py). Expired readings and alerts leave the buffers and
+indexes. This happens whether or not the compactor has deleted those rows
+yet, and it works in processes that run no compactor, such as the dashboard.
+The statistics are seeded again over the rows still kept only when the
+oldest row they count, tracked per sensor type, has expired. That seed
+scans the store outside the lock; rows tailed meanwhile are added on top
+when the new totals are swapped in.
+
+Listeners added with add_listener are called with ('reading' | 'alert', row,
+row id) for each new row (under the lock, so they must be quick), e.g. to
+push deltas to browsers. recent() returns what such a feed starts from, with
+the ids it reaches, so later rows can be told apart from those already sent.
+"""
+import bisect
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from itertools import islice
+
+from config import CACHE_LATEST, CACHE_PER_SENSOR, COMPACT_INTERVAL, RETENTION_DAYS
+from aggregator import StreamingAggregator
+from retention import cutoffs
+
+# Rows pulled from the store per query while catching up
+TAIL_CHUNK = 10000
+# Seconds between two passes of the retention policy over the caches
+EXPIRE_INTERVAL = COMPACT_INTERVAL
+
+
+def _newest(buffer, limit):
+    """Last `limit` items of a deque, oldest first, in O(limit)"""
+    return list(islice(reversed(buffer), limit))[::-1]
+
+
+def _expired(row, before):
+    """Whether a row is older than before[its sensor type]"""
+    oldest = before.get(row['sensor_type'])
+    return oldest is not None and row['timestamp'] < oldest
+
+
+def _older(oldest, before):
+    """Whether any sensor type's oldest timestamp is older than before[its type]"""
+    return any(sensor_type in before and timestamp < before[sensor_type]
+               for sensor_type, timestamp in oldest.items())
+
+
+def _track(oldest, row):
+    """Lower oldest[row's sensor type] to the row's timestamp"""
+    current = oldest.get(row['sensor_type'])
+    if current is None or row['timestamp'] < current:
+        oldest[row['sensor_type']] = row['timestamp']
+
+
+def _public(row):
+    """Drop the storage id from a row"""
+    row = dict(row)
+    row.pop('id', None)
+    return row
+
+
+class SensorIndex:
+    """Time-ordered readings of one sensor"""
+
+    def __init__(self, rows, complete):
+        self.timestamps = [r['timestamp'] for r in rows]
+        self.readings = [_public(r) for r in rows]
+        # True while the index still holds every reading of the sensor
+        self.complete = complete
+
+    def add(self, reading, limit):
+        timestamp = reading['timestamp']
+        if not self.timestamps or timestamp >= self.timestamps[-1]:
+            self.timestamps.append(timestamp)
+            self.readings.append(reading)
+        else:
+            # Late reading (client-supplied timestamp); keep the order
+            position = bisect.bisect_right(self.timestamps, timestamp)
+            self.timestamps.insert(position, timestamp)
+            self.readings.insert(position, reading)
+        if len(self.readings) > limit + limit // 4:
+            # Trim in chunks so the cost is amortised over many appends
+            drop = len(self.readings) - limit
+            del self.timestamps[:drop]
+            del self.readings[:drop]
+            self.complete = False
+
+    def expire(self, before):
+        """Drop readings with timestamp < before"""
+        drop = bisect.bisect_left(self.timestamps, before)
+        del self.timestamps[:drop]
+        del self.readings[:drop]
+
+    def covers(self, start):
+        return self.complete or (start is not None and self.timestamps and start >= self.timestamps[0])
+
+    def range(self, start, end):
+        lo = 0 if start is None else bisect.bisect_left(self.timestamps, start)
+        hi = len(self.timestamps) if end is None else bisect.bisect_right(self.timestamps, end)
+        return self.readings[lo:hi]
+
+
+class ReadModel:
+    """Process-local cache of the store, kept current by tailing new rows"""
+
+    def __init__(self, storage, latest=CACHE_LATEST, per_sensor=CACHE_PER_SENSOR,
+                 retention_days=RETENTION_DAYS, expire_interval=EXPIRE_INTERVAL):
+        self.storage = storage
+        self.per_sensor = per_sensor
+        self.retention_days = retention_days
+        self.expire_interval = expire_interval
+        self.lock = threading.Lock()
+        self.readings = deque(maxlen=latest)
+        self.alerts = deque(maxlen=latest)
+        self.sensors = {}
+        reading_id, alert_id = storage.last_ids()
+        # Start just far enough back to fill the ring buffers
+        self.reading_id = max(reading_id - latest, 0)
+        self.alert_id = max(alert_id - latest, 0)
+        # Whether the buffers hold every row ever written
+        self.readings_complete = self.reading_id == 0
+        self.alerts_complete = self.alert_id == 0
+        self.aggregator = StreamingAggregator()
+        self.alert_count = 0
+        # Oldest reading and alert timestamp kept per sensor type
+        self.readings_before = {}
+        self.alerts_before = {}
+        self._expired_at = None
+        # Oldest reading and alert timestamp counted by the statistics, per sensor type
+        self._oldest_readings = {}
+        self._oldest_alerts = {}
+        self._seeded = False
+        # (readings, alerts) tailed while a seed is running, else None
+        self._pending = None
+        self.listeners = []
+        # Fills the buffers, then seeds the statistics through expire()
+        self.refresh()
+
+    def add_listener(self, listener):
+        with self.lock:
+            self.listeners.append(listener)
+
+    def refresh(self):
+        """Apply rows written since the last refresh, and the retention policy when it is due"""
+        with self.lock:
+            while True:
+                rows = self.storage.readings_after(self.reading_id, TAIL_CHUNK)
+                for row in rows:
+                    self._add_reading(row)
+                if len(rows) < TAIL_CHUNK:
+                    break
+            while True:
+                rows = self.storage.alerts_after(self.alert_id, TAIL_CHUNK)
+                for row in rows:
+                    self._add_alert(row)
+                if len(rows) < TAIL_CHUNK:
+                    break
+            # Claimed under the lock, so concurrent refreshes expire once
+            due = self._expired_at is None or time.monotonic() - self._expired_at >= self.expire_interval
+            if due:
+                self._expired_at = time.monotonic()
+        if due:
+            self.expire()
+
+    def expire(self, now=None):
+        """Drop rows past their retention, and seed the statistics again if they counted any"""
+        now = now or datetime.now()
+        readings_before, alerts_before = {}, {}
+        for sensor_type in self.storage.sensor_types():
+            kept = cutoffs(sensor_type, now, self.retention_days)
+            if 'raw' in kept:
+                readings_before[sensor_type] = kept['raw']
+            if 'alerts' in kept:
+                alerts_before[sensor_type] = kept['alerts']
+        with self.lock:
+            self._expired_at = time.monotonic()
+            self.readings_before, self.alerts_before = readings_before, alerts_before
+            self.readings = deque((r for r in self.readings if not _expired(r, readings_before)),
+                                  maxlen=self.readings.maxlen)
+            self.alerts = deque((a for a in self.alerts if not _expired(a, alerts_before)),
+                                maxlen=self.alerts.maxlen)
+            for (_, sensor_type), index in self.sensors.items():
+                if sensor_type in readings_before:
+                    index.expire(readings_before[sensor_type])
+            self.aggregator.expire(readings_before)
+            # Totals can't take values back out, so they are counted again,
+            # but only once a row they count has expired
+            stale = (not self._seeded or _older(self._oldest_readings, readings_before)
+                     or _older(self._oldest_alerts, alerts_before))
+            # One seed at a time; a later pass picks up what this one skips
+            if not stale or self._pending is not None:
+                return
+            reading_id, alert_id = self.reading_id, self.alert_id
+            self._pending = ([], [])
+        try:
+            type_stats = self.storage.type_stats(reading_id, readings_before)
+            alert_count = self.storage.alert_count(alert_id, alerts_before)
+            oldest_readings = self.storage.oldest('readings', readings_before)
+            oldest_alerts = self.storage.oldest('alerts', alerts_before)
+        except Exception:
+            with self.lock:
+                self._pending = None
+            raise
+        with self.lock:
+            readings, alerts = self._pending
+            self._pending = None
+            self.aggregator.seed(type_stats, readings)
+            self.alert_count = alert_count + len(alerts)
+            for row in readings:
+                _track(oldest_readings, row)
+            for row in alerts:
+                _track(oldest_alerts, row)
+            self._oldest_readings, self._oldest_alerts = oldest_readings, oldest_alerts
+            self._seeded = True
+
+    def _add_reading(self, row):
+        self.reading_id = row['id']
+        reading = _public(row)
+        if len(self.readings) == self.readings.maxlen:
+            self.readings_complete = False
+        self.readings.append(reading)
+        self.aggregator.add(reading)
+        _track(self._oldest_readings, reading)
+        if self._pending is not None:
+            self._pending[0].append(reading)
+        for listener in self.listeners:
+            listener('reading', reading, row['id'])
+        index = self.sensors.get((str(reading['sensor_id']), reading['sensor_type']))
+        if index is not None:
+            index.add(reading, self.per_sensor)
+
+    def _add_alert(self, row):
+        self.alert_id = row['id']
+        self.alert_count += 1
+        alert = _public(row)
+        if len(self.alerts) == self.alerts.maxlen:
+            self.alerts_complete = False
+        self.alerts.append(alert)
+        _track(self._oldest_alerts, alert)
+        if self._pending is not None:
+            self._pending[1].append(alert)
+        for listener in self.listeners:
+            listener('alert', alert, row['id'])
+
+    def latest_readings(self, limit):
+        """Last N readings, oldest first"""
+        self.refresh()
+        with self.lock:
+            if limit <= len(self.readings) or self.readings_complete:
+                return _newest(self.readings, limit)
+            before = self.readings_before
+        return [r for r in self.storage.latest_readings(limit) if not _expired(r, before)]
+
+    def latest_alerts(self, limit):
+        """Last N alerts, oldest first"""
+        self.refresh()
+        with self.lock:
+            if limit <= len(self.alerts) or self.alerts_complete:
+                return _newest(self.alerts, limit)
+            before = self.alerts_before
+        return [a for a in self.storage.latest_alerts(limit) if not _expired(a, before)]
+
+    def recent(self, readings, alerts):
+        """Newest buffered readings and alerts, the stats and the ids they reach, from one refresh
+
+        Expiry only ever drops the oldest rows, so the buffers always hold
+        the newest ones.
+        """
+        self.refresh()
+        with self.lock:
+            return {
+                'readings': _newest(self.readings, readings),
+                'alerts': _newest(self.alerts, alerts),
+                'stats': dict(self.aggregator.snapshot(), alert_count=self.alert_count),
+                'reading_id': self.reading_id,
+                'alert_id': self.alert_id
+            }
+
+    def stats(self):
+        """Running statistics over every kept reading, and the number of kept alerts"""
+        self.refresh()
+        with self.lock:
+            return dict(self.aggregator.snapshot(), alert_count=self.alert_count)
+
+    def history(self, sensor_id, sensor_type, start=None, end=None):
+        """Readings of one sensor with start <= timestamp <= end, oldest first"""
+        self.refresh()
+        key = (str(sensor_id), sensor_type)
+        with self.lock:
+            oldest = self.readings_before.get(sensor_type)
+            if oldest is not None and (start is None or start < oldest):
+                start = oldest
+            index = self.sensors.get(key)
+            if index is None:
+                rows = self.storage.sensor_readings(sensor_id, sensor_type, self.reading_id, self.per_sensor)
+                index = SensorIndex(rows, complete=len(rows) < self.per_sensor)
+                self.sensors[key] = index
+            if index.covers(start):
+                return index.range(start, end)
+        return self.storage.history(sensor_id, sensor_type, start, end)
@@ -0,0 +1,33 @@
+"""Retention policy: how long each kind of data is kept per sensor type
+
+config.RETENTION_DAYS is applied in two places. compactor.py deletes old
+rows from the store, and read_model.py drops them from its caches and
+statistics, in every process that has one.
+"""
+from datetime import timedelta
+
+from config import RETENTION_DAYS
+from rollups import TIERS, bucket
+
+
+def retention(sensor_type, retention_days=RETENTION_DAYS):
+    """Days kept per kind of data ('raw', 'alerts', tiers) for a sensor type"""
+    days = dict(retention_days.get('default', {}))
+    days.update(retention_days.get(sensor_type, {}))
+    # A tier never expires before the raw data it summarises
+    raw = days.get('raw')
+    for tier in TIERS:
+        if days.get(tier) is not None and (raw is None or days[tier] < raw):
+            days[tier] = raw
+    return days
+
+
+def cutoffs(sensor_type, now, retention_days=RETENTION_DAYS):
+    """Oldest timestamp (bucket, for tiers) kept at `now` per kind of data; kinds kept forever are left out"""
+    kept = {}
+    for kind, days in retention(sensor_type, retention_days).items():
+        if days is None:
+            continue
+        oldest = (now - timedelta(days=days)).isoformat()
+        kept[kind] = bucket(oldest, kind) if kind in TIERS else oldest
+    return kept
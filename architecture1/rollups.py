@@ -0,0 +1,97 @@
+"""Rollup tiers for long history queries
+
+Each tier keeps count/sum/min/max per sensor and time bucket. The storage
+backends update all tiers in the same transaction that stores the readings,
+so the rollups never lag behind the raw data. Buckets are identified by
+their start time, written in the same ISO format as reading timestamps and
+cut from them as strings. A bucket therefore compares with reading
+timestamps the same way the raw history queries do.
+
+A history query names a resolution: 'raw', one of the tiers, or 'auto'.
+'auto' picks the finest resolution whose point count stays within the
+caller's budget, among those whose retention still reaches back to the
+start of the range.
+"""
+from datetime import datetime
+
+# name -> (bucket length in seconds, characters of the timestamp kept, padding)
+TIERS = {
+    '1m': (60, 16, ':00'),
+    '1h': (3600, 13, ':00:00'),
+    '1d': (86400, 10, 'T00:00:00'),
+}
+RESOLUTIONS = ('raw',) + tuple(TIERS) + ('auto',)
+
+
+def bucket(timestamp, tier):
+    """Start of the tier bucket holding `timestamp`"""
+    _, keep, padding = TIERS[tier]
+    return timestamp[:keep] + padding
+
+
+def summarise(readings):
+    """Rollup rows for a group of readings: {(tier, sensor_id, sensor_type, bucket): [count, sum, min, max]}"""
+    rows = {}
+    for r in readings:
+        value = r['value']
+        for tier in TIERS:
+            key = (tier, str(r['sensor_id']), r['sensor_type'], bucket(r['timestamp'], tier))
+            row = rows.get(key)
+            if row is None:
+                rows[key] = [1, value, value, value]
+            else:
+                merge(row, 1, value, value, value)
+    return rows
+
+
+def merge(row, count, total, low, high):
+    """Add a summary to a [count, sum, min, max] row in place"""
+    row[0] += count
+    row[1] += total
+    row[2] = min(row[2], low)
+    row[3] = max(row[3], high)
+
+
+def point(sensor_id, sensor_type, timestamp, count, total, low, high):
+    """One history point of a rollup tier; `value` is the bucket average"""
+    average = round(total / count, 2) if count else None
+    return {
+        'sensor_id': sensor_id,
+        'sensor_type': sensor_type,
+        'timestamp': timestamp,
+        'value': average,
+        'count': count,
+        'min': low,
+        'max': high
+    }
+
+
+def _seconds(timestamp):
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def choose_resolution(count, first, last, max_points, kept=None):
+    """Finest resolution with at most max_points points
+
+    `count` is the number of raw readings in the range. `first` and `last`
+    are the timestamps of its first and last readings. `kept` maps
+    resolutions to the oldest timestamp they still hold (retention.cutoffs);
+    a resolution whose data starts after `first` is skipped.
+    """
+    kept = kept or {}
+
+    def reaches(resolution):
+        return kept.get(resolution) is None or first is None or first >= kept[resolution]
+
+    if count <= max_points and reaches('raw'):
+        return 'raw'
+    begin, end = _seconds(first), _seconds(last)
+    if begin is None or end is None:
+        return list(TIERS)[-1]
+    for tier, (seconds, _, _) in TIERS.items():
+        if reaches(tier) and (end - begin) / seconds + 1 <= max_points:
+            return tier
+    return list(TIERS)[-1]
@@ -0,0 +1,360 @@
+"""Alert rule engine, evaluated over batches of readings with NumPy
+
+Rules come from RULES_FILE (see alert_rules.example.json). Without that
+file they come from the thresholds in config.py. The file is re-read when it
+changes, so rules can be edited while the gateway runs. Each rule has a
+`name`, a `sensor_type`, optionally a `sensor_id` or `site` it is limited
+to, and a `kind`:
+
+- threshold: `high` and/or `low`, with `hysteresis`. The alert fires when
+  the value crosses the bound. It does not fire again until the value has
+  come back by `hysteresis`.
+- rate: fires when the value changes faster than `max_rate` units per
+  second between two consecutive readings of a sensor. Readings with the
+  same or an earlier timestamp than the one before have no rate.
+- window: like threshold, but on the average over the last `window`
+  seconds.
+
+For each reading, the most specific rule of each kind applies: sensor_id
+beats site, and site beats sensor_type. Rules are compiled into a table of
+NumPy columns. A batch is sorted by sensor and time, and every rule kind is
+then evaluated with array operations. The hysteresis state machine is
+computed with a forward fill rather than a loop. Past unpacking the
+readings, Python only loops over distinct sensors and over the alerts that
+actually fire. Those alerts are
+then deduplicated (one per rule and sensor every `cooldown` seconds) and
+rate limited (ALERT_MAX_PER_MINUTE per sensor) before they reach storage.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+from config import (TEMP_HIGH, TEMP_LOW, HUMIDITY_HIGH, HUMIDITY_LOW, RULES_FILE, RULES_CHECK_INTERVAL,
+                    ALERT_HYSTERESIS, ALERT_COOLDOWN, ALERT_MAX_PER_MINUTE)
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), RULES_FILE)
+KINDS = ('threshold', 'rate', 'window')
+UNITS = {'temperature': '°C', 'humidity': '%'}
+
+
+def default_rules():
+    """The fixed thresholds the alerter used to hard-code"""
+    return [
+        {'name': 'temperature', 'kind': 'threshold', 'sensor_type': 'temperature',
+         'high': TEMP_HIGH, 'low': TEMP_LOW},
+        {'name': 'humidity', 'kind': 'threshold', 'sensor_type': 'humidity',
+         'high': HUMIDITY_HIGH, 'low': HUMIDITY_LOW},
+    ]
+
+
+def _seconds(timestamp):
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+
+def _number(rule, field):
+    value = rule.get(field)
+    return np.nan if value is None else float(value)
+
+
+class RuleTable:
+    """Rules compiled into per-kind NumPy columns plus a scope lookup"""
+
+    def __init__(self, rules):
+        self.rules = []
+        self.columns = {}
+        self._scopes = {kind: {} for kind in KINDS}
+        self._resolved = {}
+        names = set()
+        for rule in rules:
+            kind = rule.get('kind', 'threshold')
+            if kind not in KINDS:
+                raise ValueError(f"Unknown rule kind: {kind}")
+            if not rule.get('name') or rule['name'] in names:
+                raise ValueError(f"Rules need unique names: {rule.get('name')!r}")
+            names.add(rule['name'])
+            rule = dict(rule, kind=kind)
+            rule.setdefault('unit', UNITS.get(rule.get('sensor_type'), ''))
+            self.rules.append(rule)
+        for kind in KINDS:
+            of_kind = [r for r in self.rules if r['kind'] == kind]
+            # Row -1 (no rule) reads the trailing NaN row
+            self.columns[kind] = {
+                'rules': of_kind,
+                'high': np.array([_number(r, 'high') for r in of_kind] + [np.nan]),
+                'low': np.array([_number(r, 'low') for r in of_kind] + [np.nan]),
+                'hysteresis': np.array([float(r.get('hysteresis', ALERT_HYSTERESIS)) for r in of_kind] + [0.0]),
+                'max_rate': np.array([_number(r, 'max_rate') for r in of_kind] + [np.nan]),
+                'window': np.array([float(r.get('window', 0)) for r in of_kind] + [0.0]),
+            }
+            for row, r in enumerate(of_kind):
+                if r.get('sensor_id') is not None:
+                    scope = ('sensor', str(r['sensor_id']))
+                elif r.get('site') is not None:
+                    scope = ('site', r['site'])
+                else:
+                    scope = ('type', None)
+                self._scopes[kind][(r.get('sensor_type'), scope)] = row
+
+    def resolve(self, sensor_id, sensor_type, site):
+        """Row of the applicable rule of each kind (-1 for none)"""
+        key = (sensor_id, sensor_type, site)
+        rows = self._resolved.get(key)
+        if rows is None:
+            rows = []
+            for kind in KINDS:
+                scopes = self._scopes[kind]
+                row = scopes.get((sensor_type, ('sensor', sensor_id)))
+                if row is None and site is not None:
+                    row = scopes.get((sensor_type, ('site', site)))
+                if row is None:
+                    row = scopes.get((sensor_type, ('type', None)), -1)
+                rows.append(row)
+            rows = self._resolved[key] = tuple(rows)
+        return rows
+
+
+def _schmitt(set_mask, reset_mask, group_start, initial):
+    """Hysteresis state per reading, without a Python loop
+
+    Readings are sorted by sensor. The state turns on where set_mask holds,
+    off where reset_mask holds, and otherwise keeps its previous value
+    (`initial` at the start of each sensor's run). Returns the state before
+    and after each reading.
+    """
+    n = len(set_mask)
+    events = set_mask | reset_mask | group_start
+    last_event = np.where(events, np.arange(n), 0)
+    np.maximum.accumulate(last_event, out=last_event)
+    value_at = np.where(set_mask, True, np.where(reset_mask, False, initial))
+    after = value_at[last_event]
+    before = np.empty(n, dtype=bool)
+    before[0:1] = initial[0:1]
+    before[1:] = np.where(group_start[1:], initial[1:], after[:-1])
+    return before, after
+
+
+class RuleEngine:
+    """Turns batches of readings into deduplicated, rate-limited alerts"""
+
+    def __init__(self, path=RULES_PATH, check_interval=RULES_CHECK_INTERVAL,
+                 cooldown=ALERT_COOLDOWN, max_per_minute=ALERT_MAX_PER_MINUTE):
+        self.path = path
+        self.check_interval = check_interval
+        self.cooldown = cooldown
+        self.max_per_minute = max_per_minute
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked = 0.0
+        self.table = RuleTable(default_rules())
+        # (rule name, sensor key) -> True while a threshold/window alert is active
+        self._active = {}
+        # (rule name, sensor key) -> (time, value) of the last reading, for rate rules
+        self._last = {}
+        # (rule name, sensor key) -> deque of (time, value) inside the window
+        self._windows = {}
+        # (rule name, sensor key) -> time of the last alert; sensor key -> recent alert times
+        self._last_alert = {}
+        self._recent = {}
+        self.stats = {'evaluated': 0, 'fired': 0, 'suppressed': 0, 'reloads': 0}
+        self._maybe_reload(force=True)
+
+    def _maybe_reload(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        try:
+            if mtime is None:
+                rules = default_rules()
+            else:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                rules = data['rules'] if isinstance(data, dict) else data
+            self.table = RuleTable(rules)
+            self._mtime = mtime
+            self.stats['reloads'] += 1
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # Keep the old rules until the file is fixed
+            print(f"Warning: could not load alert rules from {self.path}: {e}")
+            self._mtime = mtime
+
+    def evaluate(self, readings):
+        """Alerts (dicts ready for storage) raised by a batch of readings"""
+        if not readings:
+            return []
+        with self._lock:
+            self._maybe_reload()
+            return self._evaluate(readings)
+
+    def _evaluate(self, readings):
+        table = self.table
+        n = len(readings)
+        self.stats['evaluated'] += n
+        sensors = {}
+        sensor_rows = []
+        codes = []
+        for r in readings:
+            key = (str(r['sensor_id']), r['sensor_type'])
+            code = sensors.get(key)
+            if code is None:
+                # Rules are resolved once per sensor and batch
+                code = sensors[key] = len(sensors)
+                sensor_rows.append(table.resolve(key[0], key[1], r.get('site')))
+            codes.append(code)
+        keys = list(sensors)
+        codes = np.array(codes, dtype=np.int64)
+        # Applicable rule of each kind per reading, shape (len(KINDS), n)
+        rows = np.array(sensor_rows, dtype=np.int64).T[:, codes]
+        values = np.fromiter((r['value'] for r in readings), dtype=float, count=n)
+        times = np.fromiter((_seconds(r['timestamp']) for r in readings), dtype=float, count=n)
+
+        # Sort by sensor, then time; every sensor becomes one contiguous run
+        order = np.lexsort((times, codes))
+        codes, values, times, rows = codes[order], values[order], times[order], rows[:, order]
+        group_start = np.ones(n, dtype=bool)
+        group_start[1:] = codes[1:] != codes[:-1]
+        group_end = np.ones(n, dtype=bool)
+        group_end[:-1] = group_start[1:]
+
+        fired = []  # (sorted position, kind, direction, observed value)
+        for k, kind in enumerate(KINDS):
+            row = rows[k]
+            if not (row >= 0).any():
+                continue
+            columns = table.columns[kind]
+            if kind == 'threshold':
+                self._thresholds(columns, row, values, codes, keys, group_start, group_end, values, fired, kind)
+            elif kind == 'rate':
+                self._rates(columns, row, values, times, codes, keys, group_start, group_end, fired)
+            else:
+                means = self._window_means(columns, row, values, times, codes, keys, group_start, group_end)
+                self._thresholds(columns, row, means, codes, keys, group_start, group_end, means, fired, kind)
+
+        alerts = []
+        for position, kind, direction, observed in sorted(fired, key=lambda f: times[f[0]]):
+            rule = table.columns[kind]['rules'][rows[KINDS.index(kind), position]]
+            sensor_key = keys[codes[position]]
+            at = times[position]
+            if not self._allow(rule['name'], sensor_key, at):
+                self.stats['suppressed'] += 1
+                continue
+            reading = readings[order[position]]
+            alerts.append({
+                'sensor_id': reading['sensor_id'],
+                'sensor_type': reading['sensor_type'],
+                'message': self._message(rule, direction, observed),
+                'timestamp': reading['timestamp']
+            })
+        self.stats['fired'] += len(alerts)
+        return alerts
+
+    def _thresholds(self, columns, row, values, codes, keys, group_start, group_end, observed, fired, kind):
+        """Edge-triggered high/low alerts with hysteresis (threshold and window rules)"""
+        high, low, hysteresis = columns['high'][row], columns['low'][row], columns['hysteresis'][row]
+        names = [r['name'] for r in columns['rules']] + [None]
+        starts = np.flatnonzero(group_start)
+        lengths = np.diff(np.append(starts, len(values)))
+        for direction, set_mask, reset_mask in (
+            ('high', values > high, values <= high - hysteresis),
+            ('low', values < low, values >= low + hysteresis),
+        ):
+            # State carried over from earlier batches, one lookup per sensor
+            initial = np.repeat(np.array([
+                self._active.get((names[row[s]], keys[codes[s]], direction), False) for s in starts
+            ], dtype=bool), lengths)
+            before, after = _schmitt(set_mask, reset_mask, group_start, initial)
+            for position in np.flatnonzero(after & ~before):
+                fired.append((position, kind, direction, observed[position]))
+            for position in np.flatnonzero(group_end & (row >= 0)):
+                state_key = (names[row[position]], keys[codes[position]], direction)
+                if after[position]:
+                    self._active[state_key] = True
+                else:
+                    self._active.pop(state_key, None)
+
+    def _rates(self, columns, row, values, times, codes, keys, group_start, group_end, fired):
+        names = [r['name'] for r in columns['rules']] + [None]
+        previous_value = np.empty_like(values)
+        previous_time = np.empty_like(times)
+        previous_value[1:], previous_time[1:] = values[:-1], times[:-1]
+        # Each sensor's first reading continues from the previous batch
+        for position in np.flatnonzero(group_start):
+            last = self._last.get((names[row[position]], keys[codes[position]]))
+            previous_time[position], previous_value[position] = last if last else (np.nan, np.nan)
+        # Pairs with equal or out-of-order timestamps have no rate
+        elapsed = times - previous_time
+        valid = elapsed > 0
+        rates = np.full(len(values), np.nan)
+        np.divide(np.abs(values - previous_value), elapsed, out=rates, where=valid)
+        for position in np.flatnonzero(valid & (rates > columns['max_rate'][row])):
+            fired.append((position, 'rate', 'rate', rates[position]))
+        for position in np.flatnonzero(group_end & (row >= 0)):
+            state_key = (names[row[position]], keys[codes[position]])
+            last = self._last.get(state_key)
+            # A batch of late readings must not move the sensor back in time
+            if last is None or times[position] >= last[0]:
+                self._last[state_key] = (times[position], values[position])
+
+    def _window_means(self, columns, row, values, times, codes, keys, group_start, group_end):
+        """Average over each rule's window, ending at every reading"""
+        names = [r['name'] for r in columns['rules']] + [None]
+        means = np.full(len(values), np.nan)
+        starts = np.flatnonzero(group_start)
+        ends = np.flatnonzero(group_end) + 1
+        for start, end in zip(starts, ends):
+            rw = row[start]
+            if rw < 0:
+                continue
+            state_key = (names[rw], keys[codes[start]])
+            window = columns['window'][rw]
+            carried = self._windows.get(state_key, deque())
+            all_times = np.concatenate([[t for t, _ in carried], times[start:end]])
+            all_values = np.concatenate([[v for _, v in carried], values[start:end]])
+            sums = np.concatenate([[0.0], np.cumsum(all_values)])
+            first = np.searchsorted(all_times, all_times - window, side='left')
+            counts = np.arange(1, len(all_values) + 1) - first
+            means[start:end] = ((sums[1:] - sums[first]) / counts)[len(carried):]
+            keep = all_times >= all_times[-1] - window
+            self._windows[state_key] = deque(zip(all_times[keep].tolist(), all_values[keep].tolist()))
+        return means
+
+    def _allow(self, rule_name, sensor_key, at):
+        """Dedup per rule and sensor, then rate limit per sensor"""
+        last = self._last_alert.get((rule_name, sensor_key))
+        if last is not None and at - last < self.cooldown:
+            return False
+        recent = self._recent.setdefault(sensor_key, deque())
+        while recent and recent[0] <= at - 60:
+            recent.popleft()
+        if len(recent) >= self.max_per_minute:
+            return False
+        recent.append(at)
+        self._last_alert[(rule_name, sensor_key)] = at
+        return True
+
+    def _message(self, rule, direction, observed):
+        unit = rule['unit']
+        value = round(float(observed), 2)
+        if direction == 'rate':
+            return f"🚨 CHANGING FAST: {value}{unit}/s (limit: {rule['max_rate']}{unit}/s)"
+        label = 'TOO HIGH' if direction == 'high' else 'TOO LOW'
+        if rule['kind'] == 'window':
+            label = f"{rule['window']}s AVERAGE {label}"
+        return f"🚨 {label}: {value}{unit} (threshold: {rule[direction]}{unit})"
+
+
+engine = RuleEngine()
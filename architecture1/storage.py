@@ -0,0 +1,598 @@
+"""Storage backends behind database.py
+
+Readings and alerts are plain dicts. Every backend offers the same methods,
+so database.py can switch between them with config.STORAGE_BACKEND:
+
+- 'sqlite' (default): append-only tables in SQLite, WAL mode, indexed on
+  (sensor_id, sensor_type, timestamp). A write is one INSERT instead of a
+  rewrite of the whole history.
+- 'json': the original single sensor_data.json file, kept for old setups.
+
+Rows have increasing ids (the list position for JSON), so readers such as
+read_model.py can tail new rows with readings_after/alerts_after.
+
+Both backends also keep the rollup tiers of rollups.py up to date, in the
+same write as the readings. Old rows are removed in small steps with the
+expire_* methods (see compactor.py), so no single write holds the store for
+long.
+"""
+import json
+import os
+import sqlite3
+import threading
+
+from rollups import TIERS, bucket, summarise, merge, point
+
+
+class SQLiteStorage:
+    """Readings and alerts in a SQLite database (WAL mode)"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sensor_id TEXT NOT NULL,
+            sensor_type TEXT NOT NULL,
+            value REAL NOT NULL,
+            timestamp TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS readings_by_sensor
+            ON readings (sensor_id, sensor_type, timestamp);
+        CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sensor_id TEXT NOT NULL,
+            sensor_type TEXT NOT NULL,
+            message TEXT NOT NULL,
+            timestamp TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS alerts_by_sensor
+            ON alerts (sensor_id, sensor_type, timestamp);
+        CREATE TABLE IF NOT EXISTS rollups (
+            tier TEXT NOT NULL,
+            sensor_id TEXT NOT NULL,
+            sensor_type TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            total REAL NOT NULL,
+            low REAL NOT NULL,
+            high REAL NOT NULL,
+            PRIMARY KEY (tier, sensor_id, sensor_type, bucket)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # One connection per thread; Flask serves requests on many threads
+        self._local = threading.local()
+        self._connect().executescript(self.SCHEMA)
+        self._backfill_rollups()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            # Lets compact() hand freed pages back to the filesystem. Must
+            # come first and only takes effect on a new database; older ones
+            # reuse freed pages instead.
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('PRAGMA journal_mode=WAL')
+            # In WAL mode NORMAL only risks the last commits on power loss
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _backfill_rollups(self):
+        """Build the rollup tiers of a database written before they existed"""
+        conn = self._connect()
+        if conn.execute('SELECT 1 FROM rollups LIMIT 1').fetchone() is not None:
+            return
+        with conn:
+            for tier, (_, keep, padding) in TIERS.items():
+                conn.execute(
+                    'INSERT INTO rollups SELECT ?, sensor_id, sensor_type, substr(timestamp, 1, ?) || ?, '
+                    'COUNT(*), SUM(value), MIN(value), MAX(value) FROM readings GROUP BY 2, 3, 4',
+                    (tier, keep, padding)
+                )
+
+    def _insert_readings(self, conn, readings):
+        conn.executemany(
+            'INSERT INTO readings (sensor_id, sensor_type, value, timestamp) VALUES (?, ?, ?, ?)',
+            [(str(r['sensor_id']), r['sensor_type'], r['value'], r['timestamp']) for r in readings]
+        )
+        # Summarised first, so a batch costs one upsert per sensor and bucket
+        conn.executemany(
+            'INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (tier, sensor_id, sensor_type, bucket) DO UPDATE SET '
+            'count = count + excluded.count, total = total + excluded.total, '
+            'low = MIN(low, excluded.low), high = MAX(high, excluded.high)',
+            [key + tuple(row) for key, row in summarise(readings).items()]
+        )
+
+    def _insert_alerts(self, conn, alerts):
+        conn.executemany(
+            'INSERT INTO alerts (sensor_id, sensor_type, message, timestamp) VALUES (?, ?, ?, ?)',
+            [(str(a['sensor_id']), a['sensor_type'], a['message'], a['timestamp']) for a in alerts]
+        )
+
+    def add_readings(self, readings):
+        """Append readings in one transaction"""
+        conn = self._connect()
+        with conn:
+            self._insert_readings(conn, readings)
+
+    def add_alerts(self, alerts):
+        """Append alerts in one transaction"""
+        conn = self._connect()
+        with conn:
+            self._insert_alerts(conn, alerts)
+
+    def add_batch(self, readings, alerts):
+        """Append readings and the alerts they raised in one transaction"""
+        conn = self._connect()
+        with conn:
+            self._insert_readings(conn, readings)
+            self._insert_alerts(conn, alerts)
+
+    def latest_readings(self, limit):
+        """Last N readings, oldest first"""
+        rows = self._connect().execute(
+            'SELECT sensor_id, sensor_type, value, timestamp FROM readings ORDER BY id DESC LIMIT ?',
+            (limit,)
+        ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def latest_alerts(self, limit):
+        """Last N alerts, oldest first"""
+        rows = self._connect().execute(
+            'SELECT sensor_id, sensor_type, message, timestamp FROM alerts ORDER BY id DESC LIMIT ?',
+            (limit,)
+        ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def history(self, sensor_id, sensor_type, start=None, end=None):
+        """Readings for one sensor with start <= timestamp <= end, oldest first"""
+        query = ('SELECT sensor_id, sensor_type, value, timestamp FROM readings '
+                 'WHERE sensor_id = ? AND sensor_type = ?')
+        params = [str(sensor_id), sensor_type]
+        if start is not None:
+            query += ' AND timestamp >= ?'
+            params.append(start)
+        if end is not None:
+            query += ' AND timestamp <= ?'
+            params.append(end)
+        rows = self._connect().execute(query + ' ORDER BY timestamp, id', params).fetchall()
+        return [dict(row) for row in rows]
+
+    def rollups(self, sensor_id, sensor_type, tier, start=None, end=None):
+        """Points of one rollup tier for a sensor, oldest first
+
+        The bucket holding `start` is included, as is every bucket starting
+        at or before `end`.
+        """
+        query = ('SELECT bucket, count, total, low, high FROM rollups '
+                 'WHERE tier = ? AND sensor_id = ? AND sensor_type = ?')
+        params = [tier, str(sensor_id), sensor_type]
+        if start is not None:
+            query += ' AND bucket >= ?'
+            params.append(bucket(start, tier))
+        if end is not None:
+            query += ' AND bucket <= ?'
+            params.append(end)
+        rows = self._connect().execute(query + ' ORDER BY bucket', params).fetchall()
+        return [point(str(sensor_id), sensor_type, *row) for row in rows]
+
+    def range_summary(self, sensor_id, sensor_type, start=None, end=None):
+        """(readings, first bucket, last bucket) of a sensor's hourly tier over a range"""
+        query = ('SELECT COALESCE(SUM(count), 0), MIN(bucket), MAX(bucket) FROM rollups '
+                 'WHERE tier = ? AND sensor_id = ? AND sensor_type = ?')
+        params = ['1h', str(sensor_id), sensor_type]
+        if start is not None:
+            query += ' AND bucket >= ?'
+            params.append(bucket(start, '1h'))
+        if end is not None:
+            query += ' AND bucket <= ?'
+            params.append(end)
+        return tuple(self._connect().execute(query, params).fetchone())
+
+    def sensor_readings(self, sensor_id, sensor_type, max_id, limit):
+        """Newest `limit` readings of one sensor with id <= max_id, oldest first, with ids"""
+        rows = self._connect().execute(
+            'SELECT id, sensor_id, sensor_type, value, timestamp FROM readings '
+            'WHERE sensor_id = ? AND sensor_type = ? AND id <= ? ORDER BY timestamp DESC, id DESC LIMIT ?',
+            (str(sensor_id), sensor_type, max_id, limit)
+        ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def readings_after(self, after_id, limit):
+        """Up to `limit` readings with id > after_id, in id order, with ids"""
+        rows = self._connect().execute(
+            'SELECT id, sensor_id, sensor_type, value, timestamp FROM readings WHERE id > ? ORDER BY id LIMIT ?',
+            (after_id, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def alerts_after(self, after_id, limit):
+        """Up to `limit` alerts with id > after_id, in id order, with ids"""
+        rows = self._connect().execute(
+            'SELECT id, sensor_id, sensor_type, message, timestamp FROM alerts WHERE id > ? ORDER BY id LIMIT ?',
+            (after_id, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def last_ids(self):
+        """Highest reading id and alert id (0 when empty)"""
+        conn = self._connect()
+        reading_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM readings').fetchone()[0]
+        alert_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM alerts').fetchone()[0]
+        return reading_id, alert_id
+
+    def _since(self, since):
+        """WHERE terms leaving out rows older than since[sensor_type]"""
+        since = since or {}
+        terms = ''.join(' AND NOT (sensor_type = ? AND timestamp < ?)' for _ in since)
+        return terms, [value for item in since.items() for value in item]
+
+    def type_stats(self, max_id, since=None):
+        """(count, sum, min, max) of values per sensor type over readings with id <= max_id
+
+        `since` maps sensor types to their oldest timestamp counted.
+        """
+        terms, params = self._since(since)
+        rows = self._connect().execute(
+            'SELECT sensor_type, COUNT(*), SUM(value), MIN(value), MAX(value) FROM readings '
+            f'WHERE id <= ?{terms} GROUP BY sensor_type',
+            [max_id] + params
+        ).fetchall()
+        return {row[0]: tuple(row[1:]) for row in rows}
+
+    def alert_count(self, max_id, since=None):
+        """Number of stored alerts with id <= max_id (and, per sensor type, timestamp >= since)"""
+        terms, params = self._since(since)
+        return self._connect().execute(
+            f'SELECT COUNT(*) FROM alerts WHERE id <= ?{terms}', [max_id] + params
+        ).fetchone()[0]
+
+    def oldest(self, table, since=None):
+        """Oldest timestamp per sensor type in 'readings' or 'alerts', at or after since[sensor_type]
+
+        Costs one index seek per (sensor_id, sensor_type) pair.
+        """
+        since = since or {}
+        conn = self._connect()
+        oldest = {}
+        for sensor_id, sensor_type in self._sensors(conn, table):
+            row = conn.execute(
+                f'SELECT timestamp FROM {table} WHERE sensor_id = ? AND sensor_type = ? AND timestamp >= ? '
+                'ORDER BY timestamp LIMIT 1',
+                (sensor_id, sensor_type, since.get(sensor_type, ''))
+            ).fetchone()
+            if row is not None and (sensor_type not in oldest or row[0] < oldest[sensor_type]):
+                oldest[sensor_type] = row[0]
+        return oldest
+
+    def sensor_types(self):
+        """Sensor types with stored data in any table or tier"""
+        conn = self._connect()
+        types = {sensor_type for _, sensor_type in self._sensors(conn, 'readings')}
+        types.update(sensor_type for _, sensor_type in self._sensors(conn, 'alerts'))
+        for tier in TIERS:
+            types.update(sensor_type for _, sensor_type in self._sensors(conn, 'rollups', tier))
+        return sorted(types)
+
+    def _sensors(self, conn, table, tier=None):
+        """(sensor_id, sensor_type) pairs present in a table (or rollup tier)
+
+        Each table leads its index with (sensor_id, sensor_type), so every
+        pair costs one index seek, however many rows it has.
+        """
+        scope, params = ('tier = ? AND ', [tier]) if tier is not None else ('', [])
+        pairs = []
+        last = ('', '')
+        while True:
+            row = conn.execute(
+                f'SELECT sensor_id, sensor_type FROM {table} WHERE {scope}(sensor_id, sensor_type) > (?, ?) '
+                'ORDER BY sensor_id, sensor_type LIMIT 1',
+                params + list(last)
+            ).fetchone()
+            if row is None:
+                return pairs
+            last = tuple(row)
+            pairs.append(last)
+
+    def _expire(self, table, sensor_type, before, limit):
+        """Delete up to `limit` rows of one type older than `before`, one sensor at a time (uses the index)"""
+        conn = self._connect()
+        deleted = 0
+        with conn:
+            for sensor_id in [i for i, t in self._sensors(conn, table) if t == sensor_type]:
+                deleted += conn.execute(
+                    f'DELETE FROM {table} WHERE id IN (SELECT id FROM {table} '
+                    'WHERE sensor_id = ? AND sensor_type = ? AND timestamp < ? LIMIT ?)',
+                    (sensor_id, sensor_type, before, limit - deleted)
+                ).rowcount
+                if deleted >= limit:
+                    break
+        return deleted
+
+    def expire_readings(self, sensor_type, before, limit):
+        """Delete up to `limit` readings of a type with timestamp < before; returns the number deleted"""
+        return self._expire('readings', sensor_type, before, limit)
+
+    def expire_alerts(self, sensor_type, before, limit):
+        """Delete up to `limit` alerts of a type with timestamp < before; returns the number deleted"""
+        return self._expire('alerts', sensor_type, before, limit)
+
+    def expire_rollups(self, tier, sensor_type, before, limit):
+        """Delete up to `limit` buckets of a tier and type starting before `before`"""
+        conn = self._connect()
+        deleted = 0
+        with conn:
+            for sensor_id in [i for i, t in self._sensors(conn, 'rollups', tier) if t == sensor_type]:
+                deleted += conn.execute(
+                    'DELETE FROM rollups WHERE (tier, sensor_id, sensor_type, bucket) IN ('
+                    'SELECT tier, sensor_id, sensor_type, bucket FROM rollups '
+                    'WHERE tier = ? AND sensor_id = ? AND sensor_type = ? AND bucket < ? LIMIT ?)',
+                    (tier, sensor_id, sensor_type, before, limit - deleted)
+                ).rowcount
+                if deleted >= limit:
+                    break
+        return deleted
+
+    def compact(self, pages):
+        """Return up to `pages` free pages to the filesystem; returns the free pages left"""
+        conn = self._connect()
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            # Not an incremental database: free pages are reused by new rows
+            return 0
+        # executescript steps the pragma to completion; execute frees one page
+        conn.executescript(f'PRAGMA incremental_vacuum({int(pages)});')
+        return conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+    def checkpoint(self):
+        """Copy the WAL into the database file and truncate it"""
+        self._connect().execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+
+    def disk_usage(self):
+        """(bytes on disk including the WAL, bytes of those that are free pages)"""
+        conn = self._connect()
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        free = conn.execute('PRAGMA freelist_count').fetchone()[0] * page_size
+        total = sum(os.path.getsize(path) for path in (self.path, self.path + '-wal') if os.path.exists(path))
+        return total, free
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class JSONStorage:
+    """The original single-file JSON storage (rewrites the file on every write)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        if not os.path.exists(path):
+            self._save({'readings': [], 'alerts': [], 'rollups': {}})
+        with self._lock:
+            data = self._load()
+            if 'rollups' not in data:
+                data['rollups'] = {}
+                self._add_rollups(data, data['readings'])
+                self._save(data)
+
+    def _load(self):
+        with self._lock:
+            try:
+                with open(self.path, 'r') as f:
+                    return json.load(f)
+            except (OSError, json.JSONDecodeError):
+                # If file is corrupted, reset it
+                print("Warning: Corrupted JSON file detected. Resetting...")
+                return {'readings': [], 'alerts': []}
+
+    def _save(self, data):
+        with self._lock:
+            with open(self.path, 'w') as f:
+                json.dump(data, f, indent=2)
+
+    def _add_rollups(self, data, readings):
+        # {tier: {"sensor_id/sensor_type": {bucket: [count, sum, min, max]}}}
+        for (tier, sensor_id, sensor_type, start), row in summarise(readings).items():
+            buckets = data.setdefault('rollups', {}).setdefault(tier, {}).setdefault(f"{sensor_id}/{sensor_type}", {})
+            if start in buckets:
+                merge(buckets[start], *row)
+            else:
+                buckets[start] = row
+
+    def add_readings(self, readings):
+        with self._lock:
+            data = self._load()
+            data['readings'].extend(readings)
+            self._add_rollups(data, readings)
+            self._save(data)
+
+    def add_alerts(self, alerts):
+        with self._lock:
+            data = self._load()
+            data['alerts'].extend(alerts)
+            self._save(data)
+
+    def add_batch(self, readings, alerts):
+        with self._lock:
+            data = self._load()
+            data['readings'].extend(readings)
+            data['alerts'].extend(alerts)
+            self._add_rollups(data, readings)
+            self._save(data)
+
+    # Expired rows are set to null so that list positions, which are the row
+    # ids, stay valid; nulls at the front are dropped and counted in 'removed'
+
+    def _removed(self, data, table):
+        return data.get('removed', {}).get(table, 0)
+
+    def _newest(self, table, limit):
+        rows = []
+        for row in reversed(self._load()[table]):
+            if len(rows) >= limit:
+                break
+            if row is not None:
+                rows.append(row)
+        return rows[::-1]
+
+    def latest_readings(self, limit):
+        return self._newest('readings', limit)
+
+    def latest_alerts(self, limit):
+        return self._newest('alerts', limit)
+
+    def history(self, sensor_id, sensor_type, start=None, end=None):
+        return [r for r in self._load()['readings']
+                if r is not None and str(r['sensor_id']) == str(sensor_id) and r['sensor_type'] == sensor_type
+                and (start is None or r['timestamp'] >= start) and (end is None or r['timestamp'] <= end)]
+
+    def _buckets(self, sensor_id, sensor_type, tier, start, end):
+        buckets = self._load().get('rollups', {}).get(tier, {}).get(f"{sensor_id}/{sensor_type}", {})
+        first = None if start is None else bucket(start, tier)
+        return sorted((b, row) for b, row in buckets.items()
+                      if (first is None or b >= first) and (end is None or b <= end))
+
+    def rollups(self, sensor_id, sensor_type, tier, start=None, end=None):
+        return [point(str(sensor_id), sensor_type, b, *row)
+                for b, row in self._buckets(sensor_id, sensor_type, tier, start, end)]
+
+    def range_summary(self, sensor_id, sensor_type, start=None, end=None):
+        buckets = self._buckets(sensor_id, sensor_type, '1h', start, end)
+        if not buckets:
+            return 0, None, None
+        return sum(row[0] for _, row in buckets), buckets[0][0], buckets[-1][0]
+
+    def sensor_readings(self, sensor_id, sensor_type, max_id, limit):
+        data = self._load()
+        removed = self._removed(data, 'readings')
+        rows = [dict(r, id=removed + i + 1) for i, r in enumerate(data['readings'][:max(max_id - removed, 0)])
+                if r is not None and str(r['sensor_id']) == str(sensor_id) and r['sensor_type'] == sensor_type]
+        rows.sort(key=lambda r: (r['timestamp'], r['id']))
+        return rows[-limit:]
+
+    def _after(self, table, after_id, limit):
+        data = self._load()
+        removed = self._removed(data, table)
+        rows = []
+        for i in range(max(after_id - removed, 0), len(data[table])):
+            if len(rows) >= limit:
+                break
+            if data[table][i] is not None:
+                rows.append(dict(data[table][i], id=removed + i + 1))
+        return rows
+
+    def readings_after(self, after_id, limit):
+        return self._after('readings', after_id, limit)
+
+    def alerts_after(self, after_id, limit):
+        return self._after('alerts', after_id, limit)
+
+    def last_ids(self):
+        data = self._load()
+        return (self._removed(data, 'readings') + len(data['readings']),
+                self._removed(data, 'alerts') + len(data['alerts']))
+
+    def _kept(self, data, table, max_id, since):
+        since = since or {}
+        for row in data[table][:max(max_id - self._removed(data, table), 0)]:
+            if row is not None and row['timestamp'] >= since.get(row['sensor_type'], ''):
+                yield row
+
+    def type_stats(self, max_id, since=None):
+        data = self._load()
+        stats = {}
+        for r in self._kept(data, 'readings', max_id, since):
+            count, total, low, high = stats.get(r['sensor_type'], (0, 0.0, r['value'], r['value']))
+            stats[r['sensor_type']] = (count + 1, total + r['value'], min(low, r['value']), max(high, r['value']))
+        return stats
+
+    def alert_count(self, max_id, since=None):
+        return sum(1 for _ in self._kept(self._load(), 'alerts', max_id, since))
+
+    def oldest(self, table, since=None):
+        data = self._load()
+        oldest = {}
+        for row in self._kept(data, table, self._removed(data, table) + len(data[table]), since):
+            if row['sensor_type'] not in oldest or row['timestamp'] < oldest[row['sensor_type']]:
+                oldest[row['sensor_type']] = row['timestamp']
+        return oldest
+
+    def sensor_types(self):
+        data = self._load()
+        types = {row['sensor_type'] for table in ('readings', 'alerts') for row in data[table] if row is not None}
+        for buckets in data.get('rollups', {}).values():
+            types.update(key.rsplit('/', 1)[1] for key, rows in buckets.items() if rows)
+        return sorted(types)
+
+    def _expire(self, table, sensor_type, before):
+        # The whole file is rewritten anyway, so `limit` is not needed
+        with self._lock:
+            data = self._load()
+            rows = data[table]
+            expired = 0
+            for i, row in enumerate(rows):
+                if row is not None and row['sensor_type'] == sensor_type and row['timestamp'] < before:
+                    rows[i] = None
+                    expired += 1
+            if not expired:
+                return 0
+            leading = 0
+            while leading < len(rows) and rows[leading] is None:
+                leading += 1
+            del rows[:leading]
+            data.setdefault('removed', {})[table] = self._removed(data, table) + leading
+            self._save(data)
+            return expired
+
+    def expire_readings(self, sensor_type, before, limit):
+        return self._expire('readings', sensor_type, before)
+
+    def expire_alerts(self, sensor_type, before, limit):
+        return self._expire('alerts', sensor_type, before)
+
+    def expire_rollups(self, tier, sensor_type, before, limit):
+        with self._lock:
+            data = self._load()
+            expired = 0
+            for key, buckets in data.get('rollups', {}).get(tier, {}).items():
+                if key.rsplit('/', 1)[1] != sensor_type:
+                    continue
+                for start in [b for b in buckets if b < before]:
+                    del buckets[start]
+                    expired += 1
+            if expired:
+                self._save(data)
+            return expired
+
+    def compact(self, pages):
+        # Every save rewrites the file, so there is nothing left to reclaim
+        return 0
+
+    def checkpoint(self):
+        pass
+
+    def disk_usage(self):
+        return os.path.getsize(self.path), 0
+
+    def close(self):
+        pass
+
+
+BACKENDS = {
+    'sqlite': SQLiteStorage,
+    'json': JSONStorage,
+}
+
+
+def open_storage(backend, path):
+    """Create the storage backend named in config.STORAGE_BACKEND"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    return BACKENDS[backend](path)
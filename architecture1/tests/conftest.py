@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules import each other by bare name (from config import ...)
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
@@ -0,0 +1,56 @@
+import pytest
+
+pytest.importorskip('flask')
+
+import api_gateway
+
+
+class Queue:
+    def __init__(self):
+        self.readings = []
+
+    def submit(self, readings):
+        self.readings.extend(readings)
+        return True
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    queue = Queue()
+    monkeypatch.setattr(api_gateway, 'ingest_queue', queue)
+    return queue
+
+
+def test_batch_accepts_zero_and_rejects_bad_values(queue):
+    client = api_gateway.app.test_client()
+    response = client.post('/api/readings/batch', json=[
+        {'sensor_id': 'sensor_1', 'sensor_type': 'temperature', 'value': 0},
+        {'sensor_id': 'sensor_1', 'sensor_type': 'temperature', 'value': 0.0, 'timestamp': '2024-01-01T10:00:00'},
+        {'sensor_id': 'sensor_1', 'sensor_type': 'temperature'},
+        {'sensor_id': 'sensor_1', 'sensor_type': 'temperature', 'value': 'warm'},
+        {'sensor_id': 'sensor_1', 'sensor_type': 'temperature', 'value': 'nan'},
+        {'sensor_id': 'sensor_1', 'sensor_type': 'temperature', 'value': True},
+        {'sensor_id': 'sensor_1', 'sensor_type': 'temperature', 'value': 1, 'timestamp': 'yesterday'},
+    ])
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body['accepted'] == 2
+    assert [(r['index'], r['error']) for r in body['rejected']] == [
+        (2, 'Missing fields'), (3, 'Invalid value'), (4, 'Invalid value'), (5, 'Invalid value'),
+        (6, 'Invalid timestamp')
+    ]
+    assert [r['value'] for r in queue.readings] == [0.0, 0.0]
+    assert 'timestamp' not in queue.readings[0]
+    assert queue.readings[1]['timestamp'] == '2024-01-01T10:00:00'
+
+
+def test_single_reading_accepts_zero(monkeypatch):
+    stored = []
+    monkeypatch.setattr(api_gateway, 'add_reading', lambda *args: stored.append(args))
+    monkeypatch.setattr(api_gateway, 'process_reading', lambda *args, **kwargs: None)
+    client = api_gateway.app.test_client()
+    response = client.post('/api/readings', json={'sensor_id': 'sensor_1', 'sensor_type': 'humidity', 'value': 0})
+    assert response.status_code == 201
+    assert stored == [('sensor_1', 'humidity', 0.0)]
+    response = client.post('/api/readings', json={'sensor_id': 'sensor_1', 'sensor_type': 'humidity', 'value': 'x'})
+    assert response.status_code == 400
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+from compactor import Compactor
+from read_model import ReadModel
+from storage import SQLiteStorage
+
+# Read models apply retention against the clock
+NOW = datetime.now()
+
+
+def ago(days):
+    return (NOW - timedelta(days=days)).isoformat()
+
+
+def reading(sensor_id, value, timestamp, sensor_type='temperature'):
+    return {'sensor_id': sensor_id, 'sensor_type': sensor_type, 'value': value, 'timestamp': timestamp}
+
+
+def alert(sensor_id, timestamp):
+    return {'sensor_id': sensor_id, 'sensor_type': 'temperature', 'message': 'hot', 'timestamp': timestamp}
+
+
+def test_expires_each_kind_and_keeps_the_read_model_coherent(tmp_path):
+    retention_days = {'default': {'raw': 7, '1m': 30, '1h': None, '1d': None, 'alerts': 30}}
+    storage = SQLiteStorage(str(tmp_path / 'data.db'))
+    storage.add_batch([reading('s1', 50.0, ago(40)), reading('s1', 40.0, ago(10)),
+                       reading('s1', 20.0, ago(1)), reading('s2', 22.0, ago(1))],
+                      [alert('s1', ago(40)), alert('s1', ago(1))])
+    model = ReadModel(storage, retention_days=retention_days, expire_interval=3600)
+
+    run = Compactor(storage, retention_days=retention_days).run_once(now=NOW)
+    # Raw: 2 older than 7 days; 1m: the bucket 40 days back; alerts: 1
+    assert (run['readings_expired'], run['rollups_expired'], run['alerts_expired']) == (2, 1, 1)
+    assert [r['value'] for r in storage.history('s1', 'temperature')] == [20.0]
+    assert len(storage.rollups('s1', 'temperature', '1m')) == 2
+    assert len(storage.rollups('s1', 'temperature', '1h')) == 3
+
+    model.expire(NOW)
+    assert [r['value'] for r in model.latest_readings(10)] == [20.0, 22.0]
+    assert [r['value'] for r in model.history('s1', 'temperature')] == [20.0]
+    assert [a['timestamp'] for a in model.latest_alerts(10)] == [ago(1)]
+    stats = model.stats()
+    assert stats['types']['temperature'] == {'count': 2, 'avg': 21.0, 'min': 20.0, 'max': 22.0}
+    assert stats['alert_count'] == 1
+    storage.close()
+
+
+def test_read_model_drops_expired_rows_before_the_compactor_runs(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'data.db'))
+    now = datetime.now()
+    storage.add_readings([reading('s1', 50.0, (now - timedelta(days=20)).isoformat()),
+                          reading('s1', 20.0, now.isoformat())])
+    # The defaults keep temperature readings for 14 days
+    model = ReadModel(storage)
+    assert [r['value'] for r in model.latest_readings(10)] == [20.0]
+    assert [r['value'] for r in model.history('s1', 'temperature')] == [20.0]
+    assert model.stats()['types']['temperature']['count'] == 1
+    storage.close()
+
+
+def test_finer_tiers_expire_after_the_daily_tier_is_gone(tmp_path):
+    retention_days = {'default': {'raw': 1, '1m': 30, '1h': 30, '1d': 2, 'alerts': None}}
+    storage = SQLiteStorage(str(tmp_path / 'data.db'))
+    storage.add_readings([reading('s1', 20.0, ago(10))])
+    compactor = Compactor(storage, retention_days=retention_days)
+    compactor.run_once(now=NOW)
+    assert storage.rollups('s1', 'temperature', '1d') == [] and storage.history('s1', 'temperature') == []
+    assert len(storage.rollups('s1', 'temperature', '1m')) == 1
+    # 35 days on, nothing else lists the sensor, but its minute and hour buckets still go
+    run = compactor.run_once(now=NOW + timedelta(days=25))
+    assert run['rollups_expired'] == 2
+    assert storage.rollups('s1', 'temperature', '1m') == [] and storage.sensor_types() == []
+    storage.close()
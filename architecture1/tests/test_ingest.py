@@ -0,0 +1,73 @@
+import threading
+import time
+
+import ingest
+from ingest import IngestQueue
+
+
+class Writer:
+    def __init__(self, fail_first=0):
+        self.fail_first = fail_first
+        self.batches = []
+        self.done = threading.Event()
+
+    def __call__(self, readings, alerts):
+        if self.fail_first:
+            self.fail_first -= 1
+            raise OSError('disk full')
+        self.batches.append((list(readings), list(alerts)))
+        self.done.set()
+
+
+def reading(value, timestamp=None):
+    r = {'sensor_id': 1, 'sensor_type': 'temperature', 'value': value}
+    if timestamp:
+        r['timestamp'] = timestamp
+    return r
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def test_queued_readings_are_flushed_in_batches():
+    writer = Writer()
+    queue = IngestQueue(batch_size=3, flush_interval=0.2, write=writer)
+    assert queue.submit([reading(20.0 + i, f'2024-01-01T10:00:0{i}') for i in range(4)] + [reading(25.0)])
+    wait_for(lambda: queue.stats['written'] == 5)
+    assert [len(readings) for readings, _ in writer.batches] == [3, 2]
+    stored = [r for readings, _ in writer.batches for r in readings]
+    # Client timestamps are kept; the reading without one is stamped on arrival
+    assert [r['timestamp'] for r in stored[:4]] == [f'2024-01-01T10:00:0{i}' for i in range(4)]
+    assert stored[4]['timestamp'] > '2024-01-01'
+    assert queue.stats['batches'] == 2 and queue.stats['errors'] == 0
+
+
+def test_full_queue_rejects_the_whole_batch():
+    queue = IngestQueue(max_size=2, write=Writer())
+    queue._thread = object()  # keep the writer from draining the queue
+    assert not queue.submit([reading(1.0), reading(2.0), reading(3.0)])
+    assert queue.pending() == 0
+
+
+def test_writer_survives_failures(monkeypatch):
+    writer = Writer(fail_first=1)
+    queue = IngestQueue(batch_size=10, flush_interval=0.0, write=writer)
+    queue.submit([reading(20.0)])
+    wait_for(lambda: queue.stats['errors'] == 1)
+    queue.submit([reading(21.0)])
+    wait_for(lambda: queue.stats['written'] == 1)
+
+    def broken_rules(readings):
+        raise ValueError('bad rule')
+
+    monkeypatch.setattr(ingest, 'evaluate_readings', broken_rules)
+    queue.submit([reading(22.0)])
+    wait_for(lambda: queue.stats['written'] == 2)
+    # The readings are stored without alerts and the failure is counted
+    assert [r['value'] for readings, _ in writer.batches for r in readings] == [21.0, 22.0]
+    assert writer.batches[-1][1] == []
+    assert queue.stats['errors'] == 2
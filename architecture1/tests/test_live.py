@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from live import LiveFeed
+from read_model import ReadModel
+from storage import SQLiteStorage
+
+
+def reading(value):
+    return {'sensor_id': 's1', 'sensor_type': 'temperature', 'value': value, 'timestamp': '2024-01-01T10:00:00'}
+
+
+def event_data(event):
+    return json.loads(event.split('data: ', 1)[1])
+
+
+def test_deltas_let_a_client_skip_rows_already_in_its_snapshot(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'data.db'))
+    model = ReadModel(storage, retention_days={})
+    feed = LiveFeed(model, interval=0.01)
+    storage.add_readings([reading(20.0)])
+    # Taking the snapshot tails the row, which queues it for the next delta too
+    snapshot = model.recent(30, 10)
+    assert [r['value'] for r in snapshot['readings']] == [20.0] and snapshot['reading_id'] == 1
+    stream = feed.stream(snapshot)
+    assert event_data(next(stream))['reading_id'] == 1
+    storage.add_readings([reading(21.0)])
+    delta = event_data(next(stream))
+    assert [(r['id'], r['value']) for r in delta['readings']] == [(1, 20.0), (2, 21.0)]
+    # What the page keeps: rows past the snapshot's high-water mark
+    assert [r['value'] for r in delta['readings'] if r['id'] > snapshot['reading_id']] == [21.0]
+    stream.close()
+    storage.close()
+
+
+def test_dashboard_snapshot_carries_the_high_water_marks(tmp_path, monkeypatch):
+    pytest.importorskip('flask')
+    import dashboard
+
+    storage = SQLiteStorage(str(tmp_path / 'data.db'))
+    storage.add_readings([reading(20.0), reading(22.0)])
+    storage.add_alerts([{'sensor_id': 's1', 'sensor_type': 'temperature', 'message': 'hot',
+                         'timestamp': '2024-01-01T10:00:00'}])
+    monkeypatch.setattr(dashboard, 'get_read_model', lambda: ReadModel(storage, retention_days={}))
+    snapshot = dashboard.build_snapshot()
+    assert [r['value'] for r in snapshot['readings']] == [22.0, 20.0]
+    assert (snapshot['reading_id'], snapshot['alert_id'], snapshot['alert_count']) == (2, 1, 1)
+    assert snapshot['temp_avg'] == 21.0
+    storage.close()
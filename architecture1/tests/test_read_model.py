@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+from read_model import ReadModel
+from storage import SQLiteStorage
+
+
+def reading(sensor_id, value, timestamp, sensor_type='temperature'):
+    return {'sensor_id': sensor_id, 'sensor_type': sensor_type, 'value': value, 'timestamp': timestamp}
+
+
+def test_tails_rows_written_after_start(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'data.db'))
+    storage.add_readings([reading(1, 20.0, '2024-01-01T10:00:00'), reading(1, 22.0, '2024-01-01T10:01:00')])
+    model = ReadModel(storage, latest=3, per_sensor=100, retention_days={})
+    seen = []
+    model.add_listener(lambda kind, row, row_id: seen.append((kind, row['sensor_id'], row_id)))
+
+    # Written by someone else (another process, the ingest writer)
+    storage.add_batch([reading(2, 50.0, '2024-01-01T10:02:00', 'humidity'), reading(1, 24.0, '2024-01-01T10:03:00')],
+                      [{'sensor_id': '1', 'sensor_type': 'temperature', 'message': 'hot',
+                        'timestamp': '2024-01-01T10:03:00'}])
+    assert [r['value'] for r in model.latest_readings(3)] == [22.0, 50.0, 24.0]
+    assert seen == [('reading', '2', 3), ('reading', '1', 4), ('alert', '1', 1)]
+    assert all('id' not in r for r in model.latest_readings(3))
+    # More than the ring buffer holds comes from the store
+    assert [r['value'] for r in model.latest_readings(4)] == [20.0, 22.0, 50.0, 24.0]
+    assert [a['message'] for a in model.latest_alerts(5)] == ['hot']
+    assert model.stats()['types']['temperature'] == {'count': 3, 'avg': 22.0, 'min': 20.0, 'max': 24.0}
+    storage.close()
+
+
+def test_sensor_history_stays_current_and_ordered(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'data.db'))
+    storage.add_readings([reading(1, 20.0, '2024-01-01T10:00:00'), reading(1, 21.0, '2024-01-01T10:02:00')])
+    model = ReadModel(storage, per_sensor=100, retention_days={})
+    assert [r['value'] for r in model.history(1, 'temperature')] == [20.0, 21.0]
+    # A late reading lands in timestamp order
+    storage.add_readings([reading(1, 30.0, '2024-01-01T10:01:00'), reading(2, 40.0, '2024-01-01T10:01:00')])
+    assert [r['value'] for r in model.history(1, 'temperature')] == [20.0, 30.0, 21.0]
+    assert [r['value'] for r in model.history('1', 'temperature', start='2024-01-01T10:00:30',
+                                              end='2024-01-01T10:01:00')] == [30.0]
+    storage.close()
+
+
+def test_alert_count_covers_every_stored_alert(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'data.db'))
+    alert = {'sensor_id': '1', 'sensor_type': 'temperature', 'message': 'hot', 'timestamp': '2024-01-01T10:00:00'}
+    storage.add_alerts([alert] * 5)
+    model = ReadModel(storage, latest=2, retention_days={})
+    storage.add_alerts([alert] * 10)
+    # Well past both the ring buffer and the dashboard's list of 10
+    assert model.stats()['alert_count'] == 15
+    assert len(model.latest_alerts(2)) == 2
+    storage.close()
+
+
+def test_statistics_are_counted_again_only_when_counted_rows_expire(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'data.db'))
+    now = datetime.now()
+    storage.add_readings([reading(1, 20.0, (now - timedelta(days=2)).isoformat()),
+                          reading(1, 22.0, (now - timedelta(days=1)).isoformat())])
+    model = ReadModel(storage, retention_days={'default': {'raw': 7}}, expire_interval=3600)
+    scans = []
+    type_stats = storage.type_stats
+
+    def scan(max_id, since=None):
+        # Runs outside the lock, so a reading can be tailed meanwhile
+        assert not model.lock.locked()
+        scans.append(max_id)
+        storage.add_readings([reading(2, 30.0, now.isoformat())])
+        model.refresh()
+        return type_stats(max_id, since)
+
+    storage.type_stats = scan
+    # Nothing counted has expired yet
+    model.expire(now + timedelta(days=4))
+    assert scans == []
+    model.expire(now + timedelta(days=6))
+    assert scans == [2]
+    assert model.stats()['types']['temperature'] == {'count': 2, 'avg': 26.0, 'min': 22.0, 'max': 30.0}
+    storage.close()
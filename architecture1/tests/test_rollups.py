@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import database
+from compactor import Compactor
+from rollups import bucket, choose_resolution, summarise
+from storage import SQLiteStorage
+
+
+def test_buckets_are_cut_from_the_timestamp():
+    assert bucket('2024-03-05T14:27:31.123456', '1m') == '2024-03-05T14:27:00'
+    assert bucket('2024-03-05T14:27:31', '1h') == '2024-03-05T14:00:00'
+    assert bucket('2024-03-05T14:27:31', '1d') == '2024-03-05T00:00:00'
+    rows = summarise([
+        {'sensor_id': 1, 'sensor_type': 'temperature', 'value': v, 'timestamp': f'2024-03-05T14:2{i}:00'}
+        for i, v in enumerate([20.0, 24.0, 22.0])
+    ])
+    assert rows[('1h', '1', 'temperature', '2024-03-05T14:00:00')] == [3, 66.0, 20.0, 24.0]
+    assert len([key for key in rows if key[0] == '1m']) == 3
+
+
+def test_choose_resolution_picks_the_finest_that_fits():
+    assert choose_resolution(500, '2024-01-01T00:00:00', '2024-01-31T00:00:00', 1000) == 'raw'
+    # Two hours of data: 121 minutes fit, one week needs hours, a year needs days
+    assert choose_resolution(5000, '2024-01-01T00:00:00', '2024-01-01T02:00:00', 1000) == '1m'
+    assert choose_resolution(50000, '2024-01-01T00:00:00', '2024-01-08T00:00:00', 1000) == '1h'
+    assert choose_resolution(10 ** 6, '2024-01-01T00:00:00', '2025-01-01T00:00:00', 1000) == '1d'
+    assert choose_resolution(5000, None, None, 1000) == '1d'
+
+
+def test_stored_tiers_summarise_the_same_readings(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'data.db'))
+    start = datetime(2024, 1, 1, 10, 0, 0)
+    readings = [{'sensor_id': 's1', 'sensor_type': 'temperature', 'value': float(i % 7),
+                 'timestamp': (start + timedelta(seconds=30 * i)).isoformat()} for i in range(240)]
+    # In two writes, so buckets are merged across batches
+    storage.add_readings(readings[:100])
+    storage.add_readings(readings[100:])
+    for tier, points in (('1m', 120), ('1h', 2), ('1d', 1)):
+        rows = storage.rollups('s1', 'temperature', tier)
+        assert len(rows) == points
+        assert sum(r['count'] for r in rows) == 240
+        assert min(r['min'] for r in rows) == 0.0 and max(r['max'] for r in rows) == 6.0
+    count, first, last = storage.range_summary('s1', 'temperature')
+    assert (count, first, last) == (240, '2024-01-01T10:00:00', '2024-01-01T11:00:00')
+    storage.close()
+
+
+def test_auto_resolution_stays_within_the_budget(tmp_path, monkeypatch):
+    storage = SQLiteStorage(str(tmp_path / 'data.db'))
+    monkeypatch.setattr(database, '_storage', storage)
+    # Recent enough that retention keeps every resolution
+    start = (datetime.now() - timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+    storage.add_readings([{'sensor_id': 's1', 'sensor_type': 'temperature', 'value': 1.0,
+                           'timestamp': (start + timedelta(seconds=30 * i)).isoformat()} for i in range(240)])
+    # 120 minutes of data in two hourly buckets
+    assert database.pick_resolution('s1', 'temperature', max_points=100) == '1h'
+    assert database.pick_resolution('s1', 'temperature', max_points=121) == '1m'
+    end = (start + timedelta(minutes=30)).isoformat()
+    assert database.pick_resolution('s1', 'temperature', end=end, max_points=40) == '1m'
+    resolution, points = database.get_history('s1', 'temperature', resolution='auto', max_points=100)
+    assert resolution == '1h' and len(points) == 2
+    storage.close()
+
+
+def test_auto_resolution_skips_expired_resolutions(tmp_path, monkeypatch):
+    storage = SQLiteStorage(str(tmp_path / 'data.db'))
+    monkeypatch.setattr(database, '_storage', storage)
+    monkeypatch.setattr(database, '_read_model', None)
+    # Humidity keeps raw readings for 7 days by default, minutes for 30
+    hour = datetime.now().replace(minute=0, second=0, microsecond=0)
+    def readings(days):
+        return [{'sensor_id': 's1', 'sensor_type': 'humidity', 'value': 50.0,
+                 'timestamp': (hour - timedelta(days=days) + timedelta(minutes=i)).isoformat()} for i in range(60)]
+    storage.add_readings(readings(10))
+    assert Compactor(storage).run_once()['readings_expired'] == 60
+    resolution, points = database.get_history('s1', 'humidity', resolution='auto')
+    assert resolution == '1m' and len(points) == 60
+    # Once the range reaches past the minute tier's retention, hours answer it
+    storage.add_readings(readings(40))
+    Compactor(storage).run_once()
+    resolution, points = database.get_history('s1', 'humidity', resolution='auto')
+    assert resolution == '1h' and len(points) == 2
+    storage.close()
@@ -0,0 +1,48 @@
+import json
+
+from rules import RuleEngine
+
+
+def engine_with(tmp_path, rules):
+    path = tmp_path / 'alert_rules.json'
+    path.write_text(json.dumps({'rules': rules}))
+    return RuleEngine(path=str(path), cooldown=0, max_per_minute=1000)
+
+
+def reading(value, timestamp, sensor_id='s1', sensor_type='temperature'):
+    return {'sensor_id': sensor_id, 'sensor_type': sensor_type, 'value': value, 'timestamp': timestamp}
+
+
+def test_threshold_fires_once_until_the_value_comes_back(tmp_path):
+    engine = engine_with(tmp_path, [
+        {'name': 'hot', 'kind': 'threshold', 'sensor_type': 'temperature', 'high': 30, 'hysteresis': 2},
+    ])
+    alerts = engine.evaluate([reading(v, f'2024-01-01T10:00:0{i}') for i, v in enumerate([25, 31, 32, 29, 31, 27, 31])])
+    # 29 is still within the hysteresis, 27 re-arms the rule
+    assert [a['timestamp'][-1] for a in alerts] == ['1', '6']
+    # The state carries over into the next batch
+    assert engine.evaluate([reading(33, '2024-01-01T10:00:10')]) == []
+
+
+def test_rate_rule_across_batches(tmp_path):
+    engine = engine_with(tmp_path, [
+        {'name': 'jump', 'kind': 'rate', 'sensor_type': 'temperature', 'max_rate': 0.5},
+    ])
+    assert engine.evaluate([reading(20, '2024-01-01T10:00:00'), reading(22, '2024-01-01T10:00:10')]) == []
+    # Continues from 22 at 10:00:10
+    assert engine.evaluate([reading(24, '2024-01-01T10:00:20')]) == []
+    (alert,) = engine.evaluate([reading(30, '2024-01-01T10:00:22')])
+    assert alert['message'].startswith('🚨 CHANGING FAST: 3.0')
+
+
+def test_rate_rule_ignores_equal_and_out_of_order_timestamps(tmp_path):
+    engine = engine_with(tmp_path, [
+        {'name': 'jump', 'kind': 'rate', 'sensor_type': 'temperature', 'max_rate': 0.5},
+    ])
+    # Two readings in the same second, a big change: no rate, no alert
+    assert engine.evaluate([reading(20, '2024-01-01T10:00:00'), reading(25, '2024-01-01T10:00:00')]) == []
+    # Same timestamp as the previous batch's last reading, then an older one
+    assert engine.evaluate([reading(40, '2024-01-01T10:00:00')]) == []
+    assert engine.evaluate([reading(0, '2024-01-01T09:59:59')]) == []
+    # The late 0 did not become the last reading: 40 -> 40 is no change
+    assert engine.evaluate([reading(40, '2024-01-01T10:00:01')]) == []
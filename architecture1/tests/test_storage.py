@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from migrate_json import migrate
+from storage import SQLiteStorage, JSONStorage
+
+
+def reading(sensor_id, value, timestamp, sensor_type='temperature'):
+    return {'sensor_id': sensor_id, 'sensor_type': sensor_type, 'value': value, 'timestamp': timestamp}
+
+
+def alert(sensor_id, timestamp, sensor_type='temperature'):
+    return {'sensor_id': sensor_id, 'sensor_type': sensor_type, 'message': 'too hot', 'timestamp': timestamp}
+
+
+@pytest.fixture(params=['sqlite', 'json'])
+def storage(request, tmp_path):
+    if request.param == 'sqlite':
+        store = SQLiteStorage(str(tmp_path / 'data.db'))
+    else:
+        store = JSONStorage(str(tmp_path / 'data.json'))
+    yield store
+    store.close()
+
+
+def test_round_trip(storage):
+    storage.add_batch(
+        [reading(1, 20.0, '2024-01-01T10:00:00'), reading(1, 22.0, '2024-01-01T10:30:00'),
+         reading(2, 50.0, '2024-01-01T10:05:00', 'humidity')],
+        [alert(1, '2024-01-01T10:30:00')]
+    )
+    assert [r['value'] for r in storage.latest_readings(2)] == [22.0, 50.0]
+    assert [a['message'] for a in storage.latest_alerts(10)] == ['too hot']
+    assert [r['value'] for r in storage.history(1, 'temperature')] == [20.0, 22.0]
+    assert [r['value'] for r in storage.history('1', 'temperature', start='2024-01-01T10:10:00')] == [22.0]
+    assert storage.last_ids() == (3, 1)
+    assert [r['id'] for r in storage.readings_after(1, 10)] == [2, 3]
+    assert sorted(storage.sensor_types()) == ['humidity', 'temperature']
+    assert storage.type_stats(3)['temperature'] == (2, 42.0, 20.0, 22.0)
+    assert storage.oldest('readings') == {'temperature': '2024-01-01T10:00:00', 'humidity': '2024-01-01T10:05:00'}
+    assert storage.oldest('readings', {'temperature': '2024-01-01T10:10:00'})['temperature'] == '2024-01-01T10:30:00'
+    (hour,) = storage.rollups(1, 'temperature', '1h')
+    assert (hour['timestamp'], hour['count'], hour['value'], hour['min'], hour['max']) == \
+        ('2024-01-01T10:00:00', 2, 21.0, 20.0, 22.0)
+
+
+def test_migration_refuses_to_run_twice(tmp_path):
+    source = tmp_path / 'sensor_data.json'
+    source.write_text(json.dumps({
+        'readings': [reading(1, 20.0, '2024-01-01T10:00:00'), None, reading(1, 21.0, '2024-01-01T10:01:00')],
+        'alerts': [alert(1, '2024-01-01T10:01:00')]
+    }))
+    target = str(tmp_path / 'sensor_data.db')
+    assert migrate(str(source), target) == (2, 1)
+    with pytest.raises(ValueError):
+        migrate(str(source), target)
+    store = SQLiteStorage(target)
+    assert store.last_ids() == (2, 1)
+    store.close()
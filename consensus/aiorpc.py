@@ -0,0 +1,348 @@
+"""asyncio implementation of the RPC server and client.
+
+``AsyncRPCServer`` speaks exactly the same wire protocol as
+``consensus.rpc.RPCServer`` (codec handshake, pipelined request ids, legacy
+newline-delimited JSON) and exposes the same ``register``/``start``/``stop``
+API, so it can be swapped in behind ``ConsensusNode``. Every connection is a
+coroutine on one event loop instead of an OS thread, which lets a node hold
+thousands of idle client connections. Handlers may be ``async def`` functions,
+which run on the loop, or plain functions, which run on a bounded thread pool
+so a blocking handler never stalls the loop.
+
+Plain handlers registered with ``blocking=True`` (those that wait for other
+nodes, such as client commands that wait for a commit) get a pool of their
+own, ``max_blocking_workers`` wide. However many of them are waiting, the
+``max_workers`` threads serving the consensus RPCs they wait on stay free.
+Once every blocking worker is busy, further blocking calls queue until one
+returns. Size that pool for the number of client calls in flight.
+
+As in ``RPCServer``, at most ``max_inflight`` pipelined requests per
+connection are served at once. The connection is not read further until one
+of them completes, so a client that pipelines faster than its requests are
+answered is slowed down by TCP flow control.
+
+``AsyncRPCClient`` is the coroutine counterpart of ``RPCClient`` for callers
+that already live on an event loop.
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Optional, Sequence, Set, Tuple, Union
+
+from .rpc import (
+    CODECS,
+    FRAME_HEADER,
+    JSON_CODEC,
+    MAX_FRAME_SIZE,
+    Codec,
+    Payload,
+    RPCError,
+    RPCRequest,
+    RPCResponse,
+    default_codec_preference,
+    hello_frame,
+    negotiate_codec,
+    parse_hello,
+)
+
+
+Handler = Callable[[Payload], Union[Payload, Awaitable[Payload]]]
+
+# Large AppendEntries batches travel as a single JSON line in legacy mode.
+_STREAM_LIMIT = 64 * 1024 * 1024
+
+
+async def _read_frame(reader: asyncio.StreamReader, codec: Codec) -> Optional[memoryview]:
+    """Return the next frame body, or ``None`` once the peer has gone away."""
+    try:
+        if codec.length_prefixed:
+            header = await reader.readexactly(FRAME_HEADER.size)
+            (length,) = FRAME_HEADER.unpack(header)
+            if length > MAX_FRAME_SIZE:
+                return None
+            return memoryview(await reader.readexactly(length))
+        while True:
+            line = await reader.readuntil(b"\n")
+            if len(line) > 1:
+                return memoryview(line)[:-1]
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        return None
+
+
+class AsyncRPCServer:
+    """Event-loop based RPC server with the same API as ``RPCServer``."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        codecs: Optional[Sequence[str]] = None,
+        max_workers: int = 64,
+        backlog: int = 1024,
+        max_blocking_workers: int = 256,
+        max_inflight: int = 64,
+    ) -> None:
+        self._host = host
+        self._port = port
+        self._codecs = tuple(codecs) if codecs is not None else default_codec_preference()
+        self._backlog = backlog
+        self._max_inflight = max_inflight
+        self._handlers: Dict[Tuple[str, str], Handler] = {}
+        self._blocking: Set[Tuple[str, str]] = set()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rpc-handler")
+        self._blocking_executor = ThreadPoolExecutor(
+            max_workers=max_blocking_workers, thread_name_prefix="rpc-blocking"
+        )
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._host, self._port
+
+    def register(self, service: str, method: str, handler: Handler, blocking: bool = False) -> None:
+        self._handlers[(service, method)] = handler
+        if blocking:
+            self._blocking.add((service, method))
+        else:
+            self._blocking.discard((service, method))
+
+    def start(self) -> None:
+        if self._loop is not None:
+            raise RuntimeError("Server already running")
+        loop = asyncio.new_event_loop()
+        self._loop = loop
+        started = threading.Event()
+
+        def run() -> None:
+            asyncio.set_event_loop(loop)
+            started.set()
+            loop.run_forever()
+            loop.close()
+
+        self._loop_thread = threading.Thread(target=run, daemon=True)
+        self._loop_thread.start()
+        started.wait()
+        future = asyncio.run_coroutine_threadsafe(self._listen(), loop)
+        try:
+            future.result()
+        except BaseException:
+            loop.call_soon_threadsafe(loop.stop)
+            self._loop_thread.join(timeout=1.0)
+            self._loop = None
+            raise
+
+    async def _listen(self) -> None:
+        self._server = await asyncio.start_server(
+            self._handle_client,
+            self._host,
+            self._port,
+            backlog=self._backlog,
+            limit=_STREAM_LIMIT,
+            reuse_address=True,
+        )
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writers.add(writer)
+        codec: Codec = JSON_CODEC
+        tasks: Set[asyncio.Task] = set()
+        slots = asyncio.Semaphore(self._max_inflight)
+        first = True
+        try:
+            while True:
+                frame = await _read_frame(reader, codec)
+                if frame is None:
+                    return
+                if first:
+                    first = False
+                    offered = parse_hello(frame)
+                    if offered is not None:
+                        codec = negotiate_codec(offered, self._codecs)
+                        writer.write(hello_frame((codec.name,)))
+                        continue
+                try:
+                    request = RPCRequest.from_dict(codec.decode(frame))
+                except (RPCError, KeyError, TypeError) as exc:
+                    writer.write(codec.encode(RPCResponse(payload={"error": str(exc)}).to_dict()))
+                    continue
+                if request.request_id is None:
+                    # Legacy clients expect responses in request order.
+                    response = await self._dispatch(request)
+                    writer.write(codec.encode(response.to_dict()))
+                    await writer.drain()
+                    continue
+                # Backpressure: stop reading until a slot frees up.
+                await slots.acquire()
+                task = asyncio.ensure_future(self._serve_pipelined(writer, codec, request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                task.add_done_callback(lambda _: slots.release())
+        except ConnectionError:
+            return
+        finally:
+            self._writers.discard(writer)
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _serve_pipelined(self, writer: asyncio.StreamWriter, codec: Codec, request: RPCRequest) -> None:
+        response = await self._dispatch(request)
+        if writer.is_closing():
+            return
+        writer.write(codec.encode(response.to_dict()))
+        try:
+            await writer.drain()
+        except ConnectionError:
+            writer.close()
+
+    async def _dispatch(self, request: RPCRequest) -> RPCResponse:
+        handler = self._handlers.get((request.service, request.method))
+        if handler is None:
+            return RPCResponse(payload={"error": "method_not_found"}, request_id=request.request_id)
+        try:
+            if inspect.iscoroutinefunction(handler):
+                result = await handler(request.payload)
+            else:
+                loop = asyncio.get_running_loop()
+                key = (request.service, request.method)
+                executor = self._blocking_executor if key in self._blocking else self._executor
+                result = await loop.run_in_executor(executor, handler, request.payload)
+                if inspect.isawaitable(result):
+                    result = await result
+        except Exception as exc:  # pragma: no cover - defensive
+            return RPCResponse(payload={"error": str(exc)}, request_id=request.request_id)
+        return RPCResponse(payload=result, request_id=request.request_id)
+
+    async def _shutdown(self) -> None:
+        if self._server is not None:
+            self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        self._writers.clear()
+        if self._server is not None:
+            await self._server.wait_closed()
+
+    def stop(self) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout=1.0)
+        except Exception:  # pragma: no cover - defensive
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+        if self._loop_thread and self._loop_thread.is_alive():
+            self._loop_thread.join(timeout=1.0)
+        self._executor.shutdown(wait=False)
+        self._blocking_executor.shutdown(wait=False)
+
+
+class AsyncRPCClient:
+    """Coroutine RPC client that pipelines calls over one connection."""
+
+    def __init__(self, host: str, port: int, codecs: Optional[Sequence[str]] = None) -> None:
+        self._host = host
+        self._port = port
+        self._codecs = tuple(codecs) if codecs is not None else default_codec_preference()
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._codec: Codec = JSON_CODEC
+        self._pending: Dict[int, "asyncio.Future[RPCResponse]"] = {}
+        self._ids = itertools.count(1)
+        self._read_task: Optional[asyncio.Task] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def codec(self) -> Codec:
+        return self._codec
+
+    async def _ensure_connected(self, timeout: float) -> None:
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self._host, self._port, limit=_STREAM_LIMIT), timeout
+            )
+            codec: Codec = JSON_CODEC
+            if self._codecs:
+                writer.write(hello_frame(self._codecs))
+                reply = await asyncio.wait_for(_read_frame(reader, JSON_CODEC), timeout)
+                if reply is None:
+                    writer.close()
+                    raise ConnectionError("Connection closed during handshake")
+                chosen = parse_hello(reply)
+                if chosen and chosen[0] in CODECS:
+                    codec = CODECS[chosen[0]]
+            self._reader, self._writer, self._codec = reader, writer, codec
+            self._read_task = asyncio.ensure_future(self._read_loop(reader, writer, codec))
+
+    async def _read_loop(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, codec: Codec
+    ) -> None:
+        try:
+            while True:
+                frame = await _read_frame(reader, codec)
+                if frame is None:
+                    break
+                response = RPCResponse.from_dict(codec.decode(frame))
+                if response.request_id is None and self._pending:
+                    # Servers without pipelining answer in request order.
+                    future = self._pending.pop(next(iter(self._pending)))
+                else:
+                    future = self._pending.pop(response.request_id, None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except RPCError:
+            pass
+        finally:
+            self._fail_pending(ConnectionError("Connection closed before response"))
+            writer.close()
+
+    def _fail_pending(self, exc: Exception) -> None:
+        pending = list(self._pending.values())
+        self._pending.clear()
+        for future in pending:
+            if not future.done():
+                future.set_exception(exc)
+
+    async def call(self, service: str, method: str, payload: Payload, timeout: float = 5.0) -> Payload:
+        try:
+            # A connection the peer already hung up on is replaced here, so
+            # restarts are transparent to callers.
+            await self._ensure_connected(timeout)
+            response = await self._send(service, method, payload, timeout)
+        except (OSError, asyncio.TimeoutError) as exc:
+            raise RPCError(str(exc) or "timed out") from exc
+        if "error" in response.payload:
+            raise RPCError(response.payload["error"])
+        return response.payload
+
+    async def _send(self, service: str, method: str, payload: Payload, timeout: float) -> RPCResponse:
+        assert self._writer is not None
+        request_id = next(self._ids)
+        future: "asyncio.Future[RPCResponse]" = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        request = RPCRequest(service=service, method=method, payload=payload, request_id=request_id)
+        try:
+            self._writer.write(self._codec.encode(request.to_dict()))
+            await self._writer.drain()
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if self._read_task is not None:
+            await asyncio.gather(self._read_task, return_exceptions=True)
+        self._writer = None
+        self._read_task = None
+
@@ -0,0 +1,141 @@
+"""Measure write unavailability while a follower is partitioned and healed.
+
+Starts an in-process cluster, keeps a writer issuing ``set`` commands, and
+repeatedly cuts one follower off from its peers for longer than the election
+timeout before reconnecting it. Every gap between consecutive successful
+writes longer than ``--gap`` seconds is reported as an unavailability window.
+Without PreVote the healed node rejoins with an inflated term and forces a
+cluster-wide election; with it the cluster keeps its leader::
+
+    python -m consensus.bench_elections --cycles 5
+    python -m consensus.bench_elections --cycles 5 --no-pre-vote
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import threading
+import time
+from typing import Any, Dict, List, Set
+
+from consensus.node import ConsensusNode, NodeConfig
+from consensus.rpc import RPCClient, parse_target
+
+
+class Partition:
+    """Drops Raft RPCs to and from isolated nodes at the sending side."""
+
+    def __init__(self, nodes: Dict[str, ConsensusNode]) -> None:
+        self.isolated: Set[str] = set()
+        for node_id, node in nodes.items():
+            node._send_raft = self._wrap(node_id, node._send_raft)  # type: ignore[method-assign]
+
+    def _wrap(self, node_id: str, send: Any) -> Any:
+        def send_raft(rpc_name: str, peer_id: str, target: str, message: Dict[str, Any]) -> Dict[str, Any]:
+            if node_id in self.isolated or peer_id in self.isolated:
+                raise ConnectionError("partitioned")
+            return send(rpc_name, peer_id, target, message)
+
+        return send_raft
+
+
+def start_cluster(size: int, base_port: int, pre_vote: bool, check_quorum: bool) -> Dict[str, ConsensusNode]:
+    addresses = {f"b{index}": f"127.0.0.1:{base_port + index}" for index in range(size)}
+    nodes: Dict[str, ConsensusNode] = {}
+    for node_id, address in addresses.items():
+        host, port = parse_target(address)
+        config = NodeConfig(
+            node_id=node_id,
+            host=host,
+            port=port,
+            peers={peer_id: peer for peer_id, peer in addresses.items() if peer_id != node_id},
+            pre_vote=pre_vote,
+            check_quorum=check_quorum,
+        )
+        nodes[node_id] = ConsensusNode(config)
+        nodes[node_id].start()
+    return nodes
+
+
+def current_leader(nodes: Dict[str, ConsensusNode], partition: Partition) -> str:
+    for node_id, node in nodes.items():
+        if node_id not in partition.isolated and node._role == "leader":
+            return node_id
+    return ""
+
+
+def run_writer(
+    nodes: Dict[str, ConsensusNode], partition: Partition, stop: threading.Event, successes: List[float]
+) -> None:
+    clients = {node_id: RPCClient(*parse_target(node.config.address)) for node_id, node in nodes.items()}
+    sequence = 0
+    while not stop.is_set():
+        leader = current_leader(nodes, partition)
+        if not leader:
+            time.sleep(0.01)
+            continue
+        sequence += 1
+        try:
+            response = clients[leader].call(
+                "RaftService",
+                "ClientCommand",
+                {"source_id": "bench", "command": f"set bench {sequence}", "request_id": str(sequence)},
+            )
+        except Exception:
+            time.sleep(0.01)
+            continue
+        if response.get("success"):
+            successes.append(time.monotonic())
+
+
+def unavailability_windows(successes: List[float], gap: float) -> List[float]:
+    return [later - earlier for earlier, later in zip(successes, successes[1:]) if later - earlier > gap]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark write availability across partitions")
+    parser.add_argument("--nodes", type=int, default=5, help="Cluster size")
+    parser.add_argument("--cycles", type=int, default=3, help="Partition/heal cycles to run")
+    parser.add_argument("--isolate", type=float, default=5.0, help="Seconds a follower stays partitioned")
+    parser.add_argument("--settle", type=float, default=5.0, help="Seconds to observe after each heal")
+    parser.add_argument("--gap", type=float, default=0.5, help="Write gap counted as unavailability")
+    parser.add_argument("--base-port", type=int, default=7400, help="First port of the cluster")
+    parser.add_argument("--no-pre-vote", action="store_true", help="Disable the PreVote phase")
+    parser.add_argument("--no-check-quorum", action="store_true", help="Disable leader check-quorum")
+    args = parser.parse_args()
+
+    nodes = start_cluster(args.nodes, args.base_port, not args.no_pre_vote, not args.no_check_quorum)
+    partition = Partition(nodes)
+    stop = threading.Event()
+    successes: List[float] = []
+    writer = threading.Thread(target=run_writer, args=(nodes, partition, stop, successes), daemon=True)
+    try:
+        while not current_leader(nodes, partition):
+            time.sleep(0.1)
+        writer.start()
+        time.sleep(1.0)
+        for cycle in range(args.cycles):
+            leader = current_leader(nodes, partition)
+            victim = next(node_id for node_id in nodes if node_id != leader)
+            partition.isolated.add(victim)
+            time.sleep(args.isolate)
+            partition.isolated.discard(victim)
+            terms = {node._current_term for node in nodes.values()}
+            time.sleep(args.settle)
+            print(f"cycle {cycle + 1}: isolated {victim}, terms at heal {sorted(terms)}")
+    finally:
+        stop.set()
+        writer.join(timeout=5.0)
+        for node in nodes.values():
+            node.stop()
+
+    windows = unavailability_windows(successes, args.gap)
+    print(f"successful writes: {len(successes)}")
+    print(f"unavailability windows > {args.gap}s: {len(windows)}")
+    if windows:
+        print(f"longest window: {max(windows):.2f}s, mean: {statistics.mean(windows):.2f}s")
+        print(f"total unavailable: {sum(windows):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
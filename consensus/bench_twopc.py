@@ -0,0 +1,89 @@
+"""Measure 2PC coordinator throughput, messages per transaction and latency.
+
+Starts an in-process cluster and keeps ``--concurrency`` transactions in
+flight from one coordinator for ``--duration`` seconds, once with classic 2PC
+and once with the presumed-abort, read-only and one-phase optimizations::
+
+    python -m consensus.bench_twopc --nodes 3 --concurrency 256
+
+Of the transactions, ``--read-only`` are reads (every participant votes
+read-only) and ``--single`` touch only one participant; the rest write to
+every node.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import random
+import threading
+import time
+from typing import Dict, List
+
+from consensus.node import ConsensusNode, NodeConfig
+
+
+def run(args: argparse.Namespace, optimize: bool, base_port: int) -> Dict[str, float]:
+    addresses = {f"t{index}": f"127.0.0.1:{base_port + index}" for index in range(args.nodes)}
+    nodes: Dict[str, ConsensusNode] = {}
+    for node_id, address in addresses.items():
+        config = NodeConfig(
+            node_id=node_id,
+            host="127.0.0.1",
+            port=int(address.rsplit(":", 1)[1]),
+            peers={peer_id: peer for peer_id, peer in addresses.items() if peer_id != node_id},
+            twopc_batch_window=args.batch_window,
+            twopc_optimize=optimize,
+        )
+        nodes[node_id] = ConsensusNode(config)
+        nodes[node_id].start()
+    coordinator = nodes["t0"]
+    participants: List[str] = list(addresses)
+    slots = threading.Semaphore(args.concurrency)
+    chooser = random.Random(args.seed)
+    deadline = time.monotonic() + args.duration
+    try:
+        # Every RPC prints a line; keep them out of the report.
+        with contextlib.redirect_stdout(io.StringIO()):
+            while time.monotonic() < deadline:
+                slots.acquire()
+                draw = chooser.random()
+                if draw < args.read_only:
+                    future = coordinator.submit_transaction("get bench", participants)
+                elif draw < args.read_only + args.single:
+                    future = coordinator.submit_transaction("set bench 1", [chooser.choice(participants)])
+                else:
+                    future = coordinator.submit_transaction("set bench 1", participants)
+                future.add_done_callback(lambda _: slots.release())
+            for _ in range(args.concurrency):
+                slots.acquire()
+        return coordinator.transaction_metrics()
+    finally:
+        for node in nodes.values():
+            node.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the two-phase commit coordinator")
+    parser.add_argument("--nodes", type=int, default=3, help="Participants, including the coordinator")
+    parser.add_argument("--concurrency", type=int, default=256, help="Transactions kept in flight")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds to run each mode")
+    parser.add_argument("--batch-window", type=float, default=0.002, help="Seconds to wait for a batch")
+    parser.add_argument("--read-only", type=float, default=0.5, help="Fraction of read-only transactions")
+    parser.add_argument("--single", type=float, default=0.2, help="Fraction of single-participant transactions")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the workload mix")
+    parser.add_argument("--base-port", type=int, default=7600, help="First port of the cluster")
+    args = parser.parse_args()
+
+    results = {
+        "classic": run(args, optimize=False, base_port=args.base_port),
+        "optimized": run(args, optimize=True, base_port=args.base_port + args.nodes),
+    }
+    print(f"{'':<18}" + "".join(f"{mode:>12}" for mode in results))
+    for name in results["classic"]:
+        values = [results[mode][name] for mode in results]
+        print(f"{name:<18}" + "".join(f"{value:>12.2f}" if isinstance(value, float) else f"{value:>12}" for value in values))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Parsing of key/value state-machine commands into compact typed ops.
+
+Commands travel as strings such as ``"set temperature 42"``. The leader and
+followers parse each one once, when it is appended to the log, into a
+``ParsedCommand`` tuple so applying it is a dispatch on an integer opcode
+rather than a fresh ``split``/``lower``. Clients tend to repeat the same
+commands (``increment counter``), so parses are memoised in a bounded cache.
+"""
+from __future__ import annotations
+
+import functools
+from typing import NamedTuple
+
+
+OP_NOOP = 0
+OP_SET = 1
+OP_INCREMENT = 2
+OP_GET = 3
+# Anything else is recorded as applied but leaves the store untouched.
+OP_UNKNOWN = 4
+
+
+class ParsedCommand(NamedTuple):
+    op: int
+    key: str = ""
+    value: str = ""
+
+    @property
+    def read_only(self) -> bool:
+        return self.op == OP_GET
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_command(command: str) -> ParsedCommand:
+    parts = command.split()
+    if not parts:
+        return ParsedCommand(OP_NOOP)
+    op = parts[0].lower()
+    if op == "set" and len(parts) == 3:
+        return ParsedCommand(OP_SET, parts[1], parts[2])
+    if op == "increment" and len(parts) == 2:
+        return ParsedCommand(OP_INCREMENT, parts[1])
+    if op == "get" and len(parts) == 2:
+        return ParsedCommand(OP_GET, parts[1])
+    return ParsedCommand(OP_UNKNOWN)
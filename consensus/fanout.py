@@ -0,0 +1,94 @@
+"""Concurrent fan-out of RPC rounds with early return on a quorum.
+
+Raft elections and replication only need a majority of peers to answer, and a
+2PC vote is decided by the first abort. ``FanOut`` sends one call per peer on a
+shared thread pool and returns as soon as the outcome is known, so a round
+costs roughly the quorum's latency rather than the sum of every peer's. Calls
+still running when the round returns (stragglers) are left to finish in the
+background and their results are ignored; calls that had not started yet are
+cancelled.
+"""
+from __future__ import annotations
+
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+
+@dataclass
+class FanOutResult:
+    needed: int
+    results: Dict[str, Any] = field(default_factory=dict)
+    errors: Dict[str, BaseException] = field(default_factory=dict)
+    accepted: int = 0
+    rejected: bool = False
+
+    @property
+    def reached(self) -> bool:
+        return not self.rejected and self.accepted >= self.needed
+
+
+class FanOut:
+    """Runs one call per peer concurrently on a bounded thread pool."""
+
+    def __init__(self, max_workers: int = 32, name: str = "fanout") -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> "Future[Any]":
+        return self._executor.submit(fn, *args)
+
+    def broadcast(
+        self,
+        calls: Dict[str, Callable[[], Any]],
+        needed: Optional[int] = None,
+        accept: Callable[[Any], bool] = bool,
+        reject: Optional[Callable[[Any], bool]] = None,
+        timeout: Optional[float] = None,
+    ) -> FanOutResult:
+        """Run ``calls`` concurrently and return once the round is decided.
+
+        The round is decided when ``needed`` results satisfy ``accept``, when
+        any result satisfies ``reject``, when the quorum can no longer be
+        reached, when every call has finished, or after ``timeout`` seconds.
+        ``needed`` defaults to every call.
+        """
+        result = FanOutResult(needed=len(calls) if needed is None else needed)
+        futures: Dict["Future[Any]", str] = {}
+        for key, call in calls.items():
+            try:
+                futures[self._executor.submit(call)] = key
+            except RuntimeError as exc:  # executor already shut down
+                result.errors[key] = exc
+        pending = set(futures)
+        if result.needed <= 0:
+            # Nothing to wait for; the calls still go out in the background.
+            return result
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while pending:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                key = futures[future]
+                try:
+                    value = future.result()
+                except Exception as exc:
+                    result.errors[key] = exc
+                    continue
+                result.results[key] = value
+                if reject is not None and reject(value):
+                    result.rejected = True
+                elif accept(value):
+                    result.accepted += 1
+            if result.rejected or result.accepted >= result.needed:
+                break
+            if result.accepted + len(pending) < result.needed:
+                break
+        for future in pending:
+            future.cancel()
+        return result
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
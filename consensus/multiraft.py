@@ -0,0 +1,191 @@
+"""Multi-Raft: many Raft groups sharing one process, server and transport.
+
+A ``MultiRaftHost`` runs ``groups`` independent Raft groups, each owning a hash
+shard of the key space, behind a single RPC server and connection pool. Every
+group elects its own leader, so leadership (and therefore write load) spreads
+across hosts. Group RPCs are addressed to per-group services (see
+``consensus.node.raft_service``); client commands sent to the host's
+``MultiRaft`` service are routed to the group that owns their key.
+
+Idle heartbeats are coalesced: instead of every group leader sending its own
+empty AppendEntries to every peer, the host sends one ``Heartbeat`` RPC per
+peer host per interval carrying the heartbeats of all groups it leads.
+Followers that are missing entries are still served by their group's regular
+replication path.
+"""
+from __future__ import annotations
+
+import dataclasses
+import functools
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from .fanout import FanOut
+from .node import RPC_ENGINES, ConsensusNode, NodeConfig
+from .rpc import ConnectionPool, RPCClient, parse_target
+from .scheduler import Scheduler, default_scheduler
+
+
+MULTIRAFT_SERVICE = "MultiRaft"
+
+
+def shard_for_key(key: str, shards: int) -> int:
+    return zlib.crc32(key.encode("utf-8")) % shards
+
+
+class MultiRaftHost:
+    """Hosts ``groups`` Raft groups configured from one ``NodeConfig``.
+
+    ``config.node_id`` identifies the host and ``config.peers`` maps the other
+    hosts to their addresses; every group spans the same set of hosts.
+    """
+
+    def __init__(self, config: NodeConfig, groups: int, scheduler: Optional[Scheduler] = None) -> None:
+        if groups < 1:
+            raise ValueError("A Multi-Raft host needs at least one group")
+        if config.rpc_engine not in RPC_ENGINES:
+            raise ValueError(f"Unknown RPC engine {config.rpc_engine}")
+        self.config = config
+        self._scheduler = scheduler or default_scheduler()
+        self._server = RPC_ENGINES[config.rpc_engine](config.host, config.port)
+        self._server.register(MULTIRAFT_SERVICE, "ClientCommand", self._handle_client_command, blocking=True)
+        self._server.register(MULTIRAFT_SERVICE, "Heartbeat", self._handle_heartbeat)
+        self._server.register(MULTIRAFT_SERVICE, "GetStatus", self._handle_get_status)
+        self._pool = ConnectionPool()
+        self.group_ids: List[str] = [f"g{index}" for index in range(groups)]
+        self.groups: Dict[str, ConsensusNode] = {}
+        for group_id in self.group_ids:
+            group_config = dataclasses.replace(
+                config,
+                peers=dict(config.peers),
+                group_id=group_id,
+                data_dir=os.path.join(config.data_dir, group_id) if config.data_dir else None,
+            )
+            self.groups[group_id] = ConsensusNode(
+                group_config, scheduler=self._scheduler, server=self._server, pool=self._pool
+            )
+        self._running = threading.Event()
+        self._fanout = FanOut(max_workers=config.fanout_workers, name=f"{config.node_id}-hb")
+        self._tick_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{config.node_id}-tick")
+        self._clients: Dict[str, RPCClient] = {}
+        self._clients_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Lifecycle management
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        self._server.start()
+        self._running.set()
+        for group in self.groups.values():
+            group.start()
+        self._scheduler.call_later(self.config.heartbeat_interval, self._on_heartbeat_tick)
+
+    def stop(self) -> None:
+        self._running.clear()
+        for group in self.groups.values():
+            group.stop()
+        self._tick_executor.shutdown(wait=False, cancel_futures=True)
+        self._fanout.shutdown()
+        self._server.stop()
+        self._pool.close()
+
+    def wait(self) -> None:
+        for group in self.groups.values():
+            group.wait()
+
+    def group_for_key(self, key: str) -> ConsensusNode:
+        return self.groups[self.group_ids[shard_for_key(key, len(self.group_ids))]]
+
+    # ------------------------------------------------------------------
+    # RPC handlers
+    # ------------------------------------------------------------------
+    def _handle_client_command(self, payload: Dict[str, str]) -> Dict[str, Any]:
+        parts = payload["command"].strip().split()
+        group = self.group_for_key(parts[1] if len(parts) > 1 else "")
+        response = dict(group._handle_client_command(payload))
+        response["group_id"] = group.config.group_id
+        return response
+
+    def _handle_heartbeat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Deliver a batch of per-group heartbeats from one leader host."""
+        leader_id = payload.get("leader_id", "")
+        print(f"Node {self.config.node_id} runs RPC Heartbeat called by Node {leader_id}")
+        responses = {}
+        for group_id, request in payload.get("groups", {}).items():
+            group = self.groups.get(group_id)
+            if group is not None:
+                responses[group_id] = group._handle_append_entries(request)
+        return {"groups": responses}
+
+    def _handle_get_status(self, payload: Dict[str, str]) -> Dict[str, Any]:
+        return {
+            "node_id": self.config.node_id,
+            "groups": {group_id: group._handle_get_status(payload) for group_id, group in self.groups.items()},
+        }
+
+    # ------------------------------------------------------------------
+    # Coalesced heartbeats
+    # ------------------------------------------------------------------
+    def _on_heartbeat_tick(self) -> None:
+        # Runs on the shared scheduler thread; the sends happen elsewhere.
+        if not self._running.is_set():
+            return
+        try:
+            self._tick_executor.submit(self._send_heartbeats)
+        except RuntimeError:
+            return  # host stopped
+        self._scheduler.call_later(self.config.heartbeat_interval, self._on_heartbeat_tick)
+
+    def _send_heartbeats(self) -> None:
+        peers = [peer_id for peer_id in self.config.peers if peer_id != self.config.node_id]
+        batches: Dict[str, Dict[str, Dict[str, Any]]] = {peer_id: {} for peer_id in peers}
+        for group_id, group in self.groups.items():
+            if not group._check_quorum():
+                continue
+            needs_replication = False
+            with group._state_lock:
+                if group._role != "leader":
+                    continue
+                for peer_id in peers:
+                    request = group._append_request_locked(peer_id)
+                    if request is None or request["entries"]:
+                        needs_replication = True
+                    else:
+                        batches[peer_id][group_id] = request
+            if needs_replication:
+                # Lagging followers get entries or a snapshot the usual way.
+                group._trigger_heartbeat()
+        sent_at = time.monotonic()
+        self._fanout.broadcast(
+            {
+                peer_id: functools.partial(self._send_batch, peer_id, batch, sent_at)
+                for peer_id, batch in batches.items()
+                if batch
+            },
+            needed=0,
+        )
+
+    def _send_batch(self, peer_id: str, batch: Dict[str, Dict[str, Any]], sent_at: float) -> None:
+        target = self.config.peers[peer_id]
+        print(f"Node {self.config.node_id} sends RPC Heartbeat to Node {peer_id} ({target})")
+        response = self._build_client(target).call(
+            MULTIRAFT_SERVICE, "Heartbeat", {"leader_id": self.config.node_id, "groups": batch}
+        )
+        for group_id, group_response in response.get("groups", {}).items():
+            group = self.groups[group_id]
+            if group._on_append_response(peer_id, batch[group_id], sent_at, group_response) is None:
+                group._trigger_heartbeat()  # follower diverged; let the group backtrack
+            group._signal_apply()
+
+    def _build_client(self, target: str) -> RPCClient:
+        with self._clients_lock:
+            client = self._clients.get(target)
+            if client is None:
+                host, port = parse_target(target)
+                client = RPCClient(host, port, pool=self._pool)
+                self._clients[target] = client
+            return client
@@ -1,33 +1,53 @@
 """Implementation of 2PC and Raft nodes using the lightweight RPC layer."""
 from __future__ import annotations
 
+import base64
+import functools
+import json
 import random
 import threading
 import time
 import uuid
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
-from .rpc import RPCClient, RPCError, RPCServer, parse_target
+from .aiorpc import AsyncRPCServer
+from .commands import OP_GET, OP_INCREMENT, OP_NOOP, OP_SET, ParsedCommand, parse_command
+from .fanout import FanOut
+from .raftlog import LogEntry, RaftLog
+from .rpc import ConnectionPool, RPCClient, RPCError, RPCServer, parse_target
+from .scheduler import Scheduler, default_scheduler
+from .storage import RaftStorage, TwoPCLog
+from .twopc import TWOPC_DECISION_SERVICE, TWOPC_VOTING_SERVICE, TwoPhaseCoordinator
 
 
-TWOPC_VOTING_SERVICE = "VotingPhase"
-TWOPC_DECISION_SERVICE = "DecisionPhase"
 RAFT_SERVICE = "RaftService"
 
+# Server implementations selectable through ``NodeConfig.rpc_engine``.
+RPC_ENGINES = {"threads": RPCServer, "asyncio": AsyncRPCServer}
 
-@dataclass
-class LogEntry:
-    index: int
-    term: int
-    command: str
+
+def raft_service(group_id: str = "") -> str:
+    """RPC service name of a Raft group; the default group keeps the plain name."""
+    return f"{RAFT_SERVICE}.{group_id}" if group_id else RAFT_SERVICE
+
+
+# How read-only commands are served; see ``NodeConfig.read_mode``.
+READ_MODES = ("log", "read_index", "lease")
 
 
 @dataclass
 class TransactionRecord:
+    """A transaction this participant voted to commit and awaits the decision of."""
+
     transaction_id: str
     payload: str
-    decision: Optional[bool] = None
+    coordinator_id: str = ""
+    # Every participant's id -> address, for the termination protocol.
+    participants: Dict[str, str] = field(default_factory=dict)
+    prepared_at: float = 0.0
 
 
 @dataclass
@@ -39,6 +59,64 @@ class NodeConfig:
     vote_commit: bool = True
     election_timeout_range: Tuple[float, float] = (1.5, 3.0)
     heartbeat_interval: float = 1.0
+    rpc_engine: str = "threads"
+    fanout_workers: int = 32
+    # Leader-side command batching: commands arriving within ``batch_window``
+    # seconds (up to ``max_batch_size``) share one AppendEntries round, and at
+    # most ``max_inflight_batches`` rounds are replicated concurrently.
+    batch_window: float = 0.002
+    max_batch_size: int = 64
+    max_inflight_batches: int = 4
+    command_timeout: float = 5.0
+    # Directory for the write-ahead log and term/vote metadata; ``None`` keeps
+    # all Raft state in memory.
+    data_dir: Optional[str] = None
+    wal_segment_bytes: int = 64 * 1024 * 1024
+    wal_fsync: bool = True
+    # Snapshot the state machine and drop the log prefix once this many
+    # entries (or command bytes) have been applied since the last snapshot;
+    # 0 disables that trigger. Snapshots reach lagging followers through
+    # InstallSnapshot in ``snapshot_chunk_bytes`` pieces.
+    snapshot_entries: int = 10000
+    snapshot_bytes: int = 16 * 1024 * 1024
+    snapshot_chunk_bytes: int = 64 * 1024
+    # 2PC coordinator batching: vote and decision messages for the same
+    # participant arriving within ``twopc_batch_window`` seconds share one RPC.
+    twopc_batch_window: float = 0.002
+    twopc_max_batch_size: int = 256
+    # Skip decision messages that carry no information: to abort voters, to
+    # read-only participants, and for single-participant transactions
+    # (committed in one phase). See ``consensus.twopc``.
+    twopc_optimize: bool = True
+    # With ``data_dir`` set, 2PC records go to ``twopc.log`` there (see
+    # ``consensus.storage.TwoPCLog``), rewritten once it passes
+    # ``twopc_log_compact_bytes``. Every ``twopc_retry_interval`` seconds
+    # unacknowledged decisions are re-sent, and transactions this node has
+    # been prepared on for ``twopc_in_doubt_timeout`` seconds are resolved
+    # by asking the coordinator, then the other participants. The latest
+    # ``twopc_outcome_history`` outcomes are kept to answer those questions.
+    twopc_log_compact_bytes: int = 4 * 1024 * 1024
+    twopc_retry_interval: float = 1.0
+    twopc_in_doubt_timeout: float = 2.0
+    twopc_outcome_history: int = 10000
+    # Most recent applied commands kept (in a ring buffer) for GetStatus.
+    applied_history: int = 1000
+    # ``get`` commands skip the log unless ``read_mode`` is "log".
+    # "read_index" confirms leadership with one heartbeat round before
+    # reading; "lease" skips that round while a majority acknowledged the
+    # leader within the minimum election timeout, shrunk by
+    # ``max_clock_drift`` to tolerate clocks running at different rates.
+    read_mode: str = "read_index"
+    max_clock_drift: float = 0.1
+    # ``pre_vote`` makes a node win a PreVote round before bumping its term,
+    # so a rejoining partitioned node cannot force an election; with
+    # ``check_quorum`` a leader steps down once a majority has been silent
+    # for the maximum election timeout.
+    pre_vote: bool = True
+    check_quorum: bool = True
+    # Raft group this node belongs to when several groups share one server
+    # (see ``consensus.multiraft``); its RPCs live under their own service.
+    group_id: str = ""
 
     @property
     def address(self) -> str:
@@ -46,51 +124,187 @@ class NodeConfig:
 
 
 class ConsensusNode:
-    def __init__(self, config: NodeConfig) -> None:
+    def __init__(
+        self,
+        config: NodeConfig,
+        scheduler: Optional[Scheduler] = None,
+        server: Optional[Any] = None,
+        pool: Optional[ConnectionPool] = None,
+    ) -> None:
+        """Create a node; ``server`` and ``pool`` are shared when hosted.
+
+        A hosted node (one given a ``server``) leaves starting and stopping
+        the server, and sending idle heartbeats, to its host.
+        """
         self.config = config
-        self._server = RPCServer(config.host, config.port)
-        self._server.register(TWOPC_VOTING_SERVICE, "RequestVote", self._handle_vote_request)
-        self._server.register(TWOPC_DECISION_SERVICE, "DeliverDecision", self._handle_decision)
-        self._server.register(RAFT_SERVICE, "RequestVote", self._handle_raft_request_vote)
-        self._server.register(RAFT_SERVICE, "AppendEntries", self._handle_append_entries)
-        self._server.register(RAFT_SERVICE, "ClientCommand", self._handle_client_command)
-        self._server.register(RAFT_SERVICE, "GetStatus", self._handle_get_status)
-        self._server.register(RAFT_SERVICE, "Shutdown", self._handle_shutdown)
+        if config.rpc_engine not in RPC_ENGINES:
+            raise ValueError(f"Unknown RPC engine {config.rpc_engine}")
+        if config.read_mode not in READ_MODES:
+            raise ValueError(f"Unknown read mode {config.read_mode}")
+        self._hosted = server is not None
+        self._raft_service = raft_service(config.group_id)
+        if server is None:
+            server = RPC_ENGINES[config.rpc_engine](config.host, config.port)
+            server.register(TWOPC_VOTING_SERVICE, "RequestVote", self._handle_vote_request, blocking=True)
+            server.register(TWOPC_DECISION_SERVICE, "DeliverDecision", self._handle_decision)
+            server.register(TWOPC_VOTING_SERVICE, "RequestVoteBatch", self._handle_vote_batch, blocking=True)
+            server.register(TWOPC_DECISION_SERVICE, "DeliverDecisionBatch", self._handle_decision_batch)
+            server.register(TWOPC_DECISION_SERVICE, "QueryDecision", self._handle_query_decision)
+        self._server = server
+        self._server.register(self._raft_service, "PreVote", self._handle_pre_vote)
+        self._server.register(self._raft_service, "RequestVote", self._handle_raft_request_vote)
+        self._server.register(self._raft_service, "AppendEntries", self._handle_append_entries)
+        self._server.register(self._raft_service, "InstallSnapshot", self._handle_install_snapshot)
+        # These wait on other nodes, so they must not starve the RPCs above.
+        self._server.register(self._raft_service, "ClientCommand", self._handle_client_command, blocking=True)
+        self._server.register(self._raft_service, "ReadIndex", self._handle_read_index, blocking=True)
+        self._server.register(self._raft_service, "GetStatus", self._handle_get_status)
+        self._server.register(self._raft_service, "Shutdown", self._handle_shutdown)
 
+        # Prepared transactions still waiting for their decision, and the
+        # outcomes of recently finished ones (True for commit, None where
+        # this node voted read-only and was not told).
         self._twopc_transactions: Dict[str, TransactionRecord] = {}
+        self._twopc_outcomes: "OrderedDict[str, Optional[bool]]" = OrderedDict()
         self._twopc_lock = threading.Lock()
+        self._twopc_log: Optional[TwoPCLog] = None
 
         self._state_lock = threading.Lock()
         self._role: str = "follower"
         self._current_term: int = 0
         self._voted_for: Optional[str] = None
-        self._log: List[LogEntry] = []
+        # Entries up to ``_snapshot_index`` live only in the snapshot, so the
+        # log starts at ``_snapshot_index + 1``.
+        self._log = RaftLog()
+        self._snapshot_index: int = -1
+        self._snapshot_term: int = 0
+        self._snapshot_data: bytes = b""
+        self._applied_bytes: int = 0
+        # Follower-side reassembly of an InstallSnapshot stream.
+        self._incoming_snapshot: Optional[Tuple[int, int, bytearray]] = None
         self._commit_index: int = -1
         self._last_applied: int = -1
-        self._applied_commands: List[str] = []
+        self._applied_commands: "deque[str]" = deque(maxlen=config.applied_history)
+        # Total commands applied, including those rotated out of the buffer.
+        self._applied_count: int = 0
         self._kv_store: Dict[str, str] = {}
         self._leader_id: Optional[str] = None
         self._last_heartbeat: float = time.time()
+        # Last time an AppendEntries or InstallSnapshot from a leader arrived.
+        self._leader_contact: float = 0.0
+        # Leader-only replication progress, reset on every election win.
+        self._next_index: Dict[str, int] = {}
+        self._match_index: Dict[str, int] = {}
+        # Send time of the latest AppendEntries each follower acknowledged;
+        # the leader lease runs from the quorum's oldest such time.
+        self._lease_acks: Dict[str, float] = {}
+        # Monotonic time each follower last answered us, for check-quorum.
+        self._peer_contact: Dict[str, float] = {}
+        self._scheduler = scheduler or default_scheduler()
+        self._election_timeout = random.uniform(*config.election_timeout_range)
+        # When the last PreVote round failed; the election timer restarts there.
+        self._last_pre_vote: float = 0.0
+        # Monotonic time of the leader's latest AppendEntries broadcast.
+        self._last_broadcast: float = 0.0
+        self._heartbeat_pending = False
+        # Highest log index known to be durable on the leader itself.
+        self._durable_index: int = -1
+        self._storage: Optional[RaftStorage] = None
+        if config.data_dir is not None:
+            self._storage = RaftStorage(
+                config.data_dir, segment_bytes=config.wal_segment_bytes, fsync=config.wal_fsync
+            )
+            self._current_term, self._voted_for, stored = self._storage.load()
+            snapshot = self._storage.load_snapshot()
+            if snapshot is not None:
+                self._restore_state_machine(snapshot[2])
+                self._compact_log_locked(snapshot[0], snapshot[1], snapshot[2])
+                self._commit_index = self._last_applied = snapshot[0]
+            for _, term, command in stored:
+                self._log.append(term, command)
+            if not self._hosted:
+                self._twopc_log = TwoPCLog(
+                    config.data_dir, fsync=config.wal_fsync, compact_bytes=config.twopc_log_compact_bytes
+                )
         self._running = threading.Event()
         self._running.clear()
 
         self._bg_threads: List[threading.Thread] = []
+        self._owns_pool = pool is None
+        self._pool = pool if pool is not None else ConnectionPool()
+        self._fanout = FanOut(max_workers=config.fanout_workers, name=f"{config.node_id}-fanout")
+        self._coordinator = TwoPhaseCoordinator(
+            config.node_id,
+            self._send_twopc,
+            self._fanout,
+            batch_window=config.twopc_batch_window,
+            max_batch_size=config.twopc_max_batch_size,
+            log=self._twopc_log,
+            optimize=config.twopc_optimize,
+        )
+        if self._twopc_log is not None:
+            self._recover_twopc(self._twopc_log.load())
+        self._heartbeats_in_flight: Set[str] = set()
+        self._heartbeats_lock = threading.Lock()
+        self._clients: Dict[str, RPCClient] = {}
+        # Elections and heartbeats wait on the network, so the shared
+        # scheduler hands them to this node-local worker.
+        self._timer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{config.node_id}-timer")
+        self._clients_lock = threading.Lock()
+
+        self._apply_lock = threading.Lock()
+        # Set and notified whenever the commit index may have advanced.
+        self._apply_cond = threading.Condition()
+        self._apply_requested = False
+        # Notified whenever ``_last_applied`` advances; read requests wait on it.
+        self._applied_cond = threading.Condition()
+        self._proposals: List[Tuple[str, "Future[str]"]] = []
+        self._proposal_cond = threading.Condition()
+        # index -> (term, future) for commands awaiting commit on the leader.
+        self._commit_waiters: Dict[int, Tuple[int, "Future[str]"]] = {}
+        self._inflight_batches = threading.BoundedSemaphore(config.max_inflight_batches)
+        self._round_executor = ThreadPoolExecutor(
+            max_workers=config.max_inflight_batches, thread_name_prefix=f"{config.node_id}-round"
+        )
 
     # ------------------------------------------------------------------
     # Lifecycle management
     # ------------------------------------------------------------------
     def start(self) -> None:
-        self._server.start()
+        if not self._hosted:
+            self._server.start()
         self._running.set()
-        election_thread = threading.Thread(target=self._run_election_timer, daemon=True)
-        heartbeat_thread = threading.Thread(target=self._run_heartbeat_loop, daemon=True)
-        self._bg_threads.extend([election_thread, heartbeat_thread])
+        batcher_thread = threading.Thread(target=self._run_batcher, daemon=True)
+        applier_thread = threading.Thread(target=self._run_applier, daemon=True)
+        self._bg_threads.extend([batcher_thread, applier_thread])
         for thread in self._bg_threads:
             thread.start()
+        self._arm_election_timer()
+        if not self._hosted:
+            self._scheduler.call_later(self.config.twopc_retry_interval, self._on_twopc_tick)
 
     def stop(self) -> None:
         self._running.clear()
-        self._server.stop()
+        with self._apply_cond:
+            self._apply_cond.notify_all()
+        if not self._hosted:
+            self._server.stop()
+        if self._owns_pool:
+            self._pool.close()
+        self._fanout.shutdown()
+        self._round_executor.shutdown(wait=False, cancel_futures=True)
+        self._coordinator.stop()
+        self._timer_executor.shutdown(wait=False, cancel_futures=True)
+        with self._proposal_cond:
+            proposals, self._proposals = self._proposals, []
+            self._proposal_cond.notify_all()
+        for _, future in proposals:
+            future.set_exception(RPCError("node_stopped"))
+        self._fail_commit_waiters("node_stopped")
+        if self._storage is not None:
+            self._storage.close()
+        if self._twopc_log is not None:
+            self._twopc_log.close()
 
     def wait(self) -> None:
         for thread in self._bg_threads:
@@ -101,83 +315,112 @@ class ConsensusNode:
     # 2PC coordinator utilities
     # ------------------------------------------------------------------
     def run_transaction(self, payload: str, participants: List[str]) -> bool:
-        transaction_id = uuid.uuid4().hex
-        votes: Dict[str, bool] = {}
+        return self.submit_transaction(payload, participants).result()
+
+    def submit_transaction(self, payload: str, participants: List[str]) -> "Future[bool]":
+        """Start a transaction without waiting; the future resolves to the decision."""
+        targets: Dict[str, str] = {}
         for participant_id in participants:
             target = self.config.peers.get(participant_id)
             if target is None and participant_id != self.config.node_id:
                 raise ValueError(f"Unknown participant {participant_id}")
             if participant_id == self.config.node_id:
                 target = self.config.address
-            self._print_phase_client(
-                "Voting", self.config.node_id, "RequestVote", participant_id, target
-            )
-            client = self._build_client(target)
-            try:
-                response = client.call(
-                    TWOPC_VOTING_SERVICE,
-                    "RequestVote",
-                    {
-                        "coordinator_id": self.config.node_id,
-                        "participant_id": participant_id,
-                        "transaction_id": transaction_id,
-                        "payload": payload,
-                    },
-                )
-            except Exception:
-                votes[participant_id] = False
-            else:
-                votes[participant_id] = bool(response.get("commit", False))
-        decision = all(votes.values())
-        for participant_id in participants:
-            target = self.config.peers.get(participant_id)
-            if target is None and participant_id != self.config.node_id:
-                continue
-            if participant_id == self.config.node_id:
-                target = self.config.address
-            self._print_phase_client(
-                "Decision", self.config.node_id, "DeliverDecision", participant_id, target
-            )
-            client = self._build_client(target)
-            try:
-                client.call(
-                    TWOPC_DECISION_SERVICE,
-                    "DeliverDecision",
-                    {
-                        "coordinator_id": self.config.node_id,
-                        "participant_id": participant_id,
-                        "transaction_id": transaction_id,
-                        "commit": decision,
-                        "payload": payload,
-                    },
-                )
-            except Exception:
-                continue
-        return decision
+            targets[participant_id] = target
+        return self._coordinator.submit(payload, targets)
+
+    def transaction_metrics(self) -> Dict[str, float]:
+        """Coordinator throughput (txn/s) and per-phase latency percentiles."""
+        return self._coordinator.metrics.snapshot()
+
+    def _send_twopc(
+        self,
+        participant_id: str,
+        target: str,
+        service: str,
+        rpc_name: str,
+        message: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        phase = "Voting" if service == TWOPC_VOTING_SERVICE else "Decision"
+        self._print_phase_client(phase, self.config.node_id, rpc_name, participant_id, target)
+        return self._build_client(target).call(service, rpc_name, message)
+
+    def _handle_vote_batch(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        responses = [self._vote(request) for request in payload["requests"]]
+        self._sync_twopc_log()  # one fsync covers the whole batch
+        return {"responses": responses}
+
+    def _handle_decision_batch(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        responses = [self._decide(request) for request in payload["requests"]]
+        # Aborts are presumed, so only a commit has to be durable before the ack.
+        if any(request["commit"] for request in payload["requests"]):
+            self._sync_twopc_log()
+        return {"responses": responses}
+
+    def _handle_vote_request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = self._vote(payload)
+        self._sync_twopc_log()
+        return response
 
-    def _handle_vote_request(self, payload: Dict[str, str]) -> Dict[str, str]:
+    def _handle_decision(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = self._decide(payload)
+        if payload["commit"]:
+            self._sync_twopc_log()
+        return response
+
+    def _vote(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Vote on a transaction; a commit vote is logged before it is returned.
+
+        A payload that writes nothing gets a read-only vote, and a
+        ``one_phase`` request is decided by the vote itself; neither leaves
+        the transaction in doubt here.
+        """
         participant_id = payload["participant_id"]
         self._print_phase_server("Voting", participant_id, "RequestVote", payload["coordinator_id"])
+        transaction_id = payload["transaction_id"]
         vote = self.config.vote_commit
-        record = TransactionRecord(
-            transaction_id=payload["transaction_id"],
-            payload=payload["payload"],
-        )
+        read_only = vote and parse_command(payload["payload"]).read_only
+        one_phase = bool(payload.get("one_phase"))
         with self._twopc_lock:
-            self._twopc_transactions[record.transaction_id] = record
-        return {
+            # The termination protocol may already have aborted it here.
+            if self._twopc_outcomes.get(transaction_id) is False:
+                vote = read_only = False
+            elif read_only or one_phase:
+                self._remember_outcome_locked(transaction_id, None if read_only and not one_phase else vote)
+            elif vote:
+                record = TransactionRecord(
+                    transaction_id=transaction_id,
+                    payload=payload["payload"],
+                    coordinator_id=payload["coordinator_id"],
+                    participants=dict(payload.get("participants") or {}),
+                    prepared_at=time.monotonic(),
+                )
+                self._twopc_transactions[transaction_id] = record
+                if self._twopc_log is not None:
+                    self._twopc_log.append(
+                        {
+                            "kind": "prepared",
+                            "txn": transaction_id,
+                            "payload": record.payload,
+                            "coordinator": record.coordinator_id,
+                            "participants": record.participants,
+                        }
+                    )
+            else:
+                self._remember_outcome_locked(transaction_id, False)
+        response = {
             "participant_id": participant_id,
-            "transaction_id": record.transaction_id,
+            "transaction_id": transaction_id,
             "commit": vote,
         }
+        if read_only:
+            response["read_only"] = True
+        return response
 
-    def _handle_decision(self, payload: Dict[str, str]) -> Dict[str, str]:
+    def _decide(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         participant_id = payload["participant_id"]
         self._print_phase_server("Decision", participant_id, "DeliverDecision", payload["coordinator_id"])
-        with self._twopc_lock:
-            record = self._twopc_transactions.get(payload["transaction_id"])
-            if record:
-                record.decision = payload["commit"]
+        self._apply_decision(payload["transaction_id"], payload["commit"])
         message = "committed" if payload["commit"] else "aborted"
         return {
             "participant_id": participant_id,
@@ -186,6 +429,126 @@ class ConsensusNode:
             "message": message,
         }
 
+    def _apply_decision(self, transaction_id: str, commit: bool) -> None:
+        with self._twopc_lock:
+            record = self._twopc_transactions.pop(transaction_id, None)
+            self._remember_outcome_locked(transaction_id, commit)
+            if record is not None and self._twopc_log is not None:
+                self._twopc_log.append({"kind": "decided", "txn": transaction_id, "commit": commit})
+
+    def _remember_outcome_locked(self, transaction_id: str, commit: Optional[bool]) -> None:
+        """Caller must hold ``_twopc_lock``."""
+        self._twopc_outcomes[transaction_id] = commit
+        self._twopc_outcomes.move_to_end(transaction_id)
+        while len(self._twopc_outcomes) > self.config.twopc_outcome_history:
+            self._twopc_outcomes.popitem(last=False)
+
+    def _sync_twopc_log(self) -> None:
+        if self._twopc_log is not None:
+            self._twopc_log.sync()
+
+    def _handle_query_decision(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Tell another participant what became of an in-doubt transaction.
+
+        Answers "commit" or "abort" when known, "pending" while this node is
+        coordinating it, and "uncertain" when this node is in doubt too or
+        voted read-only. The coordinator presumes abort for transactions it
+        has no record of. Any other node that never voted on the transaction
+        aborts it on the spot, so that it can never vote commit later.
+        """
+        transaction_id = payload["transaction_id"]
+        print(
+            f"Phase Decision of Node {self.config.node_id} runs RPC QueryDecision called by "
+            f"Node {payload.get('requester_id', '')}"
+        )
+        outcome = self._coordinator.outcome(transaction_id)
+        if outcome is None and payload.get("coordinator_id") == self.config.node_id:
+            outcome = "abort"
+        elif outcome is None:
+            with self._twopc_lock:
+                if transaction_id in self._twopc_outcomes:
+                    known = self._twopc_outcomes[transaction_id]
+                    outcome = "uncertain" if known is None else "commit" if known else "abort"
+                elif transaction_id in self._twopc_transactions:
+                    outcome = "uncertain"
+                else:
+                    self._remember_outcome_locked(transaction_id, False)
+                    outcome = "abort"
+        return {"transaction_id": transaction_id, "outcome": outcome}
+
+    # ------------------------------------------------------------------
+    # 2PC recovery and termination
+    # ------------------------------------------------------------------
+    def _recover_twopc(self, records: List[Dict[str, Any]]) -> None:
+        self._coordinator.recover(record for record in records if record["kind"] == "decision")
+        for record in records:
+            if record["kind"] == "prepared":
+                # prepared_at 0.0: resolve on the first tick after a restart.
+                self._twopc_transactions[record["txn"]] = TransactionRecord(
+                    transaction_id=record["txn"],
+                    payload=record["payload"],
+                    coordinator_id=record["coordinator"],
+                    participants=record["participants"],
+                )
+
+    def _on_twopc_tick(self) -> None:
+        # Runs on the shared scheduler thread; the RPCs happen elsewhere.
+        if not self._running.is_set():
+            return
+        try:
+            self._fanout.submit(self._resolve_twopc)
+        except RuntimeError:
+            return  # node stopped
+        self._scheduler.call_later(self.config.twopc_retry_interval, self._on_twopc_tick)
+
+    def _resolve_twopc(self) -> None:
+        """Re-send unacknowledged decisions and settle in-doubt transactions."""
+        self._coordinator.redrive()
+        cutoff = time.monotonic() - self.config.twopc_in_doubt_timeout
+        with self._twopc_lock:
+            in_doubt = [record for record in self._twopc_transactions.values() if record.prepared_at <= cutoff]
+        for record in in_doubt:
+            commit = self._query_decision(record)
+            if commit is not None:
+                self._apply_decision(record.transaction_id, commit)
+        if in_doubt:
+            self._sync_twopc_log()
+
+    def _query_decision(self, record: TransactionRecord) -> Optional[bool]:
+        """Ask the coordinator, then every other participant, for the outcome."""
+        askers = [record.coordinator_id] + [
+            participant_id for participant_id in record.participants if participant_id != record.coordinator_id
+        ]
+        for node_id in askers:
+            if node_id == self.config.node_id:
+                if node_id != record.coordinator_id:
+                    continue
+                outcome = self._coordinator.outcome(record.transaction_id)
+                # No record here means the coordinator presumed abort.
+                return None if outcome == "pending" else outcome == "commit"
+            target = record.participants.get(node_id) or self.config.peers.get(node_id)
+            if target is None:
+                continue
+            self._print_phase_client("Decision", self.config.node_id, "QueryDecision", node_id, target)
+            try:
+                response = self._build_client(target).call(
+                    TWOPC_DECISION_SERVICE,
+                    "QueryDecision",
+                    {
+                        "transaction_id": record.transaction_id,
+                        "coordinator_id": record.coordinator_id,
+                        "requester_id": self.config.node_id,
+                    },
+                )
+            except Exception:
+                continue
+            outcome = response.get("outcome")
+            if outcome in ("commit", "abort"):
+                return outcome == "commit"
+            if outcome == "pending" and node_id == record.coordinator_id:
+                return None  # the coordinator is alive and will decide
+        return None
+
     def _print_phase_client(
         self, phase: str, source_id: str, rpc_name: str, target_id: str, target_address: str
     ) -> None:
@@ -207,55 +570,190 @@ class ConsensusNode:
         candidate_id = payload["candidate_id"]
         term = int(payload["term"])
         self._print_node_server("RequestVote", candidate_id)
+        was_leader = False
         with self._state_lock:
             if term < self._current_term:
                 return {"vote_granted": False, "term": self._current_term}
+            if self._lease_may_be_held_locked():
+                # The current leader may be serving lease reads; electing
+                # someone else before the lease runs out would make them stale.
+                return {"vote_granted": False, "term": self._current_term}
+            changed = False
             if term > self._current_term:
+                was_leader = self._role == "leader"
                 self._current_term = term
                 self._voted_for = None
                 self._role = "follower"
-            if self._voted_for in (None, candidate_id):
+                changed = True
+            granted = self._voted_for in (None, candidate_id) and self._log_up_to_date_locked(
+                int(payload.get("last_log_index", -1)), int(payload.get("last_log_term", 0))
+            )
+            if granted:
+                changed = changed or self._voted_for != candidate_id
                 self._voted_for = candidate_id
                 self._last_heartbeat = time.time()
-                return {"vote_granted": True, "term": self._current_term}
-            return {"vote_granted": False, "term": self._current_term}
+            if changed:
+                self._persist_state_locked()
+            current_term = self._current_term
+        if was_leader:
+            self._fail_commit_waiters("leadership_lost")
+        return {"vote_granted": granted, "term": current_term}
+
+    def _handle_pre_vote(self, payload: Dict[str, str]) -> Dict[str, Any]:
+        """Say whether we would vote for the candidate, without changing state.
+
+        The vote is refused while we still hear from a leader, so a node that
+        was partitioned away cannot disrupt a healthy cluster when it rejoins.
+        """
+        candidate_id = payload["candidate_id"]
+        term = int(payload["term"])
+        self._print_node_server("PreVote", candidate_id)
+        with self._state_lock:
+            granted = (
+                term >= self._current_term
+                and self._role != "leader"
+                and time.time() - self._leader_contact >= self.config.election_timeout_range[0]
+                and self._log_up_to_date_locked(
+                    int(payload.get("last_log_index", -1)), int(payload.get("last_log_term", 0))
+                )
+            )
+            return {"vote_granted": granted, "term": self._current_term}
+
+    def _log_up_to_date_locked(self, last_log_index: int, last_log_term: int) -> bool:
+        """Whether a candidate's log is at least as up to date as ours.
+
+        Caller must hold ``_state_lock``.
+        """
+        our_last_index = self._last_log_index()
+        return (last_log_term, last_log_index) >= (self._term_at(our_last_index), our_last_index)
 
     def _handle_append_entries(self, payload: Dict[str, str]) -> Dict[str, str]:
         leader_id = payload["leader_id"]
         term = int(payload["term"])
         entries = payload.get("entries", [])
+        prev_log_index = int(payload.get("prev_log_index", -1))
+        prev_log_term = int(payload.get("prev_log_term", 0))
         commit_index = int(payload.get("commit_index", -1))
         self._print_node_server("AppendEntries", leader_id)
+        with self._state_lock:
+            was_leader = self._role == "leader" and term >= self._current_term
+            response, seq = self._append_entries_locked(
+                leader_id, term, entries, prev_log_index, prev_log_term, commit_index
+            )
+        if was_leader:
+            self._fail_commit_waiters("leadership_lost")
+        if seq and self._storage is not None:
+            # Entries must be durable before the leader may count this ack.
+            self._storage.sync(seq)
+        self._signal_apply()
+        return response
+
+    def _append_entries_locked(
+        self,
+        leader_id: str,
+        term: int,
+        entries: List[Dict[str, Any]],
+        prev_log_index: int,
+        prev_log_term: int,
+        commit_index: int,
+    ) -> Tuple[Dict[str, Any], int]:
+        """Apply an AppendEntries request; return the response and a WAL sync sequence."""
+        if term < self._current_term:
+            return {"success": False, "term": self._current_term}, 0
+        if term > self._current_term:
+            self._current_term = term
+            self._voted_for = None
+            self._persist_state_locked()
+        self._leader_id = leader_id
+        self._role = "follower"
+        self._last_heartbeat = self._leader_contact = time.time()
+        if prev_log_index > self._last_log_index():
+            # Missing entries: ask the leader to resume right after our log.
+            return {
+                "success": False,
+                "term": self._current_term,
+                "conflict_index": self._last_log_index() + 1,
+                "conflict_term": -1,
+            }, 0
+        if prev_log_index > self._snapshot_index and self._term_at(prev_log_index) != prev_log_term:
+            # Report the whole conflicting term so the leader can skip it.
+            conflict_term = self._term_at(prev_log_index)
+            conflict_index = prev_log_index
+            while conflict_index > self._log.first_index and self._term_at(conflict_index - 1) == conflict_term:
+                conflict_index -= 1
+            return {
+                "success": False,
+                "term": self._current_term,
+                "conflict_index": conflict_index,
+                "conflict_term": conflict_term,
+            }, 0
+        index = prev_log_index
+        new_entries: List[LogEntry] = []
+        seq = 0
+        for entry in entries:
+            index = int(entry["index"])
+            entry_term = int(entry["term"])
+            if index <= self._snapshot_index:
+                continue  # already covered by our snapshot
+            if not new_entries and index <= self._last_log_index():
+                if self._term_at(index) == entry_term:
+                    continue
+                self._log.truncate_from(index)
+                if self._storage is not None:
+                    seq = self._storage.truncate_from(index)
+            command = entry["command"]
+            new_entries.append(LogEntry(index=index, term=entry_term, command=command, op=parse_command(command)))
+        if new_entries:
+            seq = self._append_log_locked(new_entries) or seq
+        if commit_index > self._commit_index:
+            self._commit_index = min(commit_index, index)
+        return {"success": True, "term": term, "match_index": index}, seq
+
+    def _handle_install_snapshot(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        leader_id = payload["leader_id"]
+        term = int(payload["term"])
+        last_index = int(payload["last_included_index"])
+        last_term = int(payload["last_included_term"])
+        offset = int(payload.get("offset", 0))
+        self._print_node_server("InstallSnapshot", leader_id)
         with self._state_lock:
             if term < self._current_term:
                 return {"success": False, "term": self._current_term}
+            was_leader = self._role == "leader"
+            if term > self._current_term:
+                self._current_term = term
+                self._voted_for = None
+                self._persist_state_locked()
             self._leader_id = leader_id
             self._role = "follower"
-            self._current_term = term
-            self._last_heartbeat = time.time()
-            new_log: List[LogEntry] = []
-            for entry in entries:
-                new_log.append(
-                    LogEntry(index=int(entry["index"]), term=int(entry["term"]), command=entry["command"])
-                )
-            if new_log:
-                self._log = new_log
-            self._commit_index = commit_index
-        self._apply_entries()
-        return {"success": True, "term": self._current_term}
+            self._last_heartbeat = self._leader_contact = time.time()
+            incoming = self._incoming_snapshot
+            if offset == 0:
+                incoming = self._incoming_snapshot = (last_index, last_term, bytearray())
+            if incoming is None or incoming[:2] != (last_index, last_term) or len(incoming[2]) != offset:
+                # Out-of-order chunk; the leader restarts the transfer.
+                self._incoming_snapshot = None
+                return {"success": False, "term": term}
+            incoming[2].extend(base64.b64decode(payload.get("data", "")))
+            if not payload.get("done", False):
+                return {"success": True, "term": term}
+            self._incoming_snapshot = None
+        if was_leader:
+            self._fail_commit_waiters("leadership_lost")
+        self._install_snapshot(last_index, last_term, bytes(incoming[2]))
+        return {"success": True, "term": term}
 
     def _handle_client_command(self, payload: Dict[str, str]) -> Dict[str, str]:
         source_id = payload.get("source_id", "client")
         command = payload["command"]
         self._print_node_server("ClientCommand", source_id)
+        if self.config.read_mode != "log" and parse_command(command).read_only:
+            return self._serve_read(command)
         with self._state_lock:
             if self._role != "leader":
                 leader_id = self._leader_id
             else:
                 leader_id = self.config.node_id
-            if self._role == "leader":
-                entry = LogEntry(index=len(self._log), term=self._current_term, command=command)
-                self._log.append(entry)
         if leader_id != self.config.node_id:
             if not leader_id:
                 return {"success": False, "leader_id": "", "message": "no_leader"}
@@ -266,7 +764,7 @@ class ConsensusNode:
             client = self._build_client(target_address)
             try:
                 response = client.call(
-                    RAFT_SERVICE,
+                    self._raft_service,
                     "ClientCommand",
                     {
                         "source_id": self.config.node_id,
@@ -282,11 +780,24 @@ class ConsensusNode:
                     "message": f"forward_failed:{exc}",
                 }
             return response
-        committed = self._replicate_log()
-        if committed:
-            result = self._apply_entries()
-            return {"success": True, "leader_id": self.config.node_id, "result": result, "message": "committed"}
-        return {"success": False, "leader_id": self.config.node_id, "message": "failed_to_commit"}
+        future = self._propose(command)
+        try:
+            result = future.result(timeout=self.config.command_timeout)
+        except Exception as exc:
+            # Committed but rejected by the state machine, or not committed at all.
+            message = str(exc) if str(exc).startswith("apply_failed") else "failed_to_commit"
+            return {"success": False, "leader_id": self.config.node_id, "message": message}
+        return {"success": True, "leader_id": self.config.node_id, "result": result, "message": "committed"}
+
+    def _handle_read_index(self, payload: Dict[str, str]) -> Dict[str, Any]:
+        requester_id = payload.get("requester_id", "client")
+        self._print_node_server("ReadIndex", requester_id)
+        read_index = self._read_index()
+        with self._state_lock:
+            leader_id = self._leader_id or ""
+        if read_index is None:
+            return {"success": False, "leader_id": leader_id, "read_index": -1}
+        return {"success": True, "leader_id": leader_id, "read_index": read_index}
 
     def _handle_get_status(self, payload: Dict[str, str]) -> Dict[str, str]:
         requester_id = payload.get("requester_id", "client")
@@ -298,6 +809,7 @@ class ConsensusNode:
                 "term": self._current_term,
                 "commit_index": self._commit_index,
                 "applied_commands": list(self._applied_commands),
+                "applied_count": self._applied_count,
                 "leader_id": self._leader_id or "",
             }
 
@@ -319,167 +831,741 @@ class ConsensusNode:
     # ------------------------------------------------------------------
     # Raft background tasks
     # ------------------------------------------------------------------
-    def _run_election_timer(self) -> None:
-        while not self._running.is_set():
-            time.sleep(0.1)
+    def _arm_election_timer(self) -> None:
+        """Schedule the next election check at the current deadline."""
+        with self._state_lock:
+            delay = max(self._last_heartbeat, self._last_pre_vote) + self._election_timeout - time.time()
+        self._scheduler.call_later(delay, self._on_election_deadline)
+
+    def _on_election_deadline(self) -> None:
+        # Runs on the shared scheduler thread, so the campaign itself (which
+        # waits on the network) is handed to this node's timer executor.
+        if not self._running.is_set():
+            return
+        with self._state_lock:
+            if self._role == "leader":
+                self._last_heartbeat = time.time()
+            expired = time.time() - max(self._last_heartbeat, self._last_pre_vote) >= self._election_timeout
+        if not expired:
+            # Heartbeats arrived since the timer was armed; check again later.
+            self._arm_election_timer()
+            return
+        try:
+            self._timer_executor.submit(self._campaign)
+        except RuntimeError:
+            pass  # node stopped
+
+    def _campaign(self) -> None:
+        try:
+            self._run_election()
+        finally:
+            self._election_timeout = random.uniform(*self.config.election_timeout_range)
+            if self._running.is_set():
+                self._arm_election_timer()
+
+    def _run_election(self) -> None:
+        if self.config.pre_vote and not self._run_pre_vote():
+            self._last_pre_vote = time.time()
+            return
+        with self._state_lock:
+            if time.time() - self._last_heartbeat < self._election_timeout:
+                return
+            self._role = "candidate"
+            self._current_term += 1
+            self._voted_for = self.config.node_id
+            self._persist_state_locked()
+            self._last_heartbeat = time.time()
+            term = self._current_term
+            last_log_index = self._last_log_index()
+            last_log_term = self._term_at(last_log_index)
+        request = {
+            "candidate_id": self.config.node_id,
+            "term": term,
+            "last_log_index": last_log_index,
+            "last_log_term": last_log_term,
+        }
+        ballot = self._fanout.broadcast(
+            {
+                peer_id: functools.partial(self._send_raft, "RequestVote", peer_id, target, request)
+                for peer_id, target in self._peer_targets()
+            },
+            needed=self._majority() - 1,
+            accept=lambda response: bool(response.get("vote_granted")),
+            reject=lambda response: int(response.get("term", 0)) > term,
+        )
+        for response in ballot.results.values():
+            self._observe_term(int(response.get("term", 0)))
+        votes = 1 + ballot.accepted
+        with self._state_lock:
+            if self._role != "candidate" or self._current_term != term:
+                return
+            if votes < self._majority():
+                self._role = "follower"
+                return
+            self._role = "leader"
+            self._leader_id = self.config.node_id
+            self._last_heartbeat = time.time()
+            self._next_index = {}
+            self._match_index = {}
+            self._lease_acks = {}
+            now = time.monotonic()
+            self._peer_contact = {peer_id: now for peer_id, _ in self._peer_targets()}
+            self._durable_index = self._last_log_index()
+        self._trigger_heartbeat()
+        if not self._hosted:
+            self._scheduler.call_later(
+                self.config.heartbeat_interval, functools.partial(self._on_heartbeat_deadline, term)
+            )
+
+    def _run_pre_vote(self) -> bool:
+        """Ask the peers whether they would elect us in the next term."""
+        with self._state_lock:
+            if self._role == "leader":
+                return False
+            term = self._current_term
+            last_log_index = self._last_log_index()
+            last_log_term = self._term_at(last_log_index)
+        request = {
+            "candidate_id": self.config.node_id,
+            "term": term + 1,
+            "last_log_index": last_log_index,
+            "last_log_term": last_log_term,
+        }
+        ballot = self._fanout.broadcast(
+            {
+                peer_id: functools.partial(self._send_raft, "PreVote", peer_id, target, request)
+                for peer_id, target in self._peer_targets()
+            },
+            needed=self._majority() - 1,
+            accept=lambda response: bool(response.get("vote_granted")),
+        )
+        for response in ballot.results.values():
+            self._observe_term(int(response.get("term", 0)))
+        return 1 + ballot.accepted >= self._majority()
+
+    def _quorum_active_locked(self) -> bool:
+        """Whether a majority answered within the maximum election timeout.
+
+        Caller must hold ``_state_lock``.
+        """
+        cutoff = time.monotonic() - self.config.election_timeout_range[1]
+        active = 1 + sum(
+            1 for peer_id, _ in self._peer_targets() if self._peer_contact.get(peer_id, cutoff) > cutoff
+        )
+        return active >= self._majority()
+
+    def _on_heartbeat_deadline(self, term: int) -> None:
+        """Periodic heartbeat for ``term``; the chain ends when we stop leading."""
+        if not self._running.is_set():
+            return
+        with self._state_lock:
+            if self._role != "leader" or self._current_term != term:
+                return
+        # Anything broadcast since the last tick already served as a heartbeat.
+        due = self._last_broadcast + self.config.heartbeat_interval - time.monotonic()
+        if due <= 0:
+            self._trigger_heartbeat()
+            due = self.config.heartbeat_interval
+        self._scheduler.call_later(due, functools.partial(self._on_heartbeat_deadline, term))
+
+    def _trigger_heartbeat(self) -> None:
+        """Send AppendEntries to every follower now, coalescing repeated calls."""
+        with self._heartbeats_lock:
+            if self._heartbeat_pending:
+                return
+            self._heartbeat_pending = True
+        try:
+            self._timer_executor.submit(self._send_heartbeat)
+        except RuntimeError:
+            pass  # node stopped
+
+    def _send_heartbeat(self) -> None:
+        with self._heartbeats_lock:
+            self._heartbeat_pending = False
+        self._last_broadcast = time.monotonic()
+        if not self._check_quorum():
+            return
+        self._broadcast_append_entries(skip_in_flight=True)
+        self._signal_apply()
+
+    def _check_quorum(self) -> bool:
+        """Return whether we still lead, stepping down if the majority went quiet."""
+        with self._state_lock:
+            if self._role != "leader":
+                return False
+            if not self.config.check_quorum or self._quorum_active_locked():
+                return True
+            self._role = "follower"
+            self._leader_id = None
+        # A leader cut off from the majority stops accepting writes that
+        # could never commit.
+        self._fail_commit_waiters("lost_quorum")
+        return False
+
+    # ------------------------------------------------------------------
+    # Leader command batching
+    # ------------------------------------------------------------------
+    def _propose(self, command: str) -> "Future[str]":
+        """Queue ``command`` for the batcher; the future resolves once applied."""
+        future: "Future[str]" = Future()
+        with self._proposal_cond:
+            self._proposals.append((command, future))
+            self._proposal_cond.notify()
+        return future
+
+    def _run_batcher(self) -> None:
         while self._running.is_set():
-            timeout = random.uniform(*self.config.election_timeout_range)
-            triggered = False
-            while self._running.is_set():
-                time.sleep(0.05)
-                with self._state_lock:
-                    elapsed = time.time() - self._last_heartbeat
-                if elapsed >= timeout:
-                    triggered = True
-                    break
-            if not triggered:
+            with self._proposal_cond:
+                while not self._proposals and self._running.is_set():
+                    self._proposal_cond.wait(0.1)
+                if not self._running.is_set():
+                    return
+                # Give concurrent clients a short window to join this batch.
+                deadline = time.monotonic() + self.config.batch_window
+                while len(self._proposals) < self.config.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._proposal_cond.wait(remaining)
+                batch = self._proposals[: self.config.max_batch_size]
+                del self._proposals[: self.config.max_batch_size]
+            # Blocks while ``max_inflight_batches`` rounds are still replicating.
+            # Rounds cancelled by stop() never release their slot, so keep
+            # checking whether the node is still running.
+            while not self._inflight_batches.acquire(timeout=0.1):
+                if not self._running.is_set():
+                    for _, future in batch:
+                        future.set_exception(RPCError("node_stopped"))
+                    return
+            with self._state_lock:
+                is_leader = self._role == "leader"
+                if is_leader:
+                    term = self._current_term
+                    new_entries: List[LogEntry] = []
+                    for command, future in batch:
+                        index = self._last_log_index() + 1 + len(new_entries)
+                        new_entries.append(
+                            LogEntry(index=index, term=term, command=command, op=parse_command(command))
+                        )
+                        self._commit_waiters[index] = (term, future)
+                    seq = self._append_log_locked(new_entries)
+            if not is_leader:
+                self._inflight_batches.release()
+                for _, future in batch:
+                    future.set_exception(RPCError("not_leader"))
                 continue
+            if seq and self._storage is not None:
+                self._storage.sync(seq)
             with self._state_lock:
-                if time.time() - self._last_heartbeat < timeout:
-                    continue
-                self._role = "candidate"
-                self._current_term += 1
-                self._voted_for = self.config.node_id
-                self._last_heartbeat = time.time()
-                term = self._current_term
-            votes = 1
-            for peer_id, target in self.config.peers.items():
-                if peer_id == self.config.node_id:
-                    continue
-                self._print_node_client("RequestVote", peer_id, target)
-                client = self._build_client(target)
-                try:
-                    response = client.call(
-                        RAFT_SERVICE,
-                        "RequestVote",
-                        {
-                            "candidate_id": self.config.node_id,
-                            "term": term,
-                            "last_log_index": len(self._log) - 1,
-                            "last_log_term": self._log[-1].term if self._log else 0,
-                        },
-                    )
-                except Exception:
-                    continue
-                if response.get("vote_granted"):
-                    votes += 1
-            if votes >= self._majority():
-                with self._state_lock:
-                    self._role = "leader"
-                    self._leader_id = self.config.node_id
-                    self._last_heartbeat = time.time()
+                self._durable_index = max(self._durable_index, new_entries[-1].index)
+                # The leader's own copy counts; without peers it is the majority.
+                self._advance_commit_index()
+            try:
+                self._round_executor.submit(self._run_replication_round)
+            except RuntimeError:
+                self._inflight_batches.release()
+                return
+
+    def _run_replication_round(self) -> None:
+        try:
+            self._broadcast_append_entries()
+        finally:
+            self._inflight_batches.release()
+        self._signal_apply()
+        # Let followers learn the new commit index without waiting a full
+        # heartbeat interval.
+        self._trigger_heartbeat()
+
+    def _fail_commit_waiters(self, reason: str) -> None:
+        with self._state_lock:
+            waiters, self._commit_waiters = self._commit_waiters, {}
+        for _, future in waiters.values():
+            if not future.done():
+                future.set_exception(RPCError(reason))
+
+    def _broadcast_append_entries(self, skip_in_flight: bool = False) -> bool:
+        """Replicate to every follower in parallel; return once a majority acks.
+
+        Returns whether a majority acknowledged this round.
+
+        Heartbeats skip followers whose previous AppendEntries is still
+        outstanding so a dead peer does not accumulate queued calls.
+        """
+        calls = {}
+        for peer_id, target in self._peer_targets():
+            if skip_in_flight:
+                with self._heartbeats_lock:
+                    if peer_id in self._heartbeats_in_flight:
+                        continue
+                    self._heartbeats_in_flight.add(peer_id)
+                calls[peer_id] = functools.partial(self._heartbeat_peer, peer_id, target)
             else:
-                with self._state_lock:
-                    self._role = "follower"
+                calls[peer_id] = functools.partial(self._replicate_to_peer, peer_id, target)
+        return self._fanout.broadcast(calls, needed=self._majority() - 1).reached
+
+    def _heartbeat_peer(self, peer_id: str, target: str) -> bool:
+        try:
+            return self._replicate_to_peer(peer_id, target)
+        finally:
+            with self._heartbeats_lock:
+                self._heartbeats_in_flight.discard(peer_id)
 
-    def _run_heartbeat_loop(self) -> None:
-        while not self._running.is_set():
-            time.sleep(0.1)
+    def _replicate_to_peer(self, peer_id: str, target: str) -> bool:
+        """Ship the entries ``peer_id`` is missing, backtracking on conflicts.
+
+        Only the suffix after the follower's ``nextIndex`` is sent, so a
+        heartbeat to an up-to-date follower carries no entries at all.
+        """
         while self._running.is_set():
-            time.sleep(self.config.heartbeat_interval)
             with self._state_lock:
                 if self._role != "leader":
-                    continue
+                    return False
                 term = self._current_term
-                entries = [entry.__dict__ for entry in self._log]
-                commit_index = self._commit_index
-            for peer_id, target in self.config.peers.items():
-                if peer_id == self.config.node_id:
-                    continue
-                self._print_node_client("AppendEntries", peer_id, target)
-                client = self._build_client(target)
-                try:
-                    client.call(
-                        RAFT_SERVICE,
-                        "AppendEntries",
-                        {
-                            "leader_id": self.config.node_id,
-                            "term": term,
-                            "entries": entries,
-                            "commit_index": commit_index,
-                        },
-                    )
-                except Exception:
-                    continue
+                request = self._append_request_locked(peer_id)
+            if request is None:
+                # The entries this follower needs were compacted away.
+                if not self._send_snapshot(peer_id, target, term):
+                    return False
+                continue
+            sent_at = time.monotonic()
+            try:
+                response = self._send_raft("AppendEntries", peer_id, target, request)
+            except Exception:
+                return False
+            outcome = self._on_append_response(peer_id, request, sent_at, response)
+            if outcome is not None:
+                return outcome
+        return False
 
-    def _replicate_log(self) -> bool:
+    def _append_request_locked(self, peer_id: str) -> Optional[Dict[str, Any]]:
+        """Build the AppendEntries ``peer_id`` needs next.
+
+        Returns ``None`` when those entries were compacted and only a snapshot
+        will do. Caller must hold ``_state_lock`` as leader.
+        """
+        next_index = self._next_index.setdefault(peer_id, self._last_log_index() + 1)
+        if next_index <= self._snapshot_index:
+            return None
+        prev_log_index = next_index - 1
+        return {
+            "leader_id": self.config.node_id,
+            "term": self._current_term,
+            "prev_log_index": prev_log_index,
+            "prev_log_term": self._term_at(prev_log_index),
+            "entries": self._log.payloads(next_index),
+            "commit_index": self._commit_index,
+        }
+
+    def _on_append_response(
+        self, peer_id: str, request: Dict[str, Any], sent_at: float, response: Dict[str, Any]
+    ) -> Optional[bool]:
+        """Record a follower's AppendEntries reply.
+
+        Returns ``True`` once the follower matched, ``False`` when we no
+        longer lead, and ``None`` after backtracking so the caller retries.
+        """
+        term = request["term"]
+        prev_log_index = request["prev_log_index"]
+        if self._observe_term(int(response.get("term", 0))):
+            return False
         with self._state_lock:
-            term = self._current_term
-            entries = [entry.__dict__ for entry in self._log]
-        success_count = 1
-        for peer_id, target in self.config.peers.items():
-            if peer_id == self.config.node_id:
-                continue
-            self._print_node_client("AppendEntries", peer_id, target)
-            client = self._build_client(target)
+            if self._role != "leader" or self._current_term != term:
+                return False
+            self._peer_contact[peer_id] = time.monotonic()
+            if response.get("success"):
+                self._lease_acks[peer_id] = max(self._lease_acks.get(peer_id, sent_at), sent_at)
+                match_index = int(response.get("match_index", prev_log_index + len(request["entries"])))
+                if match_index > self._match_index.get(peer_id, -1):
+                    self._match_index[peer_id] = match_index
+                self._next_index[peer_id] = max(self._next_index[peer_id], match_index + 1)
+                self._advance_commit_index()
+                return True
+            self._next_index[peer_id] = self._backtrack(
+                prev_log_index,
+                int(response.get("conflict_index", prev_log_index)),
+                int(response.get("conflict_term", -1)),
+            )
+        return None
+
+    def _send_snapshot(self, peer_id: str, target: str, term: int) -> bool:
+        """Stream the current snapshot to ``peer_id`` in chunks."""
+        with self._state_lock:
+            last_index = self._snapshot_index
+            last_term = self._snapshot_term
+            data = self._snapshot_data
+        chunk_size = max(1, self.config.snapshot_chunk_bytes)
+        offset = 0
+        while True:
+            chunk = data[offset : offset + chunk_size]
+            done = offset + len(chunk) >= len(data)
             try:
-                response = client.call(
-                    RAFT_SERVICE,
-                    "AppendEntries",
+                response = self._send_raft(
+                    "InstallSnapshot",
+                    peer_id,
+                    target,
                     {
                         "leader_id": self.config.node_id,
                         "term": term,
-                        "entries": entries,
-                        "commit_index": len(entries) - 1,
+                        "last_included_index": last_index,
+                        "last_included_term": last_term,
+                        "offset": offset,
+                        "data": base64.b64encode(chunk).decode("ascii"),
+                        "done": done,
                     },
                 )
             except Exception:
-                continue
-            if response.get("success"):
-                success_count += 1
-        if success_count >= self._majority():
-            with self._state_lock:
-                self._commit_index = len(entries) - 1
-            return True
-        return False
+                return False
+            if self._observe_term(int(response.get("term", 0))) or not response.get("success"):
+                return False
+            if done:
+                break
+            offset += len(chunk)
+        with self._state_lock:
+            if self._role != "leader" or self._current_term != term:
+                return False
+            self._peer_contact[peer_id] = time.monotonic()
+            if last_index > self._match_index.get(peer_id, -1):
+                self._match_index[peer_id] = last_index
+            self._next_index[peer_id] = max(self._next_index.get(peer_id, 0), last_index + 1)
+            self._advance_commit_index()
+        return True
 
-    def _apply_entries(self) -> str:
-        applied_result = ""
-        while True:
-            with self._state_lock:
-                if self._commit_index <= self._last_applied:
+    def _backtrack(self, prev_log_index: int, conflict_index: int, conflict_term: int) -> int:
+        """Pick the next index to probe after a consistency-check failure.
+
+        If the leader has entries from the follower's conflicting term, resume
+        after the last of them; otherwise skip the follower's whole term.
+        Caller must hold ``_state_lock``.
+        """
+        if conflict_term >= 0:
+            for index in range(min(prev_log_index, self._last_log_index()), conflict_index - 1, -1):
+                term = self._term_at(index)
+                if term == conflict_term:
+                    return index + 1
+                if term < conflict_term:
                     break
-                self._last_applied += 1
-                entry = self._log[self._last_applied]
-            result = self._execute_command(entry.command)
-            applied_result = result or applied_result
-        return applied_result
-
-    def _execute_command(self, command: str) -> str:
-        parts = command.strip().split()
-        if not parts:
+        return max(min(conflict_index, prev_log_index), 0)
+
+    def _advance_commit_index(self) -> None:
+        """Commit the highest current-term index stored on a majority.
+
+        Caller must hold ``_state_lock``.
+        """
+        matches = [min(self._durable_index, self._last_log_index())]
+        for peer_id in self.config.peers:
+            if peer_id != self.config.node_id:
+                matches.append(self._match_index.get(peer_id, -1))
+        matches.sort(reverse=True)
+        candidate = matches[self._majority() - 1]
+        if candidate > self._commit_index and self._term_at(candidate) == self._current_term:
+            self._commit_index = candidate
+
+    def _observe_term(self, term: int) -> bool:
+        """Step down if a peer reports a newer term; return whether we did."""
+        with self._state_lock:
+            if term <= self._current_term:
+                return False
+            was_leader = self._role == "leader"
+            self._current_term = term
+            self._voted_for = None
+            self._persist_state_locked()
+            self._role = "follower"
+            self._last_heartbeat = time.time()
+        if was_leader:
+            self._fail_commit_waiters("leadership_lost")
+        return True
+
+    def _append_log_locked(self, entries: List[LogEntry]) -> int:
+        """Append to the in-memory log and buffer the WAL write.
+
+        Returns the sequence to pass to ``RaftStorage.sync`` (0 without
+        storage). Caller must hold ``_state_lock``.
+        """
+        self._log.extend(entries)
+        if self._storage is None:
+            return 0
+        return self._storage.append([(entry.index, entry.term, entry.command) for entry in entries])
+
+    def _persist_state_locked(self) -> None:
+        if self._storage is not None:
+            self._storage.save_state(self._current_term, self._voted_for)
+
+    def _send_raft(self, rpc_name: str, peer_id: str, target: str, message: Dict[str, Any]) -> Dict[str, Any]:
+        self._print_node_client(rpc_name, peer_id, target)
+        return self._build_client(target).call(self._raft_service, rpc_name, message)
+
+    def _peer_targets(self) -> List[Tuple[str, str]]:
+        return [
+            (peer_id, target)
+            for peer_id, target in list(self.config.peers.items())
+            if peer_id != self.config.node_id
+        ]
+
+    def _last_log_index(self) -> int:
+        return self._log.last_index
+
+    def _term_at(self, index: int) -> int:
+        if index == self._snapshot_index:
+            return self._snapshot_term
+        term = self._log.term_at(index)
+        return 0 if term is None else term
+
+    def _signal_apply(self) -> None:
+        """Wake the apply thread; the commit index may have moved."""
+        with self._apply_cond:
+            self._apply_requested = True
+            self._apply_cond.notify()
+
+    def _run_applier(self) -> None:
+        while self._running.is_set():
+            with self._apply_cond:
+                while not self._apply_requested and self._running.is_set():
+                    self._apply_cond.wait()
+                self._apply_requested = False
+            if self._running.is_set():
+                self._apply_entries()
+
+    def _apply_entries(self) -> None:
+        """Apply every committed entry, one ``_state_lock`` round trip per batch."""
+        # Serialized so entries are always executed in log order.
+        with self._apply_lock:
+            while True:
+                with self._state_lock:
+                    first = self._last_applied + 1
+                    last = self._commit_index
+                    if last < first:
+                        break
+                    batch = self._log.entries(first, last + 1)
+                    waiters = [self._commit_waiters.pop(entry.index, None) for entry in batch]
+                results = [self._execute_entry(entry) for entry in batch]
+                self._applied_bytes += sum(len(entry.command) for entry in batch)
+                with self._state_lock:
+                    self._last_applied = last
+                for entry, waiter, result in zip(batch, waiters, results):
+                    if waiter is None:
+                        continue
+                    term, future = waiter
+                    if term != entry.term:
+                        future.set_exception(RPCError("entry_overwritten"))
+                    elif isinstance(result, Exception):
+                        future.set_exception(RPCError(f"apply_failed:{result}"))
+                    else:
+                        future.set_result(result)
+            self._maybe_snapshot()
+        with self._applied_cond:
+            self._applied_cond.notify_all()
+
+    # ------------------------------------------------------------------
+    # Snapshots and log compaction
+    # ------------------------------------------------------------------
+    def _maybe_snapshot(self) -> None:
+        """Snapshot the state machine once enough has been applied.
+
+        Caller must hold ``_apply_lock``, which keeps ``_kv_store`` stable.
+        """
+        entries = self._last_applied - self._snapshot_index
+        if entries <= 0:
+            return
+        by_count = 0 < self.config.snapshot_entries <= entries
+        by_size = 0 < self.config.snapshot_bytes <= self._applied_bytes
+        if not (by_count or by_size):
+            return
+        with self._state_lock:
+            index = self._last_applied
+            term = self._term_at(index)
+        data = self._serialize_state_machine()
+        if self._storage is not None:
+            self._storage.save_snapshot(index, term, data)
+        with self._state_lock:
+            self._compact_log_locked(index, term, data)
+        if self._storage is not None:
+            self._storage.compact(index)
+
+    def _install_snapshot(self, last_index: int, last_term: int, data: bytes) -> None:
+        """Replace the state machine with a snapshot received from the leader."""
+        with self._apply_lock:
+            if last_index <= self._last_applied:
+                return  # we already applied at least this much
+            if self._storage is not None:
+                self._storage.save_snapshot(last_index, last_term, data)
+            self._restore_state_machine(data)
+            with self._state_lock:
+                keep_suffix = (
+                    last_index <= self._last_log_index() and self._term_at(last_index) == last_term
+                )
+                if not keep_suffix:
+                    self._log.reset(last_index + 1)
+                self._compact_log_locked(last_index, last_term, data)
+                if self._storage is not None:
+                    if keep_suffix:
+                        self._storage.compact(last_index)
+                    else:
+                        self._storage.reset(last_index + 1)
+                self._commit_index = max(self._commit_index, last_index)
+                self._last_applied = last_index
+        with self._applied_cond:
+            self._applied_cond.notify_all()
+
+    def _compact_log_locked(self, last_index: int, last_term: int, data: bytes) -> None:
+        """Drop log entries up to ``last_index``. Caller must hold ``_state_lock``."""
+        self._log.compact_through(last_index)
+        self._snapshot_index = last_index
+        self._snapshot_term = last_term
+        self._snapshot_data = data
+        self._applied_bytes = 0
+
+    def _serialize_state_machine(self) -> bytes:
+        state = {
+            "kv": self._kv_store,
+            "applied_commands": list(self._applied_commands),
+            "applied_count": self._applied_count,
+        }
+        return json.dumps(state).encode("utf-8")
+
+    def _restore_state_machine(self, data: bytes) -> None:
+        state = json.loads(data.decode("utf-8"))
+        self._kv_store = dict(state.get("kv", {}))
+        self._applied_commands = deque(state.get("applied_commands", []), maxlen=self.config.applied_history)
+        self._applied_count = int(state.get("applied_count", len(self._applied_commands)))
+
+    # ------------------------------------------------------------------
+    # Read-only commands
+    # ------------------------------------------------------------------
+    def _serve_read(self, command: str) -> Dict[str, str]:
+        """Answer a read without appending it to the log.
+
+        The leader computes the read index itself; a follower fetches it from
+        the leader and then serves the read from its own state machine.
+        """
+        with self._state_lock:
+            leader_id = self.config.node_id if self._role == "leader" else self._leader_id
+        if not leader_id:
+            return {"success": False, "leader_id": "", "message": "no_leader"}
+        if leader_id == self.config.node_id:
+            read_index = self._read_index()
+        else:
+            target_address = self.config.peers.get(leader_id, self.config.address)
+            try:
+                response = self._send_raft(
+                    "ReadIndex", leader_id, target_address, {"requester_id": self.config.node_id}
+                )
+            except Exception as exc:
+                return {"success": False, "leader_id": leader_id, "message": f"forward_failed:{exc}"}
+            read_index = int(response["read_index"]) if response.get("success") else None
+        if read_index is None or not self._wait_applied(read_index, self.config.command_timeout):
+            return {"success": False, "leader_id": leader_id, "message": "read_failed"}
+        with self._apply_lock:
+            result = self._kv_store.get(parse_command(command).key, "")
+        return {"success": True, "leader_id": leader_id, "result": result, "message": "read"}
+
+    def _read_index(self) -> Optional[int]:
+        """Return a commit index reads may be served at, or ``None`` if not leader."""
+        with self._state_lock:
+            if self._role != "leader":
+                return None
+            term = self._current_term
+            read_index = self._commit_index
+            committed_in_term = self._term_at(read_index) == term
+            leased = self.config.read_mode == "lease" and self._lease_valid_locked()
+        if not committed_in_term:
+            # A new leader only learns the true commit index once an entry
+            # from its own term commits, so commit an empty one first.
+            try:
+                self._propose("").result(timeout=self.config.command_timeout)
+            except Exception:
+                return None
+            return self._read_index()
+        if not leased and not self._broadcast_append_entries():
+            return None
+        with self._state_lock:
+            if self._role != "leader" or self._current_term != term:
+                return None
+        return read_index
+
+    def _lease_valid_locked(self) -> bool:
+        """Whether a majority acknowledged us recently enough to skip a round.
+
+        Caller must hold ``_state_lock``.
+        """
+        now = time.monotonic()
+        acks = sorted(
+            (self._lease_acks.get(peer_id, float("-inf")) for peer_id, _ in self._peer_targets()),
+            reverse=True,
+        )
+        quorum_at = ([now] + acks)[self._majority() - 1]
+        lease = self.config.election_timeout_range[0] * (1.0 - self.config.max_clock_drift)
+        return now < quorum_at + lease
+
+    def _lease_may_be_held_locked(self) -> bool:
+        """Whether a leader we heard from recently may still hold its lease.
+
+        Caller must hold ``_state_lock``.
+        """
+        if self.config.read_mode != "lease" or self._role != "follower" or self._leader_id is None:
+            return False
+        return time.time() - self._leader_contact < self.config.election_timeout_range[0]
+
+    def _wait_applied(self, index: int, timeout: float) -> bool:
+        self._signal_apply()
+        deadline = time.monotonic() + timeout
+        with self._applied_cond:
+            while self._last_applied < index:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._applied_cond.wait(remaining)
+        return True
+
+    def _execute_entry(self, entry: LogEntry) -> Union[str, Exception]:
+        """Apply one entry; a command that fails returns its exception instead.
+
+        Every replica fails the same command the same way, so skipping it
+        keeps the state machines identical and the applier running.
+        """
+        try:
+            return self._execute(entry.op or parse_command(entry.command), entry.command)
+        except Exception as exc:
+            return exc
+
+    def _execute(self, parsed: ParsedCommand, command: str) -> str:
+        if parsed.op == OP_NOOP:
             return ""
-        op = parts[0].lower()
-        if op == "set" and len(parts) == 3:
-            key, value = parts[1:]
-            self._kv_store[key] = value
-            self._applied_commands.append(command)
-            return value
-        if op == "increment" and len(parts) == 2:
-            key = parts[1]
-            current = int(self._kv_store.get(key, "0"))
-            current += 1
-            self._kv_store[key] = str(current)
-            self._applied_commands.append(command)
-            return str(current)
-        if op == "get" and len(parts) == 2:
-            key = parts[1]
-            value = self._kv_store.get(key, "")
-            self._applied_commands.append(command)
-            return value
+        if parsed.op == OP_GET:
+            # Reads only reach the log in "log" read mode; they change nothing
+            # and are not recorded as applied.
+            return self._kv_store.get(parsed.key, "")
+        if parsed.op == OP_SET:
+            result = self._kv_store[parsed.key] = parsed.value
+        elif parsed.op == OP_INCREMENT:
+            # Raises (and changes nothing) when the value is not a number.
+            result = self._kv_store[parsed.key] = str(int(self._kv_store.get(parsed.key, "0")) + 1)
+        else:
+            result = ""
         self._applied_commands.append(command)
-        return ""
+        self._applied_count += 1
+        return result
 
     def _build_client(self, target: str) -> RPCClient:
-        host, port = parse_target(target)
-        return RPCClient(host, port)
+        with self._clients_lock:
+            client = self._clients.get(target)
+            if client is None:
+                host, port = parse_target(target)
+                client = RPCClient(host, port, pool=self._pool)
+                self._clients[target] = client
+            return client
 
     def _majority(self) -> int:
         total = len(self.config.peers) + 1  # include self
         return total // 2 + 1
 
 
-def create_node(node_id: str, address: str, peers: Dict[str, str], vote_commit: bool = True) -> ConsensusNode:
+def create_node(
+    node_id: str,
+    address: str,
+    peers: Dict[str, str],
+    vote_commit: bool = True,
+    rpc_engine: str = "threads",
+) -> ConsensusNode:
     host, port = parse_target(address)
     config = NodeConfig(
         node_id=node_id,
@@ -487,5 +1573,6 @@ def create_node(node_id: str, address: str, peers: Dict[str, str], vote_commit:
         port=port,
         peers=peers,
         vote_commit=vote_commit,
+        rpc_engine=rpc_engine,
     )
     return ConsensusNode(config)
@@ -0,0 +1,177 @@
+"""Compact, column-oriented in-memory Raft log.
+
+A ``List[LogEntry]`` costs a Python object, a ``__dict__`` and a string per
+entry, all of which the garbage collector has to walk. ``RaftLog`` instead
+keeps entry terms in an ``array('q')`` column and command payloads UTF-8
+encoded back to back in one ``bytearray`` arena, with a second ``array('q')``
+holding where each payload ends. Entry indexes are contiguous, so they are
+implied by ``first_index`` rather than stored.
+
+Truncating at a conflict only drops the tail of each column. Compaction after a
+snapshot advances a start position instead of shifting the columns; the dead
+prefix is reclaimed in one pass once it outweighs the live entries, so dropping
+a prefix is amortised O(1) per entry. ``LogEntry`` objects are materialised on
+demand, e.g. for the batch an AppendEntries or apply round needs.
+"""
+from __future__ import annotations
+
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .commands import ParsedCommand, parse_command
+
+
+class LogEntry:
+    __slots__ = ("index", "term", "command", "op")
+
+    def __init__(self, index: int, term: int, command: str, op: Optional[ParsedCommand] = None) -> None:
+        self.index = index
+        self.term = term
+        self.command = command
+        self.op = op
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {"index": self.index, "term": self.term, "command": self.command}
+
+    def __repr__(self) -> str:
+        return f"LogEntry(index={self.index}, term={self.term}, command={self.command!r})"
+
+
+class RaftLog:
+    """Raft log entries ``first_index`` through ``last_index``, by absolute index."""
+
+    def __init__(self, first_index: int = 0) -> None:
+        self.first_index = first_index
+        # Live entries occupy column positions ``_start`` onwards.
+        self._start = 0
+        self._terms = array("q")
+        # ``_ends[i]`` is where entry i's payload ends in ``_arena``; it starts
+        # where entry i - 1's ends, or at ``_arena_start`` for the first entry.
+        self._ends = array("q")
+        self._arena = bytearray()
+        self._arena_start = 0
+
+    def __len__(self) -> int:
+        return len(self._terms) - self._start
+
+    @property
+    def last_index(self) -> int:
+        return self.first_index + len(self) - 1
+
+    def term_at(self, index: int) -> Optional[int]:
+        position = self._position(index)
+        return None if position is None else self._terms[position]
+
+    def __getitem__(self, index: int) -> LogEntry:
+        position = self._position(index)
+        if position is None:
+            raise IndexError(f"log index {index} out of range")
+        return self._materialise(position)
+
+    def __iter__(self) -> Iterator[LogEntry]:
+        for position in range(self._start, len(self._terms)):
+            yield self._materialise(position)
+
+    def entries(self, start: int, stop: Optional[int] = None) -> List[LogEntry]:
+        """Entries with indexes in ``[start, stop)``; ``stop`` defaults to the end."""
+        first = max(start, self.first_index) - self.first_index + self._start
+        last = len(self._terms) if stop is None else min(stop - self.first_index + self._start, len(self._terms))
+        return [self._materialise(position) for position in range(first, last)]
+
+    def payloads(self, start: int) -> List[Dict[str, Any]]:
+        """Wire form of every entry from ``start`` on, without building ``LogEntry``s."""
+        first = max(start, self.first_index) - self.first_index + self._start
+        terms, ends, arena = self._terms, self._ends, self._arena
+        offset = ends[first - 1] if first > self._start else self._arena_start
+        payloads = []
+        for position in range(first, len(terms)):
+            end = ends[position]
+            payloads.append(
+                {
+                    "index": self.first_index + position - self._start,
+                    "term": terms[position],
+                    "command": arena[offset:end].decode("utf-8"),
+                }
+            )
+            offset = end
+        return payloads
+
+    # ------------------------------------------------------------------
+    # Mutation
+    # ------------------------------------------------------------------
+    def append(self, term: int, command: str) -> int:
+        """Append one entry and return its index."""
+        self._arena += command.encode("utf-8")
+        self._terms.append(term)
+        self._ends.append(len(self._arena))
+        return self.last_index
+
+    def extend(self, entries: Iterable[LogEntry]) -> None:
+        for entry in entries:
+            if entry.index != self.last_index + 1:
+                raise ValueError(f"log entry {entry.index} does not follow {self.last_index}")
+            self.append(entry.term, entry.command)
+
+    def truncate_from(self, index: int) -> None:
+        """Drop entry ``index`` and everything after it."""
+        position = max(index - self.first_index, 0) + self._start
+        if position >= len(self._terms):
+            return
+        arena_end = self._ends[position - 1] if position > self._start else self._arena_start
+        del self._terms[position:]
+        del self._ends[position:]
+        del self._arena[arena_end:]
+
+    def compact_through(self, index: int) -> None:
+        """Drop every entry up to and including ``index``."""
+        if index < self.first_index:
+            return
+        if index >= self.last_index:
+            self.reset(index + 1)
+            return
+        drop = index + 1 - self.first_index
+        self._arena_start = self._ends[self._start + drop - 1]
+        self._start += drop
+        self.first_index = index + 1
+        if self._start > len(self) and self._start > 1024:
+            self._reclaim()
+
+    def reset(self, first_index: int) -> None:
+        """Empty the log; the next entry appended gets ``first_index``."""
+        self.first_index = first_index
+        self._start = 0
+        self._terms = array("q")
+        self._ends = array("q")
+        self._arena = bytearray()
+        self._arena_start = 0
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _position(self, index: int) -> Optional[int]:
+        position = index - self.first_index + self._start
+        if self._start <= position < len(self._terms):
+            return position
+        return None
+
+    def _materialise(self, position: int) -> LogEntry:
+        begin = self._ends[position - 1] if position > self._start else self._arena_start
+        command = self._arena[begin : self._ends[position]].decode("utf-8")
+        # parse_command is memoised, and the append path warmed it.
+        return LogEntry(
+            index=self.first_index + position - self._start,
+            term=self._terms[position],
+            command=command,
+            op=parse_command(command),
+        )
+
+    def _reclaim(self) -> None:
+        """Physically drop the compacted prefix of every column."""
+        shift = self._arena_start
+        del self._terms[: self._start]
+        del self._ends[: self._start]
+        del self._arena[:shift]
+        for position in range(len(self._ends)):
+            self._ends[position] -= shift
+        self._start = 0
+        self._arena_start = 0
@@ -2,20 +2,46 @@
 
 The implementation intentionally mirrors the client/server flow of gRPC but is
 implemented with the Python standard library to avoid external dependencies in
-this execution environment. Messages are encoded as JSON objects and delimited
-by newlines. The protocol is synchronous and request/response based.
+this execution environment. Clients keep one long-lived connection per target
+in a ``ConnectionPool`` and tag each request with an ``id`` so several calls can
+be in flight on the same socket; the server answers tagged requests as soon as
+their handler finishes, which may be out of order. At most ``max_inflight``
+tagged requests per connection run at once, on a small per-connection pool.
+Untagged requests are answered in order, exactly like the original
+synchronous protocol.
+
+The wire format is chosen per connection. A new client opens with a one-line
+hello listing the codecs it supports (see ``CODECS``) and the server replies
+with the one it picked; from then on every message is a length-prefixed binary
+frame. A server that predates the handshake answers the hello with an error
+line, in which case the client keeps talking newline-delimited JSON, and a
+legacy client that sends JSON straight away is served in that format too.
 """
 from __future__ import annotations
 
+import itertools
 import json
 import socket
+import struct
 import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from dataclasses import dataclass
-from typing import Any, Callable, Dict, Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Set, Tuple
+
+try:  # pragma: no cover - optional dependency
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
 
 
 Payload = Dict[str, Any]
 
+HELLO_PREFIX = b"\x00RPC "
+FRAME_HEADER = struct.Struct("!I")
+#: Largest frame either side will buffer; a peer announcing more is dropped.
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
 
 class RPCError(Exception):
     """Raised when the RPC layer encounters an unrecoverable error."""
@@ -26,47 +52,290 @@ class RPCRequest:
     service: str
     method: str
     payload: Payload
+    request_id: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        message: Dict[str, Any] = {
+            "service": self.service,
+            "method": self.method,
+            "payload": self.payload,
+        }
+        if self.request_id is not None:
+            message["id"] = self.request_id
+        return message
+
+    @classmethod
+    def from_dict(cls, message: Dict[str, Any]) -> "RPCRequest":
+        return cls(
+            service=message["service"],
+            method=message["method"],
+            payload=message["payload"],
+            request_id=message.get("id"),
+        )
 
     def to_bytes(self) -> bytes:
-        return json.dumps(
-            {"service": self.service, "method": self.method, "payload": self.payload}
-        ).encode("utf-8") + b"\n"
+        return JSON_CODEC.encode(self.to_dict())
 
 
 @dataclass
 class RPCResponse:
     payload: Payload
+    request_id: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        message: Dict[str, Any] = {"payload": self.payload}
+        if self.request_id is not None:
+            message["id"] = self.request_id
+        return message
 
     @classmethod
-    def from_bytes(cls, data: bytes) -> "RPCResponse":
-        try:
-            parsed = json.loads(data.decode("utf-8"))
-        except json.JSONDecodeError as exc:
-            raise RPCError("Invalid RPC response payload") from exc
-        if not isinstance(parsed, dict) or "payload" not in parsed:
+    def from_dict(cls, message: Any) -> "RPCResponse":
+        if not isinstance(message, dict) or "payload" not in message:
             raise RPCError("Malformed RPC response structure")
-        return cls(payload=parsed["payload"])
+        return cls(payload=message["payload"], request_id=message.get("id"))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "RPCResponse":
+        return cls.from_dict(JSON_CODEC.decode(memoryview(data)))
 
     def to_bytes(self) -> bytes:
-        return json.dumps({"payload": self.payload}).encode("utf-8") + b"\n"
+        return JSON_CODEC.encode(self.to_dict())
+
+
+# ----------------------------------------------------------------------
+# Codecs
+# ----------------------------------------------------------------------
+class Codec:
+    """Encodes messages to wire frames and decodes frame bodies back."""
+
+    name = ""
+    #: Whether frames carry a 4-byte length prefix instead of a newline.
+    length_prefixed = True
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, frame: memoryview) -> Any:
+        raise NotImplementedError
+
+
+class JSONLineCodec(Codec):
+    """The original newline-delimited JSON format, kept for interoperability."""
+
+    name = "json"
+    length_prefixed = False
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        return json.dumps(message).encode("utf-8") + b"\n"
+
+    def decode(self, frame: memoryview) -> Any:
+        try:
+            return json.loads(str(frame, "utf-8"))
+        except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+            raise RPCError("Invalid RPC payload") from exc
+
+
+class BinaryJSONCodec(JSONLineCodec):
+    """Length-prefixed frames with a compact JSON body."""
+
+    name = "lpjson"
+    length_prefixed = True
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        return FRAME_HEADER.pack(len(body)) + body
+
+
+class MsgpackCodec(Codec):
+    """Length-prefixed msgpack frames, decoded straight from the read buffer."""
+
+    name = "msgpack"
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        body = msgpack.packb(message, use_bin_type=True)
+        return FRAME_HEADER.pack(len(body)) + body
+
+    def decode(self, frame: memoryview) -> Any:
+        try:
+            return msgpack.unpackb(frame, raw=False)
+        except (ValueError, msgpack.ExtraData) as exc:
+            raise RPCError("Invalid RPC payload") from exc
+
+
+JSON_CODEC = JSONLineCodec()
+
+#: Codecs this process can speak, keyed by their wire name.
+CODECS: Dict[str, Codec] = {JSON_CODEC.name: JSON_CODEC}
+
+
+def register_codec(codec: Codec) -> None:
+    CODECS[codec.name] = codec
+
+
+register_codec(BinaryJSONCodec())
+if msgpack is not None:  # pragma: no cover - optional dependency
+    register_codec(MsgpackCodec())
+
+
+def default_codec_preference() -> Tuple[str, ...]:
+    """Binary codecs first, best first; JSON is always the implicit fallback."""
+    order = ("msgpack", "lpjson")
+    return tuple(name for name in order if name in CODECS)
+
+
+class FrameReader:
+    """Reads frames from a socket into one preallocated, reusable buffer.
+
+    Data is received with ``recv_into`` and frames are handed out as
+    ``memoryview`` slices of the buffer, so nothing is copied until a codec
+    decodes the body. A frame is only valid until the iterator is advanced.
+    """
+
+    def __init__(
+        self,
+        sock: socket.socket,
+        codec: Codec = JSON_CODEC,
+        size: int = 65536,
+        max_frame: int = MAX_FRAME_SIZE,
+    ) -> None:
+        self._sock = sock
+        self._max_frame = max_frame
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+        self._scan = 0
+        self.codec = codec
+
+    def frames(self) -> Iterator[memoryview]:
+        """Yield frames until the peer closes the connection.
+
+        Raises ``RPCError`` when a frame exceeds the size limit.
+        """
+        while True:
+            frame = self._next_buffered_frame()
+            if frame is not None:
+                yield frame
+                continue
+            if not self._fill():
+                return
+
+    def _next_buffered_frame(self) -> Optional[memoryview]:
+        if self.codec.length_prefixed:
+            available = self._end - self._start
+            if available < FRAME_HEADER.size:
+                return None
+            (length,) = FRAME_HEADER.unpack_from(self._buffer, self._start)
+            if length > self._max_frame:
+                raise RPCError(f"Frame of {length} bytes exceeds the {self._max_frame} byte limit")
+            needed = FRAME_HEADER.size + length
+            if available < needed:
+                self._reserve(needed)
+                return None
+            begin = self._start + FRAME_HEADER.size
+            self._start += needed
+            self._scan = self._start
+            return self._view[begin : begin + length]
+        while True:
+            newline = self._buffer.find(b"\n", self._scan, self._end)
+            if newline < 0:
+                if self._end - self._start > self._max_frame:
+                    raise RPCError(f"Line exceeds the {self._max_frame} byte limit")
+                self._scan = self._end
+                return None
+            begin = self._start
+            self._start = self._scan = newline + 1
+            if newline > begin:
+                return self._view[begin:newline]
+
+    def _reserve(self, needed: int) -> None:
+        if needed > len(self._buffer):
+            grown = bytearray(max(needed, len(self._buffer) * 2))
+            grown[: self._end - self._start] = self._view[self._start : self._end]
+            self._rebase(grown)
+
+    def _fill(self) -> bool:
+        if self._end == len(self._buffer):
+            pending = self._end - self._start
+            if self._start == 0:
+                grown = bytearray(len(self._buffer) * 2)
+                grown[:pending] = self._view[: self._end]
+                self._rebase(grown)
+            else:
+                # Only the partial frame at the tail is moved to the front.
+                self._buffer[:pending] = self._buffer[self._start : self._end]
+                self._scan -= self._start
+                self._start, self._end = 0, pending
+        try:
+            received = self._sock.recv_into(self._view[self._end :])
+        except OSError:
+            return False
+        if not received:
+            return False
+        self._end += received
+        return True
+
+    def _rebase(self, buffer: bytearray) -> None:
+        pending = self._end - self._start
+        self._scan -= self._start
+        self._buffer = buffer
+        self._view = memoryview(buffer)
+        self._start, self._end = 0, pending
+
+
+def negotiate_codec(offered: Sequence[str], supported: Sequence[str]) -> Codec:
+    """Pick the client's most preferred codec that the server also allows."""
+    for name in offered:
+        if name in supported and name in CODECS:
+            return CODECS[name]
+    return JSON_CODEC
+
+
+def hello_frame(codec_names: Sequence[str]) -> bytes:
+    return HELLO_PREFIX + ",".join(codec_names).encode("ascii") + b"\n"
 
 
+def parse_hello(frame: memoryview) -> Optional[Tuple[str, ...]]:
+    if frame[: len(HELLO_PREFIX)] != HELLO_PREFIX:
+        return None
+    names = bytes(frame[len(HELLO_PREFIX) :]).decode("ascii", "replace")
+    return tuple(name for name in names.split(",") if name)
+
+
+# ----------------------------------------------------------------------
+# Server
+# ----------------------------------------------------------------------
 class RPCServer:
     """Simple TCP based RPC server."""
 
-    def __init__(self, host: str, port: int) -> None:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        codecs: Optional[Sequence[str]] = None,
+        max_inflight: int = 64,
+    ) -> None:
         self._host = host
         self._port = port
+        # Pipelined requests each connection may have running at once; further
+        # requests wait in the socket, which pushes back on the client.
+        self._max_inflight = max_inflight
+        self._codecs = tuple(codecs) if codecs is not None else default_codec_preference()
         self._handlers: Dict[Tuple[str, str], Callable[[Payload], Payload]] = {}
         self._server_socket: Optional[socket.socket] = None
         self._serve_thread: Optional[threading.Thread] = None
         self._stop_event = threading.Event()
+        self._clients: Set[socket.socket] = set()
+        self._clients_lock = threading.Lock()
 
     @property
     def address(self) -> Tuple[str, int]:
         return self._host, self._port
 
-    def register(self, service: str, method: str, handler: Callable[[Payload], Payload]) -> None:
+    def register(
+        self, service: str, method: str, handler: Callable[[Payload], Payload], blocking: bool = False
+    ) -> None:
+        """Add a handler; ``blocking`` matters to ``AsyncRPCServer`` only."""
         self._handlers[(service, method)] = handler
 
     def start(self) -> None:
@@ -88,48 +357,93 @@ class RPCServer:
                 client, _ = self._server_socket.accept()
             except socket.timeout:
                 continue
+            except OSError:
+                return
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._clients_lock:
+                self._clients.add(client)
             threading.Thread(target=self._handle_client, args=(client,), daemon=True).start()
 
     def _handle_client(self, client: socket.socket) -> None:
-        with client:
-            buffer = b""
-            while not self._stop_event.is_set():
-                try:
-                    chunk = client.recv(4096)
-                except OSError:
-                    return
-                if not chunk:
-                    return
-                buffer += chunk
-                while b"\n" in buffer:
-                    raw, buffer = buffer.split(b"\n", 1)
-                    if not raw:
-                        continue
+        send_lock = threading.Lock()
+        reader = FrameReader(client)
+        codec: Codec = JSON_CODEC
+        first = True
+        workers: Optional[ThreadPoolExecutor] = None
+        slots = threading.BoundedSemaphore(self._max_inflight)
+        try:
+            with client:
+                for frame in reader.frames():
+                    if self._stop_event.is_set():
+                        return
+                    if first:
+                        first = False
+                        offered = parse_hello(frame)
+                        if offered is not None:
+                            codec = negotiate_codec(offered, self._codecs)
+                            if not self._send(client, send_lock, hello_frame((codec.name,))):
+                                return
+                            reader.codec = codec
+                            continue
                     try:
-                        request_dict = json.loads(raw.decode("utf-8"))
-                        service = request_dict["service"]
-                        method = request_dict["method"]
-                        payload = request_dict["payload"]
-                    except (json.JSONDecodeError, KeyError) as exc:
-                        response = RPCResponse(payload={"error": str(exc)}).to_bytes()
-                        client.sendall(response)
+                        request = RPCRequest.from_dict(codec.decode(frame))
+                    except (RPCError, KeyError, TypeError) as exc:
+                        response = RPCResponse(payload={"error": str(exc)})
+                        if not self._send(client, send_lock, codec.encode(response.to_dict())):
+                            return
                         continue
-                    handler = self._handlers.get((service, method))
-                    if handler is None:
-                        response = RPCResponse(payload={"error": "method_not_found"}).to_bytes()
-                        client.sendall(response)
+                    if request.request_id is None:
+                        # Legacy clients expect responses in request order.
+                        response = self._dispatch(request)
+                        if not self._send(client, send_lock, codec.encode(response.to_dict())):
+                            return
                         continue
-                    try:
-                        result = handler(payload)
-                    except Exception as exc:  # pragma: no cover - defensive
-                        response = RPCResponse(payload={"error": str(exc)}).to_bytes()
-                        client.sendall(response)
-                        continue
-                    response = RPCResponse(payload=result).to_bytes()
-                    try:
-                        client.sendall(response)
-                    except OSError:
-                        return
+                    if workers is None:
+                        workers = ThreadPoolExecutor(
+                            max_workers=self._max_inflight, thread_name_prefix="rpc-pipelined"
+                        )
+                    slots.acquire()
+                    workers.submit(self._serve_pipelined, client, send_lock, codec, request, slots)
+        except RPCError:
+            # Oversized frame: drop the connection rather than buffer it.
+            pass
+        finally:
+            if workers is not None:
+                workers.shutdown(wait=False)
+            with self._clients_lock:
+                self._clients.discard(client)
+
+    def _serve_pipelined(
+        self,
+        client: socket.socket,
+        send_lock: threading.Lock,
+        codec: Codec,
+        request: RPCRequest,
+        slots: threading.BoundedSemaphore,
+    ) -> None:
+        try:
+            response = self._dispatch(request)
+            self._send(client, send_lock, codec.encode(response.to_dict()))
+        finally:
+            slots.release()
+
+    def _dispatch(self, request: RPCRequest) -> RPCResponse:
+        handler = self._handlers.get((request.service, request.method))
+        if handler is None:
+            return RPCResponse(payload={"error": "method_not_found"}, request_id=request.request_id)
+        try:
+            result = handler(request.payload)
+        except Exception as exc:  # pragma: no cover - defensive
+            return RPCResponse(payload={"error": str(exc)}, request_id=request.request_id)
+        return RPCResponse(payload=result, request_id=request.request_id)
+
+    def _send(self, client: socket.socket, send_lock: threading.Lock, data: bytes) -> bool:
+        with send_lock:
+            try:
+                client.sendall(data)
+            except OSError:
+                return False
+        return True
 
     def stop(self) -> None:
         self._stop_event.set()
@@ -138,32 +452,202 @@ class RPCServer:
                 self._server_socket.close()
             except OSError:
                 pass
+        # Pooled clients keep their sockets open, so a stopped server has to
+        # hang up on them explicitly instead of waiting for them to go away.
+        with self._clients_lock:
+            clients = list(self._clients)
+            self._clients.clear()
+        for client in clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
         if self._serve_thread and self._serve_thread.is_alive():
             self._serve_thread.join(timeout=1.0)
 
 
+# ----------------------------------------------------------------------
+# Client
+# ----------------------------------------------------------------------
+class _StaleConnectionError(ConnectionError):
+    """The request never left this process, so it is safe to resend it."""
+
+
+class _Connection:
+    """A persistent socket that multiplexes concurrent calls by request id."""
+
+    def __init__(self, host: str, port: int, timeout: float, codecs: Sequence[str]) -> None:
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = FrameReader(self._sock)
+        try:
+            self.codec = self._handshake(codecs)
+        except OSError:
+            self._sock.close()
+            raise
+        self._sock.settimeout(None)
+        self._send_lock = threading.Lock()
+        self._pending: Dict[int, "Future[RPCResponse]"] = {}
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._closed = False
+        # Set once the server echoes request ids; until then responses may be
+        # matched to requests by position only.
+        self._tagged = False
+        self._reader_thread = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader_thread.start()
+
+    def _handshake(self, codecs: Sequence[str]) -> Codec:
+        if not codecs:
+            return JSON_CODEC
+        self._sock.sendall(hello_frame(codecs))
+        for frame in self._reader.frames():
+            chosen = parse_hello(frame)
+            if chosen and chosen[0] in CODECS:
+                codec = CODECS[chosen[0]]
+                self._reader.codec = codec
+                return codec
+            # A pre-handshake server rejected the hello line; stay on JSON.
+            return JSON_CODEC
+        raise ConnectionError("Connection closed during handshake")
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def call(self, service: str, method: str, payload: Payload, timeout: float) -> RPCResponse:
+        request_id = next(self._ids)
+        future: "Future[RPCResponse]" = Future()
+        request = RPCRequest(service=service, method=method, payload=payload, request_id=request_id)
+        data = self.codec.encode(request.to_dict())
+        try:
+            try:
+                # Register and send under one lock so ``_pending`` stays in wire
+                # order, which is how untagged legacy responses are matched.
+                with self._send_lock:
+                    with self._pending_lock:
+                        if self._closed:
+                            raise _StaleConnectionError("Connection closed")
+                        self._pending[request_id] = future
+                    self._sock.sendall(data)
+            except _StaleConnectionError:
+                raise
+            except OSError as exc:
+                self.close()
+                raise _StaleConnectionError(str(exc)) from exc
+            return future.result(timeout=timeout)
+        except FutureTimeoutError as exc:
+            if not self._tagged:
+                # A late untagged response would be handed to the next caller.
+                self.close()
+            raise TimeoutError("timed out") from exc
+        finally:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+
+    def _read_loop(self) -> None:
+        try:
+            for frame in self._reader.frames():
+                response = RPCResponse.from_dict(self.codec.decode(frame))
+                with self._pending_lock:
+                    if response.request_id is None and self._pending:
+                        # Servers without pipelining answer in request order.
+                        future = self._pending.pop(next(iter(self._pending)))
+                    else:
+                        if response.request_id is not None:
+                            self._tagged = True
+                        future = self._pending.pop(response.request_id, None)
+                if future is not None:
+                    future.set_result(response)
+        except RPCError:
+            pass
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        with self._pending_lock:
+            if self._closed:
+                return
+            self._closed = True
+            pending = list(self._pending.values())
+            self._pending.clear()
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+        for future in pending:
+            if not future.done():
+                future.set_exception(ConnectionError("Connection closed before response"))
+
+
+class ConnectionPool:
+    """Keeps one long-lived, multiplexed connection per target address."""
+
+    def __init__(self, codecs: Optional[Sequence[str]] = None) -> None:
+        self._codecs = tuple(codecs) if codecs is not None else default_codec_preference()
+        self._connections: Dict[Tuple[str, int], _Connection] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def acquire(self, host: str, port: int, timeout: float) -> Tuple[_Connection, bool]:
+        """Return a live connection and whether it was freshly opened."""
+        key = (host, port)
+        with self._lock:
+            if self._closed:
+                raise ConnectionError("Connection pool closed")
+            connection = self._connections.get(key)
+        if connection is not None and not connection.closed:
+            return connection, False
+        # Connect outside the lock so a dead peer does not stall other targets.
+        fresh = _Connection(host, port, timeout, self._codecs)
+        with self._lock:
+            closed = self._closed
+            connection = self._connections.get(key)
+            raced = connection is not None and not connection.closed
+            if not closed and not raced:
+                self._connections[key] = fresh
+        if closed:
+            fresh.close()
+            raise ConnectionError("Connection pool closed")
+        if raced:
+            fresh.close()
+            return connection, False
+        return fresh, True
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            connection.close()
+
+
+_default_pool = ConnectionPool()
+
+
 class RPCClient:
-    """Synchronous RPC client."""
+    """Synchronous RPC client backed by a shared connection pool."""
 
-    def __init__(self, host: str, port: int) -> None:
+    def __init__(self, host: str, port: int, pool: Optional[ConnectionPool] = None) -> None:
         self._host = host
         self._port = port
+        self._pool = pool or _default_pool
 
     def call(self, service: str, method: str, payload: Payload, timeout: float = 5.0) -> Payload:
-        request = RPCRequest(service=service, method=method, payload=payload)
         try:
-            with socket.create_connection((self._host, self._port), timeout=timeout) as sock:
-                sock.settimeout(timeout)
-                sock.sendall(request.to_bytes())
-                data = b""
-                while not data.endswith(b"\n"):
-                    chunk = sock.recv(4096)
-                    if not chunk:
-                        raise RPCError("Connection closed before response")
-                    data += chunk
+            connection, fresh = self._pool.acquire(self._host, self._port, timeout)
+            try:
+                response = connection.call(service, method, payload, timeout)
+            except _StaleConnectionError:
+                if fresh:
+                    raise
+                # The pooled socket went stale (peer restarted); reconnect once.
+                connection, _ = self._pool.acquire(self._host, self._port, timeout)
+                response = connection.call(service, method, payload, timeout)
         except (OSError, TimeoutError) as exc:
             raise RPCError(str(exc)) from exc
-        response = RPCResponse.from_bytes(data.strip())
         if "error" in response.payload:
             raise RPCError(response.payload["error"])
         return response.payload
@@ -8,7 +8,8 @@ import sys
 import threading
 from typing import Dict
 
-from consensus.node import ConsensusNode, NodeConfig
+from consensus.multiraft import MultiRaftHost
+from consensus.node import READ_MODES, RPC_ENGINES, ConsensusNode, NodeConfig
 
 
 def parse_args() -> argparse.Namespace:
@@ -27,6 +28,39 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Force the node to vote abort during 2PC",
     )
+    parser.add_argument(
+        "--no-pre-vote",
+        action="store_true",
+        help="Start elections without a PreVote round",
+    )
+    parser.add_argument(
+        "--no-check-quorum",
+        action="store_true",
+        help="Keep leading even when a majority stops responding",
+    )
+    parser.add_argument(
+        "--data-dir",
+        default=None,
+        help="Directory for the Raft write-ahead log (state is in-memory if omitted)",
+    )
+    parser.add_argument(
+        "--rpc-engine",
+        choices=sorted(RPC_ENGINES),
+        default="threads",
+        help="RPC server implementation (asyncio scales to many connections)",
+    )
+    parser.add_argument(
+        "--groups",
+        type=int,
+        default=0,
+        help="Run this many hash-sharded Raft groups behind one port (Multi-Raft)",
+    )
+    parser.add_argument(
+        "--read-mode",
+        choices=READ_MODES,
+        default="read_index",
+        help="How get commands are served (log replicates them like writes)",
+    )
     return parser.parse_args()
 
 
@@ -42,8 +76,13 @@ def main() -> None:
         port=args.port,
         peers=peers,
         vote_commit=not args.vote_abort,
+        rpc_engine=args.rpc_engine,
+        data_dir=args.data_dir,
+        read_mode=args.read_mode,
+        pre_vote=not args.no_pre_vote,
+        check_quorum=not args.no_check_quorum,
     )
-    node = ConsensusNode(config)
+    node = MultiRaftHost(config, args.groups) if args.groups else ConsensusNode(config)
     node.start()
 
     stop_event = threading.Event()
@@ -0,0 +1,92 @@
+"""Process-wide timer scheduler for Raft election and heartbeat deadlines.
+
+Every ``ConsensusNode`` used to run its own polling threads: an election timer
+that woke every 50 ms and a heartbeat loop that slept a full interval. With
+many nodes or Raft groups in one process that is a steady stream of wakeups
+doing nothing. ``Scheduler`` keeps all deadlines in one heap served by a
+single thread that sleeps until the earliest one is due, so idle nodes cost
+nothing. Callbacks run on that thread and must return quickly; anything that
+blocks on the network should be handed to an executor.
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+
+class TimerHandle:
+    __slots__ = ("deadline", "callback", "cancelled")
+
+    def __init__(self, deadline: float, callback: Callable[[], None]) -> None:
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class Scheduler:
+    """Runs callbacks at ``time.monotonic`` deadlines from one thread."""
+
+    def __init__(self, name: str = "raft-timers") -> None:
+        self._name = name
+        self._heap: List[Tuple[float, int, TimerHandle]] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> TimerHandle:
+        return self.call_at(time.monotonic() + max(0.0, delay), callback)
+
+    def call_at(self, deadline: float, callback: Callable[[], None]) -> TimerHandle:
+        handle = TimerHandle(deadline, callback)
+        with self._cond:
+            heapq.heappush(self._heap, (deadline, next(self._counter), handle))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+            if self._heap[0][2] is handle:
+                # New earliest deadline; the thread may be sleeping past it.
+                self._cond.notify()
+        return handle
+
+    def pending(self) -> int:
+        with self._cond:
+            return sum(1 for _, _, handle in self._heap if not handle.cancelled)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    remaining = self._heap[0][0] - time.monotonic()
+                    if remaining <= 0:
+                        handle = heapq.heappop(self._heap)[2]
+                        break
+                    self._cond.wait(remaining)
+            if handle.cancelled:
+                continue
+            try:
+                handle.callback()
+            except Exception:  # pragma: no cover - defensive
+                # One failing callback must not stop every other node's timers.
+                pass
+
+
+_default_scheduler: Optional[Scheduler] = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler() -> Scheduler:
+    """Return the scheduler shared by every node in this process."""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = Scheduler()
+        return _default_scheduler
@@ -0,0 +1,473 @@
+"""Durable Raft state: a segmented write-ahead log plus term/vote metadata.
+
+Log entries are appended to numbered segment files (``<first index>.wal``).
+Every record is ``crc32 | command length | index | term | command`` and the
+checksum covers everything after itself, so a torn or corrupted tail is
+detected on recovery and cut off. Segments roll over once they reach
+``segment_bytes``.
+
+Writes are split into a cheap buffered ``append``/``truncate_from`` that the
+node performs while holding its state lock (keeping the file in log order), and
+a ``sync`` that callers wait on afterwards. Concurrent ``sync`` callers share a
+single ``fsync`` (group commit): whoever arrives first flushes everything
+written so far and the others piggyback on it.
+
+The current term and vote live in ``meta.json`` and the latest state-machine
+snapshot in ``snapshot.bin``; both are replaced atomically through a temporary
+file and ``os.replace``. Once a snapshot is saved, ``compact`` deletes the
+segments it fully covers.
+
+``TwoPCLog`` is the two-phase commit counterpart: an append-only file of
+checksummed JSON records with the same group-commit ``sync``. It tracks which
+transactions are still live and, once the file has grown past
+``compact_bytes``, rewrites it with only their records.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+
+# crc32, command length, index, term
+_RECORD = struct.Struct("!IIqq")
+# last included index, last included term, length, crc32
+_SNAPSHOT_HEADER = struct.Struct("!qqII")
+_SEGMENT_SUFFIX = ".wal"
+_META_FILE = "meta.json"
+_SNAPSHOT_FILE = "snapshot.bin"
+# crc32, body length
+_TWOPC_RECORD = struct.Struct("!II")
+_TWOPC_FILE = "twopc.log"
+# Record kind -> role; a role's records for a transaction stay live until
+# the record that finishes it is appended.
+_TWOPC_ROLES = {"decision": "coordinator", "end": "coordinator", "prepared": "participant", "decided": "participant"}
+_TWOPC_FINAL = ("end", "decided")
+
+StoredEntry = Tuple[int, int, str]
+
+
+def _segment_name(first_index: int) -> str:
+    return f"{first_index:020d}{_SEGMENT_SUFFIX}"
+
+
+def _encode(index: int, term: int, command: str) -> bytes:
+    body = command.encode("utf-8")
+    header = _RECORD.pack(0, len(body), index, term)
+    crc = zlib.crc32(body, zlib.crc32(header[4:]))
+    return struct.pack("!I", crc) + header[4:] + body
+
+
+class RaftStorage:
+    """Segmented, checksummed WAL with group-commit ``fsync``."""
+
+    def __init__(self, data_dir: str, segment_bytes: int = 64 * 1024 * 1024, fsync: bool = True) -> None:
+        self._dir = data_dir
+        self._segment_bytes = segment_bytes
+        self._fsync = fsync
+        os.makedirs(data_dir, exist_ok=True)
+        # (first index, path) for every segment, oldest first.
+        self._segments: List[Tuple[int, str]] = []
+        self._active: Optional[BinaryIO] = None
+        self._active_size = 0
+        self._next_index = 0
+        self._write_lock = threading.Lock()
+        self._dirty: List[BinaryIO] = []
+        self._written_seq = 0
+        self._synced_seq = 0
+        self._syncing = False
+        self._sync_cond = threading.Condition()
+
+    # ------------------------------------------------------------------
+    # Recovery
+    # ------------------------------------------------------------------
+    def load(self) -> Tuple[int, Optional[str], List[StoredEntry]]:
+        """Return ``(term, voted_for, entries)`` recovered from disk.
+
+        Entries already covered by the saved snapshot are not returned.
+        """
+        term, voted_for = self._load_meta()
+        snapshot = self.load_snapshot()
+        snapshot_index = snapshot[0] if snapshot is not None else -1
+        entries: List[StoredEntry] = []
+        names = sorted(name for name in os.listdir(self._dir) if name.endswith(_SEGMENT_SUFFIX))
+        for position, name in enumerate(names):
+            path = os.path.join(self._dir, name)
+            first_index = int(name[: -len(_SEGMENT_SUFFIX)])
+            expected = entries[-1][0] + 1 if entries else None
+            if expected is None and snapshot is not None and first_index > snapshot_index + 1:
+                expected = snapshot_index + 1
+            if expected is not None and first_index != expected:
+                self._remove(names[position:])
+                break
+            valid = self._scan_segment(path, entries)
+            self._segments.append((first_index, path))
+            if valid < os.path.getsize(path):
+                # Torn write or corruption: drop the tail and everything after.
+                os.truncate(path, valid)
+                self._remove(names[position + 1 :])
+                break
+        self._next_index = entries[-1][0] + 1 if entries else snapshot_index + 1
+        if self._segments:
+            path = self._segments[-1][1]
+            self._active = open(path, "ab")
+            self._active_size = os.path.getsize(path)
+        if entries and entries[-1][0] <= snapshot_index:
+            # The whole WAL predates the snapshot; restart it after it.
+            self.reset(snapshot_index + 1)
+            return term, voted_for, []
+        return term, voted_for, [entry for entry in entries if entry[0] > snapshot_index]
+
+    def _scan_segment(self, path: str, entries: List[StoredEntry]) -> int:
+        """Append the segment's valid records to ``entries``; return valid bytes."""
+        size = os.path.getsize(path)
+        if size == 0:
+            return 0
+        with open(path, "rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                offset = 0
+                while offset + _RECORD.size <= size:
+                    crc, length, index, term = _RECORD.unpack_from(mm, offset)
+                    end = offset + _RECORD.size + length
+                    if end > size:
+                        break
+                    if zlib.crc32(view[offset + 4 : end]) != crc:
+                        break
+                    if entries and index != entries[-1][0] + 1:
+                        break
+                    command = str(view[offset + _RECORD.size : end], "utf-8")
+                    entries.append((index, term, command))
+                    offset = end
+                return offset
+            finally:
+                view.release()
+
+    def _load_meta(self) -> Tuple[int, Optional[str]]:
+        path = os.path.join(self._dir, _META_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                meta = json.load(handle)
+        except (OSError, json.JSONDecodeError):
+            return 0, None
+        return int(meta.get("current_term", 0)), meta.get("voted_for")
+
+    def _remove(self, names: List[str]) -> None:
+        for name in names:
+            try:
+                os.remove(os.path.join(self._dir, name))
+            except OSError:
+                pass
+
+    # ------------------------------------------------------------------
+    # Term and vote
+    # ------------------------------------------------------------------
+    def save_state(self, current_term: int, voted_for: Optional[str]) -> None:
+        path = os.path.join(self._dir, _META_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump({"current_term": current_term, "voted_for": voted_for}, handle)
+            handle.flush()
+            if self._fsync:
+                os.fsync(handle.fileno())
+        os.replace(tmp_path, path)
+        self._sync_dir()
+
+    # ------------------------------------------------------------------
+    # Snapshots
+    # ------------------------------------------------------------------
+    def save_snapshot(self, last_index: int, last_term: int, data: bytes) -> None:
+        path = os.path.join(self._dir, _SNAPSHOT_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as handle:
+            handle.write(_SNAPSHOT_HEADER.pack(last_index, last_term, len(data), zlib.crc32(data)))
+            handle.write(data)
+            handle.flush()
+            if self._fsync:
+                os.fsync(handle.fileno())
+        os.replace(tmp_path, path)
+        self._sync_dir()
+
+    def load_snapshot(self) -> Optional[Tuple[int, int, bytes]]:
+        """Return ``(last_index, last_term, data)`` of the saved snapshot."""
+        path = os.path.join(self._dir, _SNAPSHOT_FILE)
+        try:
+            with open(path, "rb") as handle:
+                header = handle.read(_SNAPSHOT_HEADER.size)
+                if len(header) < _SNAPSHOT_HEADER.size:
+                    return None
+                last_index, last_term, length, crc = _SNAPSHOT_HEADER.unpack(header)
+                data = handle.read(length)
+        except OSError:
+            return None
+        if len(data) != length or zlib.crc32(data) != crc:
+            return None
+        return last_index, last_term, data
+
+    def compact(self, upto_index: int) -> None:
+        """Delete segments whose entries are all at or before ``upto_index``."""
+        with self._write_lock:
+            while len(self._segments) > 1 and self._segments[1][0] <= upto_index + 1:
+                _, path = self._segments.pop(0)
+                self._remove([os.path.basename(path)])
+
+    def reset(self, next_index: int) -> None:
+        """Discard the whole log; the next append must be ``next_index``."""
+        with self._write_lock:
+            for _, path in self._segments:
+                self._remove([os.path.basename(path)])
+            self._segments = []
+            self._reopen(None)
+            self._next_index = next_index
+            self._written_seq += 1
+
+    # ------------------------------------------------------------------
+    # Log writes
+    # ------------------------------------------------------------------
+    def append(self, entries: List[StoredEntry]) -> int:
+        """Buffer ``entries`` for writing; return a sequence number for ``sync``."""
+        with self._write_lock:
+            for index, term, command in entries:
+                if index != self._next_index:
+                    raise ValueError(f"WAL expected index {self._next_index}, got {index}")
+                if self._active is None or self._active_size >= self._segment_bytes:
+                    self._roll(index)
+                assert self._active is not None
+                record = _encode(index, term, command)
+                self._active.write(record)
+                self._active_size += len(record)
+                self._next_index = index + 1
+            self._written_seq += 1
+            return self._written_seq
+
+    def truncate_from(self, index: int) -> int:
+        """Drop every entry at or after ``index``; return a sequence for ``sync``."""
+        with self._write_lock:
+            if index >= self._next_index:
+                return self._written_seq
+            if self._active is not None:
+                self._active.flush()
+            while self._segments and self._segments[-1][0] >= index:
+                _, path = self._segments.pop()
+                self._remove([os.path.basename(path)])
+            if self._segments:
+                path = self._segments[-1][1]
+                os.truncate(path, self._offset_of(path, index))
+                self._reopen(path)
+            else:
+                self._reopen(None)
+            self._next_index = index
+            self._written_seq += 1
+            return self._written_seq
+
+    def _offset_of(self, path: str, index: int) -> int:
+        entries: List[StoredEntry] = []
+        size = self._scan_segment(path, entries)
+        offset = 0
+        for entry_index, _, command in entries:
+            if entry_index >= index:
+                return offset
+            offset += _RECORD.size + len(command.encode("utf-8"))
+        return size
+
+    def _roll(self, first_index: int) -> None:
+        path = os.path.join(self._dir, _segment_name(first_index))
+        self._segments.append((first_index, path))
+        self._reopen(path)
+        self._sync_dir()
+
+    def _reopen(self, path: Optional[str]) -> None:
+        if self._active is not None:
+            # Closed by the next ``sync`` once its contents are durable.
+            self._dirty.append(self._active)
+        self._active = open(path, "ab") if path is not None else None
+        self._active_size = os.path.getsize(path) if path is not None else 0
+
+    def sync(self, seq: int) -> None:
+        """Block until everything up to ``seq`` is on disk (group commit)."""
+        with self._sync_cond:
+            while self._synced_seq < seq:
+                if not self._syncing:
+                    self._syncing = True
+                    break
+                self._sync_cond.wait()
+            else:
+                return
+        target = self._synced_seq
+        try:
+            with self._write_lock:
+                target = self._written_seq
+                files = self._dirty
+                self._dirty = []
+                if self._active is not None:
+                    self._active.flush()
+            for handle in files:
+                handle.flush()
+                if self._fsync:
+                    os.fsync(handle.fileno())
+                handle.close()
+            active = self._active
+            if self._fsync and active is not None:
+                try:
+                    os.fsync(active.fileno())
+                except (OSError, ValueError):
+                    pass  # rolled and closed concurrently; the next sync covers it
+        finally:
+            with self._sync_cond:
+                self._synced_seq = max(self._synced_seq, target)
+                self._syncing = False
+                self._sync_cond.notify_all()
+
+    def _sync_dir(self) -> None:
+        if not self._fsync or not hasattr(os, "O_DIRECTORY"):
+            return
+        fd = os.open(self._dir, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def close(self) -> None:
+        self.sync(self._written_seq)
+        with self._write_lock:
+            if self._active is not None:
+                self._active.close()
+                self._active = None
+
+
+class TwoPCLog:
+    """Append-only 2PC decision log shared by a node's coordinator and participant.
+
+    Records are dicts with a ``kind`` (see ``_TWOPC_ROLES``) and a ``txn`` id.
+    """
+
+    def __init__(self, data_dir: str, fsync: bool = True, compact_bytes: int = 4 * 1024 * 1024) -> None:
+        self._dir = data_dir
+        self._path = os.path.join(data_dir, _TWOPC_FILE)
+        self._fsync = fsync
+        self._compact_bytes = compact_bytes
+        os.makedirs(data_dir, exist_ok=True)
+        # (role, txn) -> that role's live records, in append order.
+        self._live: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self._file: Optional[BinaryIO] = None
+        self._size = 0
+        self._write_lock = threading.Lock()
+        self._written_seq = 0
+        self._synced_seq = 0
+        self._syncing = False
+        self._sync_cond = threading.Condition()
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Return the records of every unfinished transaction, oldest first."""
+        valid = 0
+        try:
+            with open(self._path, "rb") as handle:
+                data = handle.read()
+        except OSError:
+            data = b""
+        while valid + _TWOPC_RECORD.size <= len(data):
+            crc, length = _TWOPC_RECORD.unpack_from(data, valid)
+            body = data[valid + _TWOPC_RECORD.size : valid + _TWOPC_RECORD.size + length]
+            if len(body) != length or zlib.crc32(body) != crc:
+                break  # torn tail
+            self._track(json.loads(body.decode("utf-8")))
+            valid += _TWOPC_RECORD.size + length
+        if valid < len(data):
+            os.truncate(self._path, valid)
+        self._file = open(self._path, "ab")
+        self._size = valid
+        return self.live_records()
+
+    def live_records(self) -> List[Dict[str, Any]]:
+        with self._write_lock:
+            return [record for records in self._live.values() for record in records]
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """Buffer ``record``; return a sequence number for ``sync``."""
+        with self._write_lock:
+            if self._file is None:
+                raise ValueError("TwoPCLog.load must be called before append")
+            self._track(record)
+            if self._size >= self._compact_bytes:
+                self._rewrite()
+            else:
+                self._write(self._file, record)
+            self._written_seq += 1
+            return self._written_seq
+
+    def sync(self, seq: Optional[int] = None) -> None:
+        """Block until everything up to ``seq`` (default: all appends) is on disk."""
+        if seq is None:
+            with self._write_lock:
+                seq = self._written_seq
+        with self._sync_cond:
+            while self._synced_seq < seq:
+                if not self._syncing:
+                    self._syncing = True
+                    break
+                self._sync_cond.wait()
+            else:
+                return
+        target = self._synced_seq
+        try:
+            with self._write_lock:
+                target = self._written_seq
+                handle = self._file
+                if handle is not None:
+                    handle.flush()
+            if self._fsync and handle is not None:
+                try:
+                    os.fsync(handle.fileno())
+                except (OSError, ValueError):
+                    pass  # replaced by a rewrite, which synced its own file
+        finally:
+            with self._sync_cond:
+                self._synced_seq = max(self._synced_seq, target)
+                self._syncing = False
+                self._sync_cond.notify_all()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self.sync()
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _track(self, record: Dict[str, Any]) -> None:
+        key = (_TWOPC_ROLES[record["kind"]], record["txn"])
+        if record["kind"] in _TWOPC_FINAL:
+            self._live.pop(key, None)
+        else:
+            self._live.setdefault(key, []).append(record)
+
+    def _write(self, handle: BinaryIO, record: Dict[str, Any]) -> None:
+        body = json.dumps(record, separators=(",", ":")).encode("utf-8")
+        handle.write(_TWOPC_RECORD.pack(zlib.crc32(body), len(body)) + body)
+        self._size += _TWOPC_RECORD.size + len(body)
+
+    def _rewrite(self) -> None:
+        """Replace the file with only the live records. Caller holds ``_write_lock``."""
+        tmp_path = self._path + ".tmp"
+        self._size = 0
+        with open(tmp_path, "wb") as handle:
+            for records in self._live.values():
+                for record in records:
+                    self._write(handle, record)
+            handle.flush()
+            if self._fsync:
+                os.fsync(handle.fileno())
+        os.replace(tmp_path, self._path)
+        if self._fsync and hasattr(os, "O_DIRECTORY"):
+            fd = os.open(self._dir, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        assert self._file is not None
+        self._file.close()
+        self._file = open(self._path, "ab")
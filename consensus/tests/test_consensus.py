@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import os
 import time
-from typing import Dict, List
+from typing import Any, Dict, List
 
 import pytest
 
@@ -20,9 +21,19 @@ def next_base_port(step: int = 20) -> int:
 
 
 class Cluster:
-    def __init__(self, node_ids: List[str], base_port: int = 5600) -> None:
+    def __init__(
+        self,
+        node_ids: List[str],
+        base_port: int = 5600,
+        rpc_engine: str = "threads",
+        data_root: str | None = None,
+        **node_options: Any,
+    ) -> None:
         self.node_ids = node_ids
         self.base_port = base_port
+        self.rpc_engine = rpc_engine
+        self.data_root = data_root
+        self.node_options = node_options
         self.nodes: Dict[str, ConsensusNode] = {}
         self.addresses: Dict[str, str] = {}
 
@@ -45,6 +56,9 @@ class Cluster:
                 port=self.base_port + index,
                 peers=peers,
                 vote_commit=node_id not in abort_nodes,
+                rpc_engine=self.rpc_engine,
+                data_dir=os.path.join(self.data_root, node_id) if self.data_root else None,
+                **self.node_options,
             )
             node = ConsensusNode(config)
             node.start()
@@ -195,8 +209,292 @@ def test_two_phase_commit_abort() -> None:
     cluster.stop()
 
 
+def test_single_node_cluster_commits() -> None:
+    cluster = Cluster(["solo"], base_port=next_base_port())
+    cluster.start()
+    try:
+        assert cluster.await_leader() == "solo"
+        response = cluster.send_command("solo", "set alone 1")
+        assert response["success"]
+        assert "set alone 1" in cluster.get_status("solo")["applied_commands"]
+    finally:
+        cluster.stop()
+
+
+def test_stop_releases_batcher_waiting_for_a_round_slot() -> None:
+    config = NodeConfig(
+        node_id="b1", host="127.0.0.1", port=next_base_port(), peers={}, max_inflight_batches=1
+    )
+    node = ConsensusNode(config)
+    node.start()
+    try:
+        # Hold the only round slot, as a round cancelled by stop() would.
+        node._inflight_batches.acquire()
+        future = node._propose("set stuck 1")
+        time.sleep(0.2)
+    finally:
+        node.stop()
+        node.wait()
+    assert not any(thread.is_alive() for thread in node._bg_threads)
+    with pytest.raises(Exception, match="node_stopped"):
+        future.result(timeout=1.0)
+
+
+def test_failing_command_does_not_stop_the_applier() -> None:
+    cluster = Cluster(["f1", "f2", "f3"], base_port=next_base_port())
+    cluster.start()
+    try:
+        leader = cluster.await_leader()
+        assert cluster.send_command(leader, "set a foo")["success"]
+        response = cluster.send_command(leader, "increment a")
+        assert not response["success"]
+        assert response["message"].startswith("apply_failed")
+        assert cluster.send_command(leader, "set b 1")["success"]
+        time.sleep(0.5)
+        for node_id in cluster.node_ids:
+            status = cluster.get_status(node_id)
+            assert status["applied_commands"][-2:] == ["set a foo", "set b 1"]
+            assert cluster.nodes[node_id]._kv_store == {"a": "foo", "b": "1"}
+    finally:
+        cluster.stop()
+
+
 def test_forwarding_to_leader(cluster: Cluster) -> None:
     leader = cluster.await_leader()
     follower = next(node for node in cluster.node_ids if node != leader)
     response = cluster.send_command(follower, "increment counter")
     assert response["success"]
+
+
+def test_asyncio_rpc_engine() -> None:
+    cluster = Cluster(["a1", "a2", "a3"], base_port=next_base_port(), rpc_engine="asyncio")
+    cluster.start()
+    try:
+        leader = cluster.await_leader()
+        follower = next(node for node in cluster.node_ids if node != leader)
+        response = cluster.send_command(follower, "set engine asyncio")
+        assert response["success"]
+    finally:
+        cluster.stop()
+
+
+def test_append_entries_reports_conflicting_term() -> None:
+    from consensus.node import LogEntry
+
+    config = NodeConfig(node_id="f1", host="127.0.0.1", port=next_base_port(), peers={})
+    follower = ConsensusNode(config)
+    follower._log.extend(
+        [
+            LogEntry(index=0, term=1, command="set a 1"),
+            LogEntry(index=1, term=2, command="set b 1"),
+            LogEntry(index=2, term=2, command="set c 1"),
+        ]
+    )
+    rejected = follower._handle_append_entries(
+        {"leader_id": "l1", "term": 3, "prev_log_index": 2, "prev_log_term": 3, "entries": []}
+    )
+    assert not rejected["success"]
+    assert (rejected["conflict_index"], rejected["conflict_term"]) == (1, 2)
+    missing = follower._handle_append_entries(
+        {"leader_id": "l1", "term": 3, "prev_log_index": 7, "prev_log_term": 3, "entries": []}
+    )
+    assert (missing["conflict_index"], missing["conflict_term"]) == (3, -1)
+    accepted = follower._handle_append_entries(
+        {
+            "leader_id": "l1",
+            "term": 3,
+            "prev_log_index": 0,
+            "prev_log_term": 1,
+            "entries": [{"index": 1, "term": 3, "command": "set b 2"}],
+            "commit_index": 1,
+        }
+    )
+    assert accepted == {"success": True, "term": 3, "match_index": 1}
+    assert [entry.term for entry in follower._log] == [1, 3]
+    follower._apply_entries()  # normally done by the apply thread
+    assert follower._kv_store == {"a": "1", "b": "2"}
+
+
+def test_concurrent_commands_are_batched(cluster: Cluster) -> None:
+    import concurrent.futures
+
+    leader = cluster.await_leader()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=20) as pool:
+        responses = list(pool.map(lambda _: cluster.send_command(leader, "increment batched"), range(20)))
+    assert all(response["success"] for response in responses)
+    # Every caller gets the result of its own entry, not of its batch.
+    assert sorted(int(response["result"]) for response in responses) == list(range(1, 21))
+
+
+def test_restart_recovers_log_from_disk(tmp_path) -> None:
+    cluster = Cluster(["d1", "d2", "d3"], base_port=next_base_port(), data_root=str(tmp_path))
+    cluster.start()
+    leader = cluster.await_leader()
+    assert cluster.send_command(leader, "set durable 1")["success"]
+    terms = {node_id: cluster.get_status(node_id)["term"] for node_id in cluster.node_ids}
+    cluster.stop()
+
+    cluster.start()
+    try:
+        for node_id in cluster.node_ids:
+            node = cluster.nodes[node_id]
+            assert node._log[0].command == "set durable 1"
+            assert node._current_term >= terms[node_id]
+        leader = cluster.await_leader()
+        assert cluster.send_command(leader, "set durable 2")["success"]
+        time.sleep(0.5)
+        for node_id in cluster.node_ids:
+            assert "set durable 1" in cluster.get_status(node_id)["applied_commands"]
+    finally:
+        cluster.stop()
+
+
+def test_lagging_node_catches_up_from_snapshot(tmp_path) -> None:
+    options = {"snapshot_entries": 3, "snapshot_chunk_bytes": 16}
+    cluster = Cluster(["s1", "s2", "s3"], base_port=next_base_port(), data_root=str(tmp_path), **options)
+    cluster.start()
+    try:
+        leader = cluster.await_leader()
+        assert cluster.send_command(leader, "set baseline 1")["success"]
+        for value in range(6):
+            assert cluster.send_command(leader, f"set filler {value}")["success"]
+        time.sleep(0.5)
+        assert cluster.nodes[leader]._snapshot_index >= 2
+        assert cluster.nodes[leader]._log.first_index > 0
+
+        new_id = "s4"
+        new_port = cluster.base_port + len(cluster.node_ids)
+        new_address = f"127.0.0.1:{new_port}"
+        for node in cluster.nodes.values():
+            node.config.peers[new_id] = new_address
+        config = NodeConfig(
+            node_id=new_id,
+            host="127.0.0.1",
+            port=new_port,
+            peers=dict(cluster.addresses),
+            data_dir=os.path.join(str(tmp_path), new_id),
+            **options,
+        )
+        new_node = ConsensusNode(config)
+        new_node.start()
+        cluster.nodes[new_id] = new_node
+        cluster.node_ids.append(new_id)
+        cluster.addresses[new_id] = new_address
+        time.sleep(1.5)
+        status = cluster.get_status(new_id)
+        assert "set baseline 1" in status["applied_commands"]
+        assert new_node._kv_store["filler"] == "5"
+        assert new_node._snapshot_index >= 2
+    finally:
+        cluster.stop()
+
+
+@pytest.mark.parametrize("read_mode", ["read_index", "lease"])
+def test_reads_bypass_the_log(read_mode: str) -> None:
+    cluster = Cluster(["r1", "r2", "r3"], base_port=next_base_port(), read_mode=read_mode)
+    cluster.start()
+    try:
+        leader = cluster.await_leader()
+        follower = next(node for node in cluster.node_ids if node != leader)
+        assert cluster.send_command(leader, "set reading 7")["success"]
+        log_length = cluster.nodes[leader]._last_log_index()
+        for node_id in (leader, follower):
+            response = cluster.send_command(node_id, "get reading")
+            assert response["success"]
+            assert response["result"] == "7"
+        assert cluster.nodes[leader]._last_log_index() == log_length
+        assert "get reading" not in cluster.get_status(leader)["applied_commands"]
+    finally:
+        cluster.stop()
+
+
+def test_votes_require_up_to_date_log_and_no_live_leader() -> None:
+    from consensus.node import LogEntry
+
+    config = NodeConfig(node_id="v1", host="127.0.0.1", port=next_base_port(), peers={})
+    voter = ConsensusNode(config)
+    voter._current_term = 2
+    voter._log.extend([LogEntry(index=0, term=1, command="set a 1"), LogEntry(index=1, term=2, command="set b 1")])
+    stale = {"candidate_id": "c1", "term": 3, "last_log_index": 5, "last_log_term": 1}
+    assert not voter._handle_pre_vote(stale)["vote_granted"]
+    assert not voter._handle_raft_request_vote(stale)["vote_granted"]
+    assert voter._current_term == 3  # the newer term is still adopted
+
+    current = {"candidate_id": "c2", "term": 4, "last_log_index": 1, "last_log_term": 2}
+    voter._leader_contact = time.time()
+    assert not voter._handle_pre_vote(current)["vote_granted"]
+    voter._leader_contact = 0.0
+    assert voter._handle_pre_vote(current)["vote_granted"]
+    assert voter._current_term == 3  # PreVote never changes state
+    assert voter._handle_raft_request_vote(current)["vote_granted"]
+
+
+def test_apply_batches_parsed_commands_and_bounds_history() -> None:
+    from consensus.node import LogEntry
+
+    config = NodeConfig(node_id="p1", host="127.0.0.1", port=next_base_port(), peers={}, applied_history=3)
+    node = ConsensusNode(config)
+    node._handle_append_entries(
+        {
+            "leader_id": "l1",
+            "term": 1,
+            "prev_log_index": -1,
+            "prev_log_term": 0,
+            "entries": [
+                {"index": index, "term": 1, "command": command}
+                for index, command in enumerate(
+                    ["set a 1", "increment b", "get a", "increment b", "set c 3", "set d 4"]
+                )
+            ],
+            "commit_index": 5,
+        }
+    )
+    assert all(isinstance(entry, LogEntry) and entry.op is not None for entry in node._log)
+    node._apply_entries()
+    assert node._last_applied == 5
+    assert node._kv_store == {"a": "1", "b": "2", "c": "3", "d": "4"}
+    status = node._handle_get_status({})
+    assert status["applied_commands"] == ["increment b", "set c 3", "set d 4"]
+    assert status["applied_count"] == 5  # the get is not counted
+
+
+def test_in_doubt_participant_recovers_and_asks_peers(tmp_path) -> None:
+    # The background resolver never ticks; the test resolves explicitly.
+    cluster = Cluster(
+        ["c1", "p1", "p2"],
+        base_port=next_base_port(),
+        data_root=str(tmp_path),
+        twopc_in_doubt_timeout=0.0,
+        twopc_retry_interval=3600.0,
+    )
+    cluster.start()
+    participants = {node_id: address for node_id, address in cluster.addresses.items() if node_id != "c1"}
+    try:
+        for transaction_id in ("committed", "unknown"):
+            cluster.nodes["p1"]._handle_vote_request(
+                {
+                    # The coordinator is gone for good.
+                    "coordinator_id": "ghost",
+                    "participant_id": "p1",
+                    "transaction_id": transaction_id,
+                    "payload": "update",
+                    "participants": participants,
+                }
+            )
+    finally:
+        cluster.stop()
+
+    cluster.start()
+    try:
+        p1 = cluster.nodes["p1"]
+        assert set(p1._twopc_transactions) == {"committed", "unknown"}
+        cluster.nodes["p2"]._apply_decision("committed", True)
+        p1._resolve_twopc()
+        assert p1._twopc_transactions == {}
+        assert p1._twopc_outcomes == {"committed": True, "unknown": False}
+        # p2 never voted on "unknown", so it aborted it when asked.
+        assert cluster.nodes["p2"]._vote(
+            {"coordinator_id": "ghost", "participant_id": "p2", "transaction_id": "unknown", "payload": "update"}
+        )["commit"] is False
+    finally:
+        cluster.stop()
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import time
+
+from consensus.fanout import FanOut
+
+
+def test_broadcast_returns_at_quorum_without_waiting_for_stragglers() -> None:
+    fanout = FanOut(max_workers=8)
+
+    def peer(delay: float, granted: bool = True):
+        def call():
+            time.sleep(delay)
+            return granted
+
+        return call
+
+    started = time.time()
+    result = fanout.broadcast(
+        {"fast1": peer(0.05), "fast2": peer(0.05), "slow1": peer(2.0), "slow2": peer(2.0)},
+        needed=2,
+    )
+    assert result.reached
+    assert set(result.results) == {"fast1", "fast2"}
+    assert time.time() - started < 1.0
+
+    started = time.time()
+    vote = fanout.broadcast(
+        {"yes": peer(0.05), "no": peer(0.1, granted=False), "slow": peer(2.0)},
+        reject=lambda granted: not granted,
+    )
+    assert not vote.reached and vote.rejected
+    assert time.time() - started < 1.0
+    fanout.shutdown()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import time
+from typing import Dict
+
+from consensus.multiraft import MULTIRAFT_SERVICE, MultiRaftHost, shard_for_key
+from consensus.node import NodeConfig
+from consensus.rpc import RPCClient, parse_target
+
+
+_PORT_COUNTER = 7200
+
+
+def next_base_port(step: int = 10) -> int:
+    global _PORT_COUNTER
+    base = _PORT_COUNTER
+    _PORT_COUNTER += step
+    return base
+
+
+def start_hosts(host_ids, groups: int) -> Dict[str, MultiRaftHost]:
+    base_port = next_base_port()
+    addresses = {host_id: f"127.0.0.1:{base_port + index}" for index, host_id in enumerate(host_ids)}
+    hosts = {}
+    for host_id, address in addresses.items():
+        host, port = parse_target(address)
+        peers = {peer_id: peer for peer_id, peer in addresses.items() if peer_id != host_id}
+        hosts[host_id] = MultiRaftHost(NodeConfig(node_id=host_id, host=host, port=port, peers=peers), groups)
+        hosts[host_id].start()
+    return hosts
+
+
+def await_group_leaders(hosts: Dict[str, MultiRaftHost], timeout: float = 8.0) -> Dict[str, str]:
+    group_ids = next(iter(hosts.values())).group_ids
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        leaders = {
+            group_id: host_id
+            for host_id, host in hosts.items()
+            for group_id, group in host.groups.items()
+            if group._role == "leader"
+        }
+        if set(leaders) == set(group_ids):
+            return leaders
+        time.sleep(0.2)
+    raise AssertionError("Not every group elected a leader")
+
+
+def test_commands_route_to_the_owning_group_and_heartbeats_keep_leaders() -> None:
+    hosts = start_hosts(["h1", "h2", "h3"], groups=4)
+    try:
+        await_group_leaders(hosts)
+        client = RPCClient(*parse_target(hosts["h1"].config.address))
+        for key in ("alpha", "beta", "gamma", "delta"):
+            response = client.call(MULTIRAFT_SERVICE, "ClientCommand", {"command": f"set {key} 1"})
+            assert response["success"]
+            assert response["group_id"] == f"g{shard_for_key(key, 4)}"
+        time.sleep(0.5)
+        for host in hosts.values():
+            for key in ("alpha", "beta", "gamma", "delta"):
+                owner = host.group_for_key(key)
+                assert owner._kv_store[key] == "1"
+                for group in host.groups.values():
+                    if group is not owner:
+                        assert key not in group._kv_store
+
+        # Hosted groups send no periodic heartbeats of their own; the
+        # coalesced host heartbeat alone keeps every leader in place.
+        terms = {group_id: group._current_term for group_id, group in hosts["h1"].groups.items()}
+        time.sleep(4.0)
+        assert {group_id: group._current_term for group_id, group in hosts["h1"].groups.items()} == terms
+    finally:
+        for host in hosts.values():
+            host.stop()
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import pytest
+
+from consensus.raftlog import LogEntry, RaftLog
+
+
+def test_columns_round_trip_truncate_and_compact() -> None:
+    log = RaftLog()
+    for index in range(6):
+        assert log.append(1 + index // 3, f"set k{index} värde{index}") == index
+    assert (len(log), log.last_index, log.term_at(4)) == (6, 5, 2)
+    assert log[2].command == "set k2 värde2"
+    assert log[2].op is not None and log[2].op.key == "k2"
+    assert [payload["index"] for payload in log.payloads(3)] == [3, 4, 5]
+
+    log.truncate_from(4)
+    assert log.last_index == 3
+    log.append(3, "set k4 new")
+    assert log.payloads(4) == [{"index": 4, "term": 3, "command": "set k4 new"}]
+
+    log.compact_through(1)
+    assert (log.first_index, len(log), log.term_at(1)) == (2, 3, None)
+    assert [entry.command for entry in log] == ["set k2 värde2", "set k3 värde3", "set k4 new"]
+    assert [entry.index for entry in log.entries(3)] == [3, 4]
+    with pytest.raises(IndexError):
+        log[1]
+
+    log.compact_through(10)
+    assert (log.first_index, len(log), log.last_index) == (11, 0, 10)
+    with pytest.raises(ValueError):
+        log.extend([LogEntry(index=13, term=4, command="set gap 1")])
+
+
+def test_reclaims_compacted_prefix() -> None:
+    log = RaftLog()
+    for index in range(5000):
+        log.append(1, f"set key {index}")
+    log.compact_through(3999)
+    assert log._start == 0  # the dead prefix outweighed the live entries
+    assert log[4000].command == "set key 4000"
+    assert log.payloads(4999) == [{"index": 4999, "term": 1, "command": "set key 4999"}]
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+from consensus.aiorpc import AsyncRPCClient, AsyncRPCServer
+from consensus.rpc import ConnectionPool, RPCClient, RPCError, RPCServer
+
+
+_PORT_COUNTER = 6900
+
+
+def next_port() -> int:
+    global _PORT_COUNTER
+    _PORT_COUNTER += 1
+    return _PORT_COUNTER
+
+
+@pytest.fixture
+def server():
+    server = RPCServer("127.0.0.1", next_port())
+
+    def slow_echo(payload):
+        time.sleep(payload["delay"])
+        return {"value": payload["value"]}
+
+    server.register("Echo", "Slow", slow_echo)
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_pipelined_calls_share_one_connection(server: RPCServer) -> None:
+    pool = ConnectionPool()
+    client = RPCClient(*server.address, pool=pool)
+    results = {}
+
+    def call(value: int, delay: float) -> None:
+        results[value] = (client.call("Echo", "Slow", {"value": value, "delay": delay}), time.time())
+
+    slow = threading.Thread(target=call, args=(1, 0.5))
+    fast = threading.Thread(target=call, args=(2, 0.0))
+    slow.start()
+    time.sleep(0.05)
+    fast.start()
+    slow.join()
+    fast.join()
+    assert results[1][0] == {"value": 1}
+    assert results[2][0] == {"value": 2}
+    # The fast call was answered out of order, ahead of the slow one.
+    assert results[2][1] < results[1][1]
+    assert len(pool._connections) == 1
+    pool.close()
+
+
+def test_client_reconnects_after_server_restart() -> None:
+    port = next_port()
+    pool = ConnectionPool()
+    client = RPCClient("127.0.0.1", port, pool=pool)
+    first = RPCServer("127.0.0.1", port)
+    first.register("Echo", "Slow", lambda payload: {"value": payload["value"]})
+    first.start()
+    assert client.call("Echo", "Slow", {"value": 1}) == {"value": 1}
+    first.stop()
+    with pytest.raises(RPCError):
+        client.call("Echo", "Slow", {"value": 2}, timeout=0.5)
+    second = RPCServer("127.0.0.1", port)
+    second.register("Echo", "Slow", lambda payload: {"value": payload["value"]})
+    second.start()
+    try:
+        assert client.call("Echo", "Slow", {"value": 3}) == {"value": 3}
+    finally:
+        second.stop()
+        pool.close()
+
+
+@pytest.mark.parametrize(
+    "client_codecs, server_codecs, expected",
+    [
+        (None, None, "lpjson"),
+        ((), None, "json"),
+        (None, (), "json"),
+    ],
+)
+def test_codec_negotiation_falls_back_to_json(client_codecs, server_codecs, expected) -> None:
+    server = RPCServer("127.0.0.1", next_port(), codecs=server_codecs)
+    server.register("Echo", "Slow", lambda payload: {"value": payload["value"]})
+    server.start()
+    pool = ConnectionPool(codecs=client_codecs)
+    client = RPCClient(*server.address, pool=pool)
+    try:
+        # Large enough to force the read buffers on both ends to grow.
+        value = "x" * 200_000
+        assert client.call("Echo", "Slow", {"value": value}) == {"value": value}
+        (connection,) = pool._connections.values()
+        assert connection.codec.name == expected
+    finally:
+        pool.close()
+        server.stop()
+
+
+def test_async_server_serves_sync_and_async_handlers() -> None:
+    server = AsyncRPCServer("127.0.0.1", next_port(), max_workers=4)
+
+    def blocking(payload):
+        time.sleep(payload["delay"])
+        return {"value": payload["value"]}
+
+    async def native(payload):
+        await asyncio.sleep(payload["delay"])
+        return {"value": payload["value"] * 2}
+
+    server.register("Echo", "Blocking", blocking)
+    server.register("Echo", "Native", native)
+    server.start()
+    pool = ConnectionPool()
+    try:
+        client = RPCClient(*server.address, pool=pool)
+        assert client.call("Echo", "Blocking", {"value": 1, "delay": 0}) == {"value": 1}
+        assert client.call("Echo", "Native", {"value": 2, "delay": 0}) == {"value": 4}
+        # Legacy JSON clients that never send a hello are still served.
+        with socket.create_connection(server.address, timeout=2) as raw:
+            raw.sendall(b'{"service": "Echo", "method": "Native", "payload": {"value": 3, "delay": 0}}\n')
+            assert raw.recv(4096) == b'{"payload": {"value": 6}}\n'
+
+        async def many_clients():
+            clients = [AsyncRPCClient(*server.address) for _ in range(200)]
+            results = await asyncio.gather(
+                *(c.call("Echo", "Native", {"value": i, "delay": 0.2}) for i, c in enumerate(clients))
+            )
+            await asyncio.gather(*(c.close() for c in clients))
+            return results
+
+        started = time.time()
+        results = asyncio.run(many_clients())
+        assert [r["value"] for r in results] == [i * 2 for i in range(200)]
+        assert time.time() - started < 3.0
+    finally:
+        pool.close()
+        server.stop()
+
+
+@pytest.mark.parametrize("server_class", [RPCServer, AsyncRPCServer])
+def test_pipelined_requests_per_connection_are_bounded(server_class) -> None:
+    server = server_class("127.0.0.1", next_port(), max_inflight=2)
+    lock = threading.Lock()
+    running = {"now": 0, "peak": 0}
+
+    def tracked(payload):
+        with lock:
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+        time.sleep(0.1)
+        with lock:
+            running["now"] -= 1
+        return {"value": payload["value"]}
+
+    server.register("Echo", "Tracked", tracked)
+    server.start()
+    pool = ConnectionPool()
+    client = RPCClient(*server.address, pool=pool)
+    try:
+        results = []
+        threads = [
+            threading.Thread(target=lambda i=i: results.append(client.call("Echo", "Tracked", {"value": i})))
+            for i in range(6)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(r["value"] for r in results) == list(range(6))
+        assert running["peak"] == 2
+    finally:
+        pool.close()
+        server.stop()
+
+
+def test_oversized_frame_drops_the_connection() -> None:
+    server = RPCServer("127.0.0.1", next_port())
+    server.register("Echo", "Slow", lambda payload: {"value": payload["value"]})
+    server.start()
+    try:
+        with socket.create_connection(server.address, timeout=2) as raw:
+            raw.sendall(b"\x00RPC lpjson\n")
+            assert raw.recv(4096) == b"\x00RPC lpjson\n"
+            # Announces a 4 GiB frame; the server hangs up instead of allocating it.
+            raw.sendall(b"\xff\xff\xff\xff")
+            assert raw.recv(4096) == b""
+    finally:
+        server.stop()
+
+
+def test_untagged_timeout_discards_the_connection() -> None:
+    """A legacy server answers without ids, so a late reply must not reach the next caller."""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+
+    def legacy_server() -> None:
+        conn, _ = listener.accept()
+        with conn:
+            stream = conn.makefile("rb")
+            stream.readline()
+            conn.sendall(b'{"error": "unknown"}\n')
+            for number, line in enumerate(iter(stream.readline, b"")):
+                if number == 0:
+                    time.sleep(0.5)
+                conn.sendall(b'{"payload": {"reply": %d}}\n' % number)
+
+    threading.Thread(target=legacy_server, daemon=True).start()
+    pool = ConnectionPool()
+    client = RPCClient(*listener.getsockname(), pool=pool)
+    try:
+        with pytest.raises(RPCError):
+            client.call("Echo", "Slow", {"value": 1}, timeout=0.1)
+        (connection,) = pool._connections.values()
+        assert connection.closed
+    finally:
+        pool.close()
+        listener.close()
+
+
+def test_async_blocking_handlers_do_not_starve_the_others() -> None:
+    server = AsyncRPCServer("127.0.0.1", next_port(), max_workers=1, max_blocking_workers=4)
+    release = threading.Event()
+
+    def wait_for_commit(payload):
+        release.wait(5)
+        return {"value": payload["value"]}
+
+    server.register("Raft", "ClientCommand", wait_for_commit, blocking=True)
+    server.register("Raft", "AppendEntries", lambda payload: {"value": payload["value"]})
+    server.start()
+    pool = ConnectionPool()
+    client = RPCClient(*server.address, pool=pool)
+    try:
+        waiting = [
+            threading.Thread(target=client.call, args=("Raft", "ClientCommand", {"value": i}))
+            for i in range(3)
+        ]
+        for thread in waiting:
+            thread.start()
+        time.sleep(0.1)
+        # All blocking calls are parked, yet the consensus RPC is still served.
+        assert client.call("Raft", "AppendEntries", {"value": 7}, timeout=1.0) == {"value": 7}
+        release.set()
+        for thread in waiting:
+            thread.join()
+    finally:
+        release.set()
+        pool.close()
+        server.stop()
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from consensus.scheduler import Scheduler
+
+
+def test_callbacks_fire_in_deadline_order_and_cancel() -> None:
+    scheduler = Scheduler()
+    fired = []
+    done = threading.Event()
+    scheduler.call_later(0.2, lambda: (fired.append("late"), done.set()))
+    cancelled = scheduler.call_later(0.1, lambda: fired.append("cancelled"))
+    scheduler.call_later(0.05, lambda: fired.append("early"))
+    cancelled.cancel()
+    started = time.monotonic()
+    assert done.wait(2.0)
+    assert fired == ["early", "late"]
+    assert time.monotonic() - started >= 0.15
+    assert scheduler.pending() == 0
+
+
+def test_earlier_deadline_wakes_sleeping_thread() -> None:
+    scheduler = Scheduler()
+    done = threading.Event()
+    scheduler.call_later(10.0, lambda: None)
+    time.sleep(0.05)  # thread is now sleeping towards the 10 s deadline
+    started = time.monotonic()
+    scheduler.call_later(0.05, done.set)
+    assert done.wait(1.0)
+    assert time.monotonic() - started < 0.5
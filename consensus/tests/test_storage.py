@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import os
+
+from consensus.storage import RaftStorage, TwoPCLog
+
+
+def test_wal_recovers_across_segments_and_drops_torn_tail(tmp_path) -> None:
+    storage = RaftStorage(str(tmp_path), segment_bytes=128)
+    assert storage.load() == (0, None, [])
+    seq = 0
+    for index in range(10):
+        seq = storage.append([(index, 1, f"set key{index} {index}")])
+    storage.sync(seq)
+    storage.sync(storage.truncate_from(7))
+    storage.sync(storage.append([(7, 2, "set key7 rewritten")]))
+    storage.save_state(2, "n3")
+    storage.close()
+    segments = sorted(name for name in os.listdir(tmp_path) if name.endswith(".wal"))
+    assert len(segments) > 1
+
+    with open(os.path.join(tmp_path, segments[-1]), "ab") as handle:
+        handle.write(b"\x00\x01torn")
+    recovered = RaftStorage(str(tmp_path), segment_bytes=128)
+    term, voted_for, entries = recovered.load()
+    assert (term, voted_for) == (2, "n3")
+    assert [index for index, _, _ in entries] == list(range(8))
+    assert entries[-1] == (7, 2, "set key7 rewritten")
+    # The torn bytes were cut off, so appends continue cleanly.
+    recovered.sync(recovered.append([(8, 2, "set key8 8")]))
+    recovered.close()
+    reopened = RaftStorage(str(tmp_path))
+    assert reopened.load()[2][-1] == (8, 2, "set key8 8")
+    reopened.close()
+
+
+def test_snapshot_compacts_covered_segments(tmp_path) -> None:
+    storage = RaftStorage(str(tmp_path), segment_bytes=64)
+    storage.load()
+    storage.sync(storage.append([(index, 1, f"set key{index} {index}") for index in range(10)]))
+    before = len([name for name in os.listdir(tmp_path) if name.endswith(".wal")])
+    storage.save_snapshot(6, 1, b'{"kv": {}}')
+    storage.compact(6)
+    after = len([name for name in os.listdir(tmp_path) if name.endswith(".wal")])
+    assert after < before
+    storage.close()
+
+    reopened = RaftStorage(str(tmp_path), segment_bytes=64)
+    assert reopened.load_snapshot() == (6, 1, b'{"kv": {}}')
+    assert [index for index, _, _ in reopened.load()[2]] == [7, 8, 9]
+    reopened.reset(12)
+    reopened.sync(reopened.append([(12, 2, "set key12 12")]))
+    reopened.close()
+    assert RaftStorage(str(tmp_path)).load()[2] == []  # gap after the snapshot is discarded
+
+
+def test_twopc_log_keeps_only_unfinished_transactions(tmp_path) -> None:
+    log = TwoPCLog(str(tmp_path), compact_bytes=2048)
+    assert log.load() == []
+    for index in range(100):
+        log.append({"kind": "decision", "txn": f"t{index}", "commit": True, "payload": "x", "targets": {"p1": "a"}})
+        if index != 42:
+            log.append({"kind": "end", "txn": f"t{index}"})
+    log.append({"kind": "prepared", "txn": "t7", "payload": "x", "coordinator": "c2", "participants": {}})
+    log.sync()
+    log.close()
+    # Finished transactions were compacted away as the file grew.
+    assert os.path.getsize(tmp_path / "twopc.log") < 2048 + 512
+
+    with open(tmp_path / "twopc.log", "ab") as handle:
+        handle.write(b"\x00\x01torn")
+    recovered = TwoPCLog(str(tmp_path))
+    records = recovered.load()
+    assert [(record["kind"], record["txn"]) for record in records] == [
+        ("decision", "t42"),
+        ("prepared", "t7"),
+    ]
+    recovered.append({"kind": "decided", "txn": "t7", "commit": False})
+    recovered.close()
+    reopened = TwoPCLog(str(tmp_path))
+    assert [record["txn"] for record in reopened.load()] == ["t42"]
+    reopened.close()
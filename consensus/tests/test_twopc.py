@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, List
+
+import pytest
+
+from consensus.fanout import FanOut
+from consensus.rpc import RPCError
+from consensus.storage import TwoPCLog
+from consensus.twopc import TwoPhaseCoordinator
+
+
+class FakeParticipants:
+    def __init__(self, abort_payloads=(), read_only=()) -> None:
+        self.abort_payloads = set(abort_payloads)
+        self.read_only = set(read_only)
+        self.batches: List[tuple] = []
+        self.decisions: Dict[str, bool] = {}
+        self.lock = threading.Lock()
+
+    def send(self, participant_id: str, target: str, service: str, rpc_name: str, message: Dict[str, Any]):
+        time.sleep(0.005)  # network round trip
+        with self.lock:
+            self.batches.append((participant_id, rpc_name, len(message["requests"])))
+        responses = []
+        for request in message["requests"]:
+            if rpc_name == "RequestVoteBatch":
+                responses.append(
+                    {
+                        "commit": request["payload"] not in self.abort_payloads,
+                        "read_only": participant_id in self.read_only,
+                    }
+                )
+            else:
+                with self.lock:
+                    self.decisions[request["transaction_id"]] = request["commit"]
+                responses.append({"committed": request["commit"]})
+        return {"responses": responses}
+
+
+def test_concurrent_transactions_share_batched_rpcs() -> None:
+    participants = FakeParticipants(abort_payloads={"txn-7"})
+    fanout = FanOut(max_workers=8)
+    coordinator = TwoPhaseCoordinator("c1", participants.send, fanout, batch_window=0.01)
+    targets = {"p1": "addr1", "p2": "addr2", "p3": "addr3"}
+    try:
+        futures = [coordinator.submit(f"txn-{index}", targets) for index in range(200)]
+        decisions = [future.result(timeout=10.0) for future in futures]
+    finally:
+        coordinator.stop()
+        fanout.shutdown()
+    assert decisions == [index != 7 for index in range(200)]
+    # 200 transactions x 3 participants x 2 phases (less the presumed abort)
+    # went out in far fewer RPCs.
+    assert sum(size for _, _, size in participants.batches) == 1197
+    assert len(participants.batches) < 100
+    metrics = coordinator.metrics.snapshot()
+    assert (metrics["committed"], metrics["aborted"]) == (199, 1)
+    assert metrics["throughput_tps"] > 0
+    assert metrics["vote_p50_ms"] > 0 and metrics["decision_p99_ms"] >= metrics["decision_p50_ms"]
+
+
+def test_unreachable_participant_aborts() -> None:
+    def send(participant_id, target, service, rpc_name, message):
+        if participant_id == "down" and rpc_name == "RequestVoteBatch":
+            raise ConnectionError("unreachable")
+        return {"responses": [{"commit": True} for _ in message["requests"]]}
+
+    fanout = FanOut(max_workers=4)
+    coordinator = TwoPhaseCoordinator("c1", send, fanout)
+    try:
+        assert coordinator.submit("x", {"up": "a", "down": "b"}).result(timeout=5.0) is False
+    finally:
+        coordinator.stop()
+        fanout.shutdown()
+
+
+def test_recovery_redrives_logged_commits_and_presumes_abort(tmp_path) -> None:
+    down = {"p2"}
+
+    def send(participant_id, target, service, rpc_name, message):
+        if participant_id in down and rpc_name == "DeliverDecisionBatch":
+            raise ConnectionError("unreachable")
+        return FakeParticipants(abort_payloads={"second"}).send(participant_id, target, service, rpc_name, message)
+
+    log = TwoPCLog(str(tmp_path))
+    log.load()
+    fanout = FanOut(max_workers=4)
+    coordinator = TwoPhaseCoordinator("c1", send, fanout, log=log)
+    targets = {"p1": "a", "p2": "b"}
+    try:
+        # p2 voted but never acknowledges the commit.
+        assert coordinator.submit("first", targets).result(timeout=5.0) is True
+        (transaction_id,) = coordinator._transactions
+        assert coordinator.outcome(transaction_id) == "commit"
+        # Aborts are presumed, so this one neither touches the log nor waits for p2.
+        assert coordinator.submit("second", targets).result(timeout=5.0) is False
+        assert len(coordinator._transactions) == 1
+    finally:
+        coordinator.stop()
+    log.close()
+
+    log = TwoPCLog(str(tmp_path))
+    participants = FakeParticipants()
+    recovered = TwoPhaseCoordinator("c1", participants.send, fanout, log=log)
+    try:
+        assert recovered.recover(log.load()) == 1
+        assert recovered.redrive() == 2  # acks are not logged, so every participant hears again
+        deadline = time.monotonic() + 5.0
+        while recovered._transactions and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert participants.decisions == {transaction_id: True}
+        assert recovered.outcome(transaction_id) is None
+    finally:
+        recovered.stop()
+        fanout.shutdown()
+        log.close()
+    assert TwoPCLog(str(tmp_path)).load() == []
+
+
+@pytest.mark.parametrize("optimize", [False, True])
+def test_presumed_abort_read_only_and_one_phase_messages(optimize: bool) -> None:
+    participants = FakeParticipants(abort_payloads={"abort"}, read_only={"reader"})
+    fanout = FanOut(max_workers=4)
+    coordinator = TwoPhaseCoordinator("c1", participants.send, fanout, batch_window=0.0, optimize=optimize)
+    try:
+        assert coordinator.submit("write", {"p1": "a", "reader": "b"}).result(timeout=5.0) is True
+        assert coordinator.submit("abort", {"p1": "a", "p2": "b"}).result(timeout=5.0) is False
+        assert coordinator.submit("single", {"p1": "a"}).result(timeout=5.0) is True
+    finally:
+        coordinator.stop()
+        fanout.shutdown()
+    decisions = [rpc_name for _, rpc_name, _ in participants.batches if rpc_name == "DeliverDecisionBatch"]
+    # Only p1's commit of "write" needs a decision message when optimizing.
+    assert len(decisions) == (1 if optimize else 5)
+    assert coordinator.metrics.snapshot()["messages_per_txn"] == (6 if optimize else 10) / 3
+
+
+def test_early_abort_reaches_late_and_unreachable_voters() -> None:
+    decisions: Dict[str, List[bool]] = {}
+    lock = threading.Lock()
+
+    def send(participant_id, target, service, rpc_name, message):
+        if rpc_name == "RequestVoteBatch":
+            if participant_id == "down":
+                raise ConnectionError("unreachable")
+            if participant_id == "late":
+                time.sleep(0.2)  # votes YES after "no" has already decided
+            return {"responses": [{"commit": participant_id != "no"} for _ in message["requests"]]}
+        with lock:
+            for request in message["requests"]:
+                decisions.setdefault(participant_id, []).append(request["commit"])
+        return {"responses": [{"committed": request["commit"]} for request in message["requests"]]}
+
+    fanout = FanOut(max_workers=8)
+    coordinator = TwoPhaseCoordinator("c1", send, fanout, batch_window=0.0, optimize=True)
+    targets = {"no": "a", "late": "b", "down": "c"}
+    try:
+        assert coordinator.submit("x", targets).result(timeout=5.0) is False
+        deadline = time.monotonic() + 5.0
+        while "late" not in decisions and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        coordinator.stop()
+        fanout.shutdown()
+    # The known NO voter hears nothing; everyone else is told to abort.
+    assert decisions == {"late": [False], "down": [False]}
+
+
+@pytest.mark.parametrize("reachable", [True, False])
+def test_lost_one_phase_vote_reply_is_not_presumed_aborted(reachable: bool) -> None:
+    outcomes: Dict[str, bool] = {}
+
+    def send(participant_id, target, service, rpc_name, message):
+        if rpc_name == "RequestVoteBatch":
+            for request in message["requests"]:
+                outcomes[request["transaction_id"]] = True  # committed in one phase
+            raise TimeoutError("vote reply dropped")
+        assert rpc_name == "QueryDecision"
+        if not reachable:
+            raise ConnectionError("unreachable")
+        committed = outcomes.get(message["transaction_id"])
+        return {"outcome": "commit" if committed else "abort"}
+
+    fanout = FanOut(max_workers=4)
+    coordinator = TwoPhaseCoordinator("c1", send, fanout, batch_window=0.0)
+    try:
+        future = coordinator.submit("single", {"p1": "a"})
+        if reachable:
+            assert future.result(timeout=5.0) is True
+        else:
+            with pytest.raises(RPCError, match="transaction_in_doubt"):
+                future.result(timeout=5.0)
+        assert coordinator._transactions == {}
+    finally:
+        coordinator.stop()
+        fanout.shutdown()
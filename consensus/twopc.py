@@ -0,0 +1,508 @@
+"""Pipelined two-phase commit coordinator with per-participant batching.
+
+``TwoPhaseCoordinator`` lets any number of transactions be in flight at once.
+Each transaction is a small callback-driven state machine rather than a
+blocked thread: its vote requests are queued, the decision is taken as soon
+as every participant voted commit or the first one voted abort, and the
+decision messages are queued in turn.
+
+Queued messages are drained by one batcher per phase. Messages bound for the
+same participant within ``batch_window`` seconds (up to ``max_batch_size``)
+travel as a single ``RequestVoteBatch`` or ``DeliverDecisionBatch`` RPC, and
+batches for different participants are sent in parallel. ``TwoPCMetrics``
+tracks throughput and per-phase latency.
+
+The protocol is presumed abort: a transaction the coordinator has no
+record of is taken to have aborted. Aborts are therefore neither logged
+nor acknowledged. With ``optimize`` set (the default) the coordinator also
+skips messages that carry no information:
+
+* participants that voted abort are not sent the abort decision; everyone
+  else, including voters that answer after an early abort and those that
+  could not be reached, is;
+* a participant with nothing to write votes read-only, and phase 2 skips it;
+* a transaction with one participant commits in one phase, with that
+  participant's vote as the outcome. If the vote's reply is lost, the
+  coordinator asks the participant with ``QueryDecision``; when that fails
+  too, the transaction's future fails with ``transaction_in_doubt``.
+
+Given a ``TwoPCLog`` the coordinator logs each commit decision together with
+the participants that still need it. A batcher syncs the log before sending
+a batch, so no participant hears of a commit that a crash could lose.
+Commits that a participant has not acknowledged are re-sent by ``redrive``.
+Once every participant has acknowledged, an ``end`` record lets the log
+forget the transaction. ``recover`` re-drives the commits that were logged.
+"""
+from __future__ import annotations
+
+import statistics
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .fanout import FanOut
+from .rpc import RPCError
+from .storage import TwoPCLog
+
+
+TWOPC_VOTING_SERVICE = "VotingPhase"
+TWOPC_DECISION_SERVICE = "DecisionPhase"
+
+# (participant_id, target, service, rpc_name, message) -> response
+BatchSender = Callable[[str, str, str, str, Dict[str, Any]], Dict[str, Any]]
+
+
+class _PhaseBatcher:
+    """Groups one phase's messages per participant into batch RPCs."""
+
+    def __init__(
+        self,
+        service: str,
+        rpc_name: str,
+        send: BatchSender,
+        fanout: FanOut,
+        batch_window: float,
+        max_batch_size: int,
+        flush: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self._service = service
+        self._rpc_name = rpc_name
+        self._send = send
+        self._fanout = fanout
+        self._batch_window = batch_window
+        self._max_batch_size = max_batch_size
+        # Makes everything the messages depend on durable before they leave.
+        self._flush = flush
+        # participant_id -> (target, [(message, future)])
+        self._queues: Dict[str, Tuple[str, List[Tuple[Dict[str, Any], "Future[Dict[str, Any]]"]]]] = {}
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"2pc-{rpc_name}", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, participant_id: str, target: str, message: Dict[str, Any]) -> "Future[Dict[str, Any]]":
+        future: "Future[Dict[str, Any]]" = Future()
+        with self._cond:
+            if not self._running:
+                future.set_exception(RuntimeError("coordinator_stopped"))
+                return future
+            self._queues.setdefault(participant_id, (target, []))[1].append((message, future))
+            self._cond.notify()
+        return future
+
+    def stop(self) -> None:
+        with self._cond:
+            self._running = False
+            queues, self._queues = self._queues, {}
+            self._cond.notify_all()
+        for _, items in queues.values():
+            for _, future in items:
+                future.set_exception(RuntimeError("coordinator_stopped"))
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queues and self._running:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                # Give concurrent transactions a short window to join.
+                deadline = time.monotonic() + self._batch_window
+                while self._running:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or any(
+                        len(items) >= self._max_batch_size for _, items in self._queues.values()
+                    ):
+                        break
+                    self._cond.wait(remaining)
+                batches = []
+                for participant_id, (target, items) in list(self._queues.items()):
+                    batches.append((participant_id, target, items[: self._max_batch_size]))
+                    del items[: self._max_batch_size]
+                    if not items:
+                        del self._queues[participant_id]
+            for participant_id, target, items in batches:
+                try:
+                    self._fanout.submit(self._send_batch, participant_id, target, items)
+                except RuntimeError:
+                    for _, future in items:
+                        future.set_exception(RuntimeError("coordinator_stopped"))
+
+    def _send_batch(
+        self,
+        participant_id: str,
+        target: str,
+        items: List[Tuple[Dict[str, Any], "Future[Dict[str, Any]]"]],
+    ) -> None:
+        try:
+            if self._flush is not None:
+                self._flush()
+            response = self._send(
+                participant_id,
+                target,
+                self._service,
+                self._rpc_name,
+                {"requests": [message for message, _ in items]},
+            )
+            responses = response["responses"]
+        except Exception as exc:
+            for _, future in items:
+                future.set_exception(exc)
+            return
+        for (_, future), item_response in zip(items, responses):
+            future.set_result(item_response)
+
+
+class TwoPCMetrics:
+    """Transaction counts plus recent per-phase latencies, in seconds."""
+
+    def __init__(self, window: int = 10000) -> None:
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.committed = 0
+        self.aborted = 0
+        # Vote and decision messages sent, however they were batched.
+        self.messages = 0
+        self._vote_latencies: "deque[float]" = deque(maxlen=window)
+        self._decision_latencies: "deque[float]" = deque(maxlen=window)
+        self._latencies: "deque[float]" = deque(maxlen=window)
+
+    def record(self, decision: bool, vote_latency: float, decision_latency: float) -> None:
+        with self._lock:
+            if decision:
+                self.committed += 1
+            else:
+                self.aborted += 1
+            self._vote_latencies.append(vote_latency)
+            self._decision_latencies.append(decision_latency)
+            self._latencies.append(vote_latency + decision_latency)
+
+    def count_messages(self, count: int) -> None:
+        with self._lock:
+            self.messages += count
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            elapsed = max(time.monotonic() - self._started, 1e-9)
+            finished = self.committed + self.aborted
+            return {
+                "committed": self.committed,
+                "aborted": self.aborted,
+                "throughput_tps": finished / elapsed,
+                "messages_per_txn": self.messages / finished if finished else 0.0,
+                "latency_p50_ms": _percentile(self._latencies, 50),
+                "latency_p99_ms": _percentile(self._latencies, 99),
+                "vote_p50_ms": _percentile(self._vote_latencies, 50),
+                "vote_p99_ms": _percentile(self._vote_latencies, 99),
+                "decision_p50_ms": _percentile(self._decision_latencies, 50),
+                "decision_p99_ms": _percentile(self._decision_latencies, 99),
+            }
+
+
+def _percentile(samples: "deque[float]", percent: int) -> float:
+    if not samples:
+        return 0.0
+    if len(samples) == 1:
+        return samples[0] * 1000.0
+    return statistics.quantiles(samples, n=100, method="inclusive")[percent - 1] * 1000.0
+
+
+class _Transaction:
+    __slots__ = (
+        "transaction_id", "payload", "targets", "future", "lock", "awaiting", "decision", "prepared", "unacked",
+        "unreachable", "started", "voted", "reported",
+    )
+
+    def __init__(self, payload: str, targets: Dict[str, str], transaction_id: Optional[str] = None) -> None:
+        self.transaction_id = transaction_id or uuid.uuid4().hex
+        self.payload = payload
+        self.targets = targets
+        self.future: "Future[bool]" = Future()
+        self.lock = threading.Lock()
+        # Outstanding vote requests, then outstanding decision deliveries.
+        self.awaiting = len(targets)
+        self.decision: Optional[bool] = None
+        # Participants that voted commit and now wait for the decision.
+        self.prepared: Set[str] = set()
+        # Participants whose vote never arrived; they may have prepared.
+        self.unreachable: Set[str] = set()
+        # Participants that have not acknowledged the decision yet.
+        self.unacked: Set[str] = set()
+        self.started = time.monotonic()
+        self.voted = 0.0
+        self.reported = False
+
+
+class TwoPhaseCoordinator:
+    """Runs many concurrent 2PC transactions over batched phase RPCs."""
+
+    def __init__(
+        self,
+        coordinator_id: str,
+        send: BatchSender,
+        fanout: FanOut,
+        batch_window: float = 0.002,
+        max_batch_size: int = 256,
+        log: Optional[TwoPCLog] = None,
+        optimize: bool = True,
+    ) -> None:
+        self._coordinator_id = coordinator_id
+        self._send = send
+        self._fanout = fanout
+        self._log = log
+        self._optimize = optimize
+        self.metrics = TwoPCMetrics()
+        # Transactions still voting, or whose decision a participant has
+        # yet to acknowledge.
+        self._transactions: Dict[str, _Transaction] = {}
+        self._transactions_lock = threading.Lock()
+        flush = log.sync if log is not None else None
+        self._votes = _PhaseBatcher(
+            TWOPC_VOTING_SERVICE, "RequestVoteBatch", send, fanout, batch_window, max_batch_size, flush
+        )
+        self._decisions = _PhaseBatcher(
+            TWOPC_DECISION_SERVICE, "DeliverDecisionBatch", send, fanout, batch_window, max_batch_size, flush
+        )
+
+    def submit(self, payload: str, targets: Dict[str, str]) -> "Future[bool]":
+        """Start a transaction over ``targets`` (participant id -> address).
+
+        The returned future resolves to the decision once every participant
+        that needs it has been sent it; failed commit deliveries are retried
+        by ``redrive``.
+        """
+        txn = _Transaction(payload, targets)
+        if not targets:
+            txn.future.set_result(True)
+            return txn.future
+        with self._transactions_lock:
+            self._transactions[txn.transaction_id] = txn
+        one_phase = self._optimize and len(targets) == 1
+        self.metrics.count_messages(len(targets))
+        for participant_id, target in targets.items():
+            message = {
+                "coordinator_id": self._coordinator_id,
+                "participant_id": participant_id,
+                "transaction_id": txn.transaction_id,
+                "payload": payload,
+                "participants": targets,
+            }
+            if one_phase:
+                message["one_phase"] = True
+            future = self._votes.enqueue(participant_id, target, message)
+            future.add_done_callback(
+                lambda done, txn=txn, participant_id=participant_id: self._on_vote(txn, participant_id, done)
+            )
+        return txn.future
+
+    def outcome(self, transaction_id: str) -> Optional[str]:
+        """"commit", "abort" or "pending" for a live transaction, else ``None``.
+
+        ``None`` means abort to anyone asking the coordinator itself. A
+        commit counts only once it is durable, since until then a crash
+        could still turn it into an abort.
+        """
+        with self._transactions_lock:
+            txn = self._transactions.get(transaction_id)
+        if txn is None:
+            return None
+        with txn.lock:
+            if txn.decision is None:
+                return "pending"
+            decision = txn.decision
+        if decision and self._log is not None:
+            self._log.sync()
+        return "commit" if decision else "abort"
+
+    def recover(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Resume the commits in ``records`` (from ``TwoPCLog.load``).
+
+        Returns how many were resumed; their decisions go out on the next
+        ``redrive``. Anything else the crash interrupted has aborted.
+        """
+        resumed = 0
+        for record in records:
+            if record["kind"] != "decision":
+                continue
+            txn = _Transaction(record["payload"], record["targets"], record["txn"])
+            txn.decision = True
+            txn.prepared = set(txn.targets)
+            txn.unacked = set(txn.targets)  # acks are not logged
+            txn.voted = txn.started
+            txn.awaiting = 0
+            txn.reported = True
+            txn.future.set_result(True)
+            with self._transactions_lock:
+                self._transactions[txn.transaction_id] = txn
+            resumed += 1
+        return resumed
+
+    def redrive(self) -> int:
+        """Re-send commits that some participant has not acknowledged."""
+        with self._transactions_lock:
+            transactions = list(self._transactions.values())
+        resent = 0
+        for txn in transactions:
+            with txn.lock:
+                if txn.decision is None or txn.awaiting > 0 or not txn.unacked:
+                    continue
+                participants = sorted(txn.unacked)
+                txn.awaiting = len(participants)
+            self._send_decision(txn, participants)
+            resent += len(participants)
+        return resent
+
+    def stop(self) -> None:
+        self._votes.stop()
+        self._decisions.stop()
+
+    def _on_vote(self, txn: _Transaction, participant_id: str, done: "Future[Dict[str, Any]]") -> None:
+        try:
+            response = done.result()
+            commit = bool(response.get("commit", False))
+            reached = True
+        except Exception:
+            # An unreachable participant counts as an abort vote, but may have prepared.
+            response, commit, reached = {}, False, False
+        if not reached and self._optimize and len(txn.targets) == 1:
+            # A one-phase vote decides on the participant; it may have committed.
+            self._fanout.submit(self._settle_one_phase, txn, participant_id)
+            return
+        late = False
+        with txn.lock:
+            if txn.decision is not None:
+                # A vote that lost the race to an early abort. Anyone not known
+                # to have voted NO may hold locks and must hear the abort too;
+                # unoptimized aborts already went to every target.
+                if txn.decision or not self._optimize or (reached and (not commit or response.get("read_only"))):
+                    return
+                late = True
+            else:
+                txn.awaiting -= 1
+                if not reached:
+                    txn.unreachable.add(participant_id)
+                if commit and not (self._optimize and response.get("read_only")):
+                    txn.prepared.add(participant_id)
+                if commit and txn.awaiting > 0:
+                    return
+                # A single abort decides the transaction; stop waiting.
+                txn.decision = commit
+                txn.voted = time.monotonic()
+                if not self._optimize:
+                    participants = list(txn.targets)
+                elif len(txn.targets) == 1:
+                    participants = []  # the participant's vote was the outcome
+                else:
+                    # Read-only and NO voters need no decision. Under presumed
+                    # abort nobody needs to acknowledge an abort either.
+                    participants = sorted(txn.prepared | txn.unreachable)
+                if commit or not self._optimize:
+                    txn.unacked = set(participants)
+                txn.awaiting = len(txn.unacked)
+                if commit and txn.unacked and self._log is not None:
+                    # Logged under the lock so ``outcome`` never sees an unlogged commit.
+                    self._log.append(
+                        {
+                            "kind": "decision",
+                            "txn": txn.transaction_id,
+                            "commit": True,
+                            "payload": txn.payload,
+                            "targets": {target: txn.targets[target] for target in txn.unacked},
+                        }
+                    )
+        if late:
+            self._send_decision(txn, [participant_id])
+            return
+        if participants:
+            self._send_decision(txn, participants)
+        if not txn.unacked:
+            self._finish(txn, logged=False)
+
+    def _settle_one_phase(self, txn: _Transaction, participant_id: str) -> None:
+        """Ask the only participant how a one-phase vote whose reply was lost ended.
+
+        A participant that never saw the vote aborts the transaction when
+        asked, so any answer is final. Without one the transaction is in
+        doubt, and the future fails rather than presume either outcome.
+        """
+        self.metrics.count_messages(1)
+        try:
+            response = self._send(
+                participant_id,
+                txn.targets[participant_id],
+                TWOPC_DECISION_SERVICE,
+                "QueryDecision",
+                {
+                    "transaction_id": txn.transaction_id,
+                    "coordinator_id": self._coordinator_id,
+                    "requester_id": self._coordinator_id,
+                },
+            )
+            outcome = response.get("outcome")
+        except Exception:
+            outcome = None
+        if outcome not in ("commit", "abort"):
+            with self._transactions_lock:
+                self._transactions.pop(txn.transaction_id, None)
+            txn.future.set_exception(RPCError("transaction_in_doubt"))
+            return
+        with txn.lock:
+            txn.decision = outcome == "commit"
+            txn.voted = time.monotonic()
+            txn.awaiting = 0
+        self._finish(txn, logged=False)
+
+    def _send_decision(self, txn: _Transaction, participants: List[str]) -> None:
+        self.metrics.count_messages(len(participants))
+        with txn.lock:
+            needs_ack = set(txn.unacked)
+        for participant_id in participants:
+            future = self._decisions.enqueue(
+                participant_id,
+                txn.targets[participant_id],
+                {
+                    "coordinator_id": self._coordinator_id,
+                    "participant_id": participant_id,
+                    "transaction_id": txn.transaction_id,
+                    "commit": txn.decision,
+                    "payload": txn.payload,
+                },
+            )
+            if participant_id in needs_ack:
+                future.add_done_callback(
+                    lambda done, txn=txn, participant_id=participant_id: self._on_decision_delivered(
+                        txn, participant_id, done
+                    )
+                )
+
+    def _on_decision_delivered(self, txn: _Transaction, participant_id: str, done: "Future[Dict[str, Any]]") -> None:
+        with txn.lock:
+            if done.exception() is None:
+                txn.unacked.discard(participant_id)
+            txn.awaiting -= 1
+            if txn.awaiting > 0:
+                return
+            finished = not txn.unacked
+        if finished:
+            self._finish(txn, logged=bool(txn.decision) and self._log is not None)
+        else:
+            self._report(txn)
+
+    def _finish(self, txn: _Transaction, logged: bool) -> None:
+        with self._transactions_lock:
+            self._transactions.pop(txn.transaction_id, None)
+        if logged and self._log is not None:
+            self._log.append({"kind": "end", "txn": txn.transaction_id})
+        self._report(txn)
+
+    def _report(self, txn: _Transaction) -> None:
+        with txn.lock:
+            if txn.reported:
+                return
+            txn.reported = True
+        decision = bool(txn.decision)
+        self.metrics.record(decision, txn.voted - txn.started, time.monotonic() - txn.voted)
+        txn.future.set_result(decision)